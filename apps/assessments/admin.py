@@ -9,6 +9,7 @@ from .models import (
     Choice,
     AssessmentDifficultyRating,
     FollowAssessment,
+    MediaBlob,
 )
 
 
@@ -25,9 +26,18 @@ class QuestionAdmin(admin.ModelAdmin):
     search_fields = ("assessment",)
     list_per_page = 100
 
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "size", "ref_count", "created_at", "updated_at")
+    readonly_fields = ("name", "size", "ref_count", "created_at", "updated_at")
+
+@admin.register(Assessment)
+class AssessmentAdmin(admin.ModelAdmin):
+    # Regular saves leave counter fields out (see somaserver.db.CounterFieldsMixin), so edits would be lost.
+    readonly_fields = Assessment.counter_fields
+
 admin.site.register(Language)
 admin.site.register(Category)
 admin.site.register(Subcategory)
-admin.site.register(Assessment)
 admin.site.register(AssessmentDifficultyRating)
 admin.site.register(FollowAssessment)
@@ -0,0 +1,127 @@
+import itertools
+
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .models import Question, Choice, bump_content_version
+from .serializers import AssessmentSerializer
+from .validation import choices_error
+
+# Questions of a JSON request, and of each chunk of an NDJSON request validated and inserted at once.
+MAX_QUESTIONS = 1000
+MAX_NDJSON_QUESTIONS = 20000
+
+
+class BulkChoiceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Choice
+        fields = ["description", "correct_answer"]
+
+
+class BulkQuestionSerializer(serializers.ModelSerializer):
+    choices = BulkChoiceSerializer(many=True)
+
+    class Meta:
+        model = Question
+        fields = ["description", "is_multiple_choice", "choices"]
+
+
+def split_payload(data):
+    """
+    Return the (assessment, question rows) of a bulk authoring request.
+
+    A JSON body is an object with an optional "assessment" object and a list of at most MAX_QUESTIONS
+    "questions". An NDJSON body has one question per line, optionally preceded by a line with an
+    "assessment" object, and at most MAX_NDJSON_QUESTIONS lines of questions. Its rows are returned
+    as an iterator, so the body is only read as they are authored.
+    """
+    if isinstance(data, dict):
+        questions = data.get("questions", [])
+        if not isinstance(questions, list):
+            raise ValidationError({"questions": "Expected a list of questions."})
+        if len(questions) > MAX_QUESTIONS:
+            raise ValidationError({"questions": f"At most {MAX_QUESTIONS} questions can be created at once."})
+        return data.get("assessment"), questions
+
+    rows = iter(data)
+    first = next(rows, None)
+    if isinstance(first, dict) and "assessment" in first:
+        return first["assessment"], limit_rows(rows)
+    return None, limit_rows(itertools.chain([] if first is None else [first], rows))
+
+
+def limit_rows(rows):
+    for count, row in enumerate(rows):
+        if count == MAX_NDJSON_QUESTIONS:
+            raise ValidationError({"questions": f"At most {MAX_NDJSON_QUESTIONS} questions can be created at once."})
+        yield row
+
+
+def validate_questions(rows, offset=0):
+    """
+    Validate question rows with their choices in memory.
+
+    The errors of every row are reported at once, as a list with an (empty when valid) entry per row,
+    after an empty entry for each of the offset rows validated before them.
+    """
+    serializer = BulkQuestionSerializer(data=rows, many=True)
+    if not serializer.is_valid():
+        raise ValidationError({"questions": [{}] * offset + serializer.errors})
+    return serializer.validated_data
+
+
+def author_in_bulk(request, assessment, assessment_data, rows, activate=False):
+    """
+    Create the given questions and choices, and a new assessment when `assessment` is None.
+
+    Rows are validated in memory and written with one bulk insert per table, MAX_QUESTIONS at a time,
+    in a single transaction: an invalid row rolls back everything. With activate, the questions with
+    valid choices are created active. Returns the assessment and a list of (question, choices error) pairs.
+    """
+    assessment_serializer = None
+    if assessment is None:
+        if not isinstance(assessment_data, dict):
+            raise ValidationError({"assessment": "An assessment object or an ?assessment=<id> is required."})
+        assessment_serializer = AssessmentSerializer(data=assessment_data, context={"request": request})
+        if not assessment_serializer.is_valid():
+            raise ValidationError({"assessment": assessment_serializer.errors})
+
+    results = []
+    with transaction.atomic():
+        if assessment_serializer is not None:
+            assessment = assessment_serializer.save(user=request.user)
+        rows = iter(rows)
+        while chunk := list(itertools.islice(rows, MAX_QUESTIONS)):
+            results.extend(create_questions(assessment, validate_questions(chunk, len(results)), activate))
+        if assessment_serializer is None and any(question.is_active for question, _ in results):
+            bump_content_version(pk=assessment.pk)
+    return assessment, results
+
+
+def create_questions(assessment, questions_data, activate):
+    results = []
+    for data in questions_data:
+        question = Question(
+            assessment=assessment,
+            description=data["description"],
+            is_multiple_choice=data.get("is_multiple_choice", False),
+        )
+        error = choices_error(
+            question.is_multiple_choice,
+            len(data["choices"]),
+            sum(1 for choice in data["choices"] if choice.get("correct_answer")),
+        )
+        question.is_active = activate and error is None
+        results.append((question, error))
+
+    Question.objects.bulk_create([question for question, _ in results], batch_size=500)
+    Choice.objects.bulk_create(
+        [
+            Choice(question=question, **choice)
+            for (question, _), data in zip(results, questions_data)
+            for choice in data["choices"]
+        ],
+        batch_size=1000,
+    )
+    return results
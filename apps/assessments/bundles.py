@@ -0,0 +1,49 @@
+import json
+import zlib
+
+from .cache import VersionedCache
+from .models import Question, Choice
+
+
+def encode_bundle(bundle):
+    return zlib.compress(json.dumps(bundle, separators=(",", ":")).encode())
+
+
+def decode_bundle(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+def build_bundles(assessment_ids):
+    """
+    Build the content bundle of several assessments with two queries.
+
+    A bundle is the list of active questions of an assessment, each one stored as
+    [question_id, description, [[choice_id, description], ...]].
+    """
+    bundles = {assessment_id: [] for assessment_id in assessment_ids}
+    questions = {}
+    for question_id, assessment_id, description in Question.objects.filter(
+        assessment__in=assessment_ids, is_active=True
+    ).values_list("id", "assessment_id", "description"):
+        questions[question_id] = [question_id, description, []]
+        bundles[assessment_id].append(questions[question_id])
+
+    for choice_id, question_id, description in Choice.objects.filter(
+        question__assessment__in=assessment_ids, question__is_active=True
+    ).values_list("id", "question_id", "description"):
+        if question_id in questions:
+            questions[question_id][2].append([choice_id, description])
+    return bundles
+
+
+def build_bundle(assessment):
+    return build_bundles([assessment.pk])[assessment.pk]
+
+
+content_bundles = VersionedCache("content-bundle", build_bundle, encode=encode_bundle, decode=decode_bundle)
+
+
+def rebuild_bundle(assessment):
+    """Regenerate the bundle of the current content version of the assessment."""
+    assessment.refresh_from_db(fields=["content_version"])
+    content_bundles.set(assessment, build_bundle(assessment))
@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .models import Question
+
+# Every VersionedCache by prefix, so their statistics can be exported.
+versioned_caches = {}
+
+
+class VersionedCache:
+    """
+    Two level cache for data derived from the content of an assessment.
+
+    Entries are keyed by assessment id and content_version, so bumping the version makes
+    stale entries unreachable instead of having to delete them. Every worker keeps the most
+    recently used entries in memory, backed by the Django cache shared between workers.
+    """
+
+    def __init__(self, prefix, loader, maxsize=256, timeout=60 * 60 * 24, encode=None, decode=None):
+        self.prefix = prefix
+        self.loader = loader
+        self.encode = encode or (lambda value: value)
+        self.decode = decode or (lambda value: value)
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        versioned_caches[prefix] = self
+
+    def key(self, assessment):
+        return f"{self.prefix}:{assessment.pk}:{assessment.content_version}"
+
+    def get(self, assessment):
+        key = self.key(assessment)
+        with self.lock:
+            if key in self.local:
+                self.local.move_to_end(key)
+                self.hits += 1
+                return self.local[key]
+
+        value = cache.get(key)
+        if value is None:
+            value = self.loader(assessment)
+            cache.set(key, self.encode(value), self.timeout)
+            self.misses += 1
+        else:
+            value = self.decode(value)
+            self.shared_hits += 1
+
+        self.store_local(key, value)
+        return value
+
+    def set(self, assessment, value):
+        key = self.key(assessment)
+        cache.set(key, self.encode(value), self.timeout)
+        self.store_local(key, value)
+
+    def set_many(self, values):
+        """Store precomputed values, given as (assessment, value) pairs, in the shared cache."""
+        cache.set_many({self.key(assessment): self.encode(value) for assessment, value in values}, self.timeout)
+
+    def store_local(self, key, value):
+        with self.lock:
+            self.local[key] = value
+            self.local.move_to_end(key)
+            while len(self.local) > self.maxsize:
+                self.local.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "size": len(self.local),
+        }
+
+
+def load_answer_key(assessment):
+    """
+    Load the answer key of every question of the assessment with a single query.
+
+    Returns a dict mapping each question id to a tuple of (correct choice ids, all choice ids).
+    """
+    answer_key = {}
+    rows = Question.objects.filter(assessment=assessment).values_list("id", "choices__id", "choices__correct_answer")
+    for question_id, choice_id, correct_answer in rows:
+        correct_choices_ids, choices_ids = answer_key.setdefault(question_id, (set(), set()))
+        if choice_id is None:
+            continue
+        choices_ids.add(choice_id)
+        if correct_answer:
+            correct_choices_ids.add(choice_id)
+    return answer_key
+
+
+answer_keys = VersionedCache("answer-key", load_answer_key)
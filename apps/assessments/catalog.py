@@ -0,0 +1,71 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Language, Category, Subcategory, CATALOG_VERSION_KEY
+
+# Workers that do not share a cache with the one that saved a change notice it after at most this long.
+CATALOG_VERSION_TIMEOUT = 10
+
+
+def catalog_version():
+    """
+    Return a version describing the current languages, categories and subcategories.
+
+    The version is a fingerprint of the row counts and latest updated_at of the three tables, so
+    changes that bypass signals (bulk updates, raw SQL) are picked up as well.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        fingerprint = []
+        for model in (Language, Category, Subcategory):
+            totals = model.objects.aggregate(count=Count("id"), updated=Max("updated_at"))
+            fingerprint.append(f"{model._meta.model_name}:{totals['count']}:{totals['updated']}")
+        version = hashlib.md5("|".join(fingerprint).encode()).hexdigest()
+        cache.set(CATALOG_VERSION_KEY, version, CATALOG_VERSION_TIMEOUT)
+    return version
+
+
+def conditional_response(request, etag, build_data):
+    """
+    Answer a GET with 304 Not Modified when the client copy is current, and from the cache otherwise.
+
+    The etag must identify the data, which build_data is only called for when it is not cached yet.
+    No Last-Modified is sent: deleting a row does not move the latest updated_at of a table, so
+    revalidating by date could keep a client on data that lost rows.
+    """
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    key = f"catalog:{etag}"
+    data = cache.get(key)
+    if data is None:
+        # Serializer output keeps a reference to its serializer; store plain JSON data instead.
+        data = json.loads(json.dumps(build_data(), cls=JSONEncoder))
+        cache.set(key, data, 60 * 60 * 24)
+    response = Response(data)
+    response["ETag"] = etag
+    # Clients may keep the data, but must revalidate it before every use.
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CatalogCacheMixin:
+    """Serve the list and retrieve actions of a read-only catalog viewset from the versioned catalog cache."""
+
+    def cached(self, request, build_response):
+        version = catalog_version()
+        # Image URLs are absolute, so the host is part of what the etag identifies.
+        etag = '"{}"'.format(hashlib.md5(f"{version}:{request.build_absolute_uri()}".encode()).hexdigest())
+        return conditional_response(request, etag, lambda: build_response().data)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs))
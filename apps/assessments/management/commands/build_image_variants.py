@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.jobs.queue import enqueue
+from somaserver.images import tracked_fields
+
+
+class Command(BaseCommand):
+    help = "Queue the building of the missing derivatives of every assessment, subcategory and profile image."
+
+    def handle(self, *args, **options):
+        queued = 0
+        for model, field, variants_field in tracked_fields:
+            missing = model.objects.exclude(Q(**{f"{field}__isnull": True}) | Q(**{field: ""})).exclude(
+                **{f"{variants_field}__has_key": "source"}
+            )
+            for pk in missing.values_list("pk", flat=True).iterator():
+                enqueue(
+                    "images.build_variants",
+                    model=model._meta.label,
+                    pk=pk,
+                    field=field,
+                    variants_field=variants_field,
+                )
+                queued += 1
+        self.stdout.write(self.style.SUCCESS(f"Queued {queued} image variant builds."))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.assessments.media import COLLECT_AFTER, collect_blobs, reconcile_blob_references
+
+
+class Command(BaseCommand):
+    help = "Recount the references to every stored media blob and delete the ones unreferenced for long enough."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=COLLECT_AFTER.total_seconds() / 3600,
+            help="Only delete blobs unreferenced for at least this many hours.",
+        )
+
+    def handle(self, *args, **options):
+        reconcile_blob_references()
+        deleted = collect_blobs(collect_after=timedelta(hours=options["hours"]))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced media blobs."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.assessments.bundles import build_bundles, content_bundles
+from apps.assessments.models import Assessment
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cached content bundles of every active assessment."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        assessments = list(Assessment.objects.filter(is_active=True).only("id", "content_version").order_by("id"))
+        for start in range(0, len(assessments), batch_size):
+            batch = assessments[start : start + batch_size]
+            bundles = build_bundles([assessment.pk for assessment in batch])
+            content_bundles.set_many((assessment, bundles[assessment.pk]) for assessment in batch)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(assessments)} content bundles."))
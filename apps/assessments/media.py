@@ -0,0 +1,227 @@
+import hashlib
+import os
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.views.static import serve
+
+from somaserver.images import IMMUTABLE
+
+BLOBS_DIR = "blobs"
+HASH_CHUNK_SIZE = 64 * 1024
+# Unreferenced blobs are only deleted once their references have not changed for this long, so
+# uploads whose rows are not committed yet are left alone.
+COLLECT_AFTER = timedelta(days=1)
+
+# (model, file fields) of every model storing files in blob_storage.
+blob_fields = []
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f"{BLOBS_DIR}/")
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store every file once, under the SHA-256 digest of its content.
+
+    The name given by upload_to only contributes its extension. Storing a file that is already
+    stored writes nothing and returns the existing name, and as the content of a name never
+    changes, its URL can be cached forever. Files are never overwritten or deleted on save; the
+    references to them are counted by MediaBlob and the unreferenced ones deleted by the
+    collect_media_blobs command. Saving refreshes the MediaBlob row of a file before reusing it,
+    so a collection cannot delete a file that is about to be referenced.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content, see _save().
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = f"{BLOBS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+        touch_blob(name, lambda: content.size)
+        if self.exists(name):
+            return name
+        # The file is written under a name of its own and linked into place once complete, so
+        # concurrent uploads of the same content never see a partial file or wait on each other.
+        temporary = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        try:
+            os.link(self.path(temporary), self.path(name))
+        except FileExistsError:
+            # The same content was stored concurrently under this name; keep that copy.
+            pass
+        finally:
+            os.remove(self.path(temporary))
+        return name
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def media_blob_model():
+    return apps.get_model("assessments", "MediaBlob")
+
+
+def loaded_names(instance, fields):
+    """The names of the given file fields of an instance, without loading deferred fields (None)."""
+    names = {}
+    for field in fields:
+        value = instance.__dict__.get(field)
+        names[field] = (getattr(value, "name", value) or "") if field in instance.__dict__ else None
+    return names
+
+
+def touch_blob(name, size, references=0, MediaBlob=None):
+    """
+    Add references to the MediaBlob row of a blob and refresh its updated_at, creating the row if needed.
+
+    size is only called to create the row. The UPDATE waits for a collection that locked the row
+    first, which deletes the row and the file together, so the row is created again and the caller
+    finds the file missing.
+    """
+    MediaBlob = MediaBlob or media_blob_model()
+    blobs = MediaBlob.objects.filter(name=name)
+    while not blobs.update(ref_count=F("ref_count") + references, updated_at=timezone.now()):
+        MediaBlob.objects.bulk_create([MediaBlob(name=name, size=size())], ignore_conflicts=True)
+
+
+def add_references(names, delta, MediaBlob=None):
+    MediaBlob = MediaBlob or media_blob_model()
+    for name, count in Counter(name for name in names if is_blob(name)).items():
+        if delta > 0:
+            touch_blob(name, lambda: blob_storage.size(name), delta * count, MediaBlob)
+        else:
+            MediaBlob.objects.filter(name=name).update(
+                ref_count=F("ref_count") + delta * count, updated_at=timezone.now()
+            )
+
+
+def track_blob_references(model, *fields):
+    """
+    Count the references of the instances of a model to the blobs stored in their file fields.
+
+    The names loaded with an instance are remembered, so saves that do not change a file touch no blob.
+    """
+    blob_fields.append((model, fields))
+
+    def instance_loaded(sender, instance, **kwargs):
+        instance._blob_names = loaded_names(instance, fields)
+
+    def instance_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+        if raw:
+            return
+        names = loaded_names(instance, [field for field in fields if update_fields is None or field in update_fields])
+        added, removed = [], []
+        for field, name in names.items():
+            previous = instance._blob_names.get(field)
+            if name is None or name == previous:
+                continue
+            added.append(name)
+            if previous is not None:
+                removed.append(previous)
+        add_references(added, 1)
+        add_references(removed, -1)
+        instance._blob_names.update({field: name for field, name in names.items() if name is not None})
+
+    def instance_deleted(sender, instance, **kwargs):
+        add_references([name for name in instance._blob_names.values() if name], -1)
+
+    uid = f"{model._meta.label}.blobs"
+    post_init.connect(instance_loaded, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(instance_saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(instance_deleted, sender=model, weak=False, dispatch_uid=uid)
+
+
+def reconcile_blob_references(MediaBlob=None, fields=None):
+    """
+    Recount the references to every blob from the file columns that point to blobs.
+
+    Blobs referenced without a MediaBlob row get one.
+    """
+    MediaBlob = MediaBlob or media_blob_model()
+    counts = Counter()
+    for model, model_fields in fields or blob_fields:
+        for field in model_fields:
+            rows = (
+                model.objects.filter(**{f"{field}__startswith": f"{BLOBS_DIR}/"})
+                .values_list(field)
+                .annotate(references=Count("pk"))
+                .order_by()
+            )
+            counts.update(dict(rows.iterator()))
+
+    wrong = defaultdict(list)
+    for name, ref_count in MediaBlob.objects.values_list("name", "ref_count").iterator(chunk_size=2000):
+        count = counts.pop(name, 0)
+        if ref_count != count:
+            wrong[count].append(name)
+    # What is left in counts is referenced without a row.
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, size=blob_storage.size(name), ref_count=count) for name, count in counts.items()],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    # Only rows whose count is wrong are updated, so updated_at keeps telling since when a blob is unreferenced.
+    now = timezone.now()
+    for count, names in wrong.items():
+        for start in range(0, len(names), 500):
+            MediaBlob.objects.filter(name__in=names[start : start + 500]).update(ref_count=count, updated_at=now)
+
+
+def walk_blobs(directory=BLOBS_DIR):
+    if not blob_storage.exists(directory):
+        return
+    directories, files = blob_storage.listdir(directory)
+    for name in files:
+        yield f"{directory}/{name}"
+    for subdirectory in directories:
+        yield from walk_blobs(f"{directory}/{subdirectory}")
+
+
+def collect_blobs(MediaBlob=None, collect_after=COLLECT_AFTER):
+    """
+    Delete the blobs that were unreferenced for longer than collect_after, and the stored files without
+    a MediaBlob row (left by uploads whose transaction was rolled back). Returns the number of deleted files.
+    """
+    MediaBlob = MediaBlob or media_blob_model()
+    before = timezone.now() - collect_after
+    # Files without a row get one dated from the file, so they are deleted under the same lock as the others.
+    orphans = []
+    for name in walk_blobs():
+        modified_time = blob_storage.get_modified_time(name)
+        if modified_time < before and not MediaBlob.objects.filter(name=name).exists():
+            orphans.append(MediaBlob(name=name, size=blob_storage.size(name), updated_at=modified_time))
+    MediaBlob.objects.bulk_create(orphans, ignore_conflicts=True)
+
+    deleted = 0
+    unreferenced = MediaBlob.objects.filter(ref_count__lte=0, updated_at__lt=before)
+    for name in list(unreferenced.values_list("name", flat=True)):
+        with transaction.atomic():
+            # The DELETE checks the row again after a save that touched it commits, and keeps it
+            # locked until the file is gone.
+            if unreferenced.filter(name=name).delete()[0]:
+                blob_storage.delete(name)
+                deleted += 1
+    return deleted
+
+
+def serve_blob(request, path):
+    """Serve a blob with far-future cache headers; its name changes whenever its content does."""
+    response = serve(request, path, document_root=os.path.join(settings.MEDIA_ROOT, BLOBS_DIR))
+    response["Cache-Control"] = IMMUTABLE
+    return response
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0005_assessment_attempts_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assessment",
+            name="content_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
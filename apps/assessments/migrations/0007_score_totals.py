@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0006_assessment_content_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assessment",
+            name="score_sum",
+            field=models.FloatField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0007_score_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assessment",
+            name="followers_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0008_assessment_followers_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="choice",
+            index=models.Index(fields=["question", "correct_answer"], name="choice_question_correct_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                condition=models.Q(("is_active", True)), fields=["assessment"], name="question_active_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0010_catalog_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="assessment",
+            index=models.Index(condition=models.Q(("is_private", False)), fields=["id"], name="assessment_public_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="assessment",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_private", False)),
+                fields=["id"],
+                name="assessment_listed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="assessment",
+            index=models.Index(fields=["attempts_count", "id"], name="assessment_attempts_count_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="assessment",
+            index=models.Index(fields=["difficulty", "id"], name="assessment_difficulty_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="assessment",
+            index=models.Index(fields=["user_difficulty_rating", "id"], name="assessment_user_rating_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="assessment",
+            index=models.Index(fields=["average_score", "id"], name="assessment_average_score_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="assessment",
+            index=models.Index(fields=["created_at", "id"], name="assessment_created_at_idx"),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0011_assessment_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="followassessment",
+            index=models.Index(fields=["created_at", "id"], name="followassessment_created_idx"),
+        ),
+    ]
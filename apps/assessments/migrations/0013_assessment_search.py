@@ -0,0 +1,63 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:37
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+# Django does not manage generated columns, so the search column and its indexes only exist on Postgres,
+# where apps.assessments.search queries them. Other databases use the portable fallback.
+CREATE_SEARCH_INDEXES = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+ALTER TABLE assessments_assessment ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+    || setweight(to_tsvector('simple', coalesce(taxonomy_names, '')), 'B')
+    || setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+) STORED;
+CREATE INDEX assessment_search_idx ON assessments_assessment USING gin (search_vector);
+CREATE INDEX assessment_name_trgm_idx ON assessments_assessment USING gin (name gin_trgm_ops);
+"""
+
+DROP_SEARCH_INDEXES = """
+DROP INDEX IF EXISTS assessment_name_trgm_idx;
+DROP INDEX IF EXISTS assessment_search_idx;
+ALTER TABLE assessments_assessment DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+def backfill_taxonomy_names(apps, schema_editor):
+    Assessment = apps.get_model("assessments", "Assessment")
+    Subcategory = apps.get_model("assessments", "Subcategory")
+    Assessment.objects.update(
+        taxonomy_names=Subquery(
+            Subcategory.objects.filter(pk=OuterRef("subcategory"))
+            .annotate(names=Concat("name", Value(" "), "category__name", output_field=models.TextField()))
+            .values("names")
+        )
+    )
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SEARCH_INDEXES)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SEARCH_INDEXES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0012_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assessment",
+            name="taxonomy_names",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(backfill_taxonomy_names, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.5 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0013_assessment_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assessment",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="subcategory",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
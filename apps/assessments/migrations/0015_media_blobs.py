@@ -0,0 +1,95 @@
+# Generated by Django 4.2.5 on 2026-10-17 23:05
+
+import apps.assessments.media
+import apps.assessments.models
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0014_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="choice",
+            name="audio",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=apps.assessments.media.ContentAddressedStorage(),
+                upload_to=apps.assessments.models.choice_audio_upload,
+                validators=[apps.assessments.models.audio_file_size],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="choice",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=apps.assessments.media.ContentAddressedStorage(),
+                upload_to=apps.assessments.models.choice_image_upload,
+                validators=[apps.assessments.models.image_file_size],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="audio",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=apps.assessments.media.ContentAddressedStorage(),
+                upload_to=apps.assessments.models.question_audio_upload,
+                validators=[apps.assessments.models.audio_file_size],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="file",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=apps.assessments.media.ContentAddressedStorage(),
+                upload_to=apps.assessments.models.question_file_upload,
+                validators=[apps.assessments.models.general_file_size],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=apps.assessments.media.ContentAddressedStorage(),
+                upload_to=apps.assessments.models.question_image_upload,
+                validators=[apps.assessments.models.image_file_size],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="subcategory",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=apps.assessments.media.ContentAddressedStorage(),
+                upload_to=apps.assessments.models.subcategory_image_upload,
+                validators=[apps.assessments.models.image_file_size],
+            ),
+        ),
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                ("name", models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ("size", models.PositiveBigIntegerField(default=0)),
+                ("ref_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["ref_count", "updated_at"], name="mediablob_unreferenced_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.5 on 2026-10-17 23:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0015_media_blobs"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="choice",
+            name="question",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="choices",
+                to="assessments.question",
+            ),
+        ),
+    ]
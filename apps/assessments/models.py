@@ -1,7 +1,18 @@
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Concat
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+from somaserver.db import CounterFieldsMixin
+from somaserver.images import track_image_variants
+from .media import blob_storage, track_blob_references
 
 
 def validate_file_size(value, max_size):
@@ -23,6 +34,7 @@ def general_file_size(value):
 
 class Language(models.Model):
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -31,6 +43,7 @@ class Language(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -43,11 +56,17 @@ def subcategory_image_upload(instance, filename):
     return f"categories/{filename}"
 
 
-class Subcategory(models.Model):
+class Subcategory(CounterFieldsMixin, models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField()
-    image = models.ImageField(upload_to=subcategory_image_upload, validators=[image_file_size], blank=True, null=True)
+    image = models.ImageField(
+        upload_to=subcategory_image_upload, storage=blob_storage, validators=[image_file_size], blank=True, null=True
+    )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    counter_fields = ("image_variants",)
 
     class Meta:
         verbose_name_plural = "Subcategories"
@@ -60,7 +79,7 @@ def content_file_name(instance, filename):
     return f"assessments/assessment_images/{filename}"
 
 
-class Assessment(models.Model):
+class Assessment(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     language = models.ForeignKey(Language, on_delete=models.SET_NULL, null=True, blank=True, related_name="assessments")
@@ -68,6 +87,7 @@ class Assessment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     subcategory = models.ForeignKey(Subcategory, on_delete=models.CASCADE)
     image = models.ImageField(upload_to=content_file_name, validators=[image_file_size], blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_private = models.BooleanField(default=False)
     is_active = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -82,10 +102,69 @@ class Assessment(models.Model):
     user_difficulty_rating = models.FloatField(null=True, blank=True)
     average_score = models.FloatField(null=True, blank=True)
     attempts_count = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0, editable=False)
+    followers_count = models.IntegerField(default=0, editable=False)
+    content_version = models.PositiveIntegerField(default=0, editable=False)
+    # Subcategory and category names, copied here so the search vector can index them (see apps.assessments.search).
+    taxonomy_names = models.TextField(blank=True, default="", editable=False)
+
+    counter_fields = (
+        "content_version",
+        "attempts_count",
+        "score_sum",
+        "average_score",
+        "followers_count",
+        "image_variants",
+    )
+
+    class Meta:
+        indexes = [
+            # The assessment lists, for authenticated and anonymous users.
+            models.Index(fields=["id"], condition=Q(is_private=False), name="assessment_public_idx"),
+            models.Index(fields=["id"], condition=Q(is_private=False, is_active=True), name="assessment_listed_idx"),
+            # Every ordering_fields option of AssessmentViewSet, with the id tiebreaker.
+            models.Index(fields=["attempts_count", "id"], name="assessment_attempts_count_idx"),
+            models.Index(fields=["difficulty", "id"], name="assessment_difficulty_idx"),
+            models.Index(fields=["user_difficulty_rating", "id"], name="assessment_user_rating_idx"),
+            models.Index(fields=["average_score", "id"], name="assessment_average_score_idx"),
+            models.Index(fields=["created_at", "id"], name="assessment_created_at_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"subcategory", "subcategory_id"} & set(update_fields):
+            self.taxonomy_names = f"{self.subcategory.name} {self.subcategory.category.name}"
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "taxonomy_names"}
+        super().save(*args, **kwargs)
+
+
+CATALOG_VERSION_KEY = "catalog-version"
+
+
+def invalidate_catalog():
+    """Make the next catalog request recompute the catalog version, see apps.assessments.catalog."""
+    cache.delete(CATALOG_VERSION_KEY)
+
+
+def refresh_taxonomy_names(assessments):
+    """Copy the subcategory and category names into the taxonomy_names of the given assessments queryset."""
+    assessments.update(
+        taxonomy_names=Subquery(
+            Subcategory.objects.filter(pk=OuterRef("subcategory"))
+            .annotate(names=Concat("name", Value(" "), "category__name", output_field=models.TextField()))
+            .values("names")
+        )
+    )
+
+
+def bump_content_version(**filters):
+    """Invalidate every cached view of the content (questions and choices) of the matching assessments."""
+    Assessment.objects.filter(**filters).update(content_version=F("content_version") + 1)
+
 
 def question_audio_upload(instance, filename):
     return f"assessments/questions/audios/{filename}"
@@ -102,14 +181,25 @@ def question_file_upload(instance, filename):
 class Question(models.Model):
     assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name="questions")
     description = models.TextField()
-    audio = models.FileField(upload_to=question_audio_upload, validators=[audio_file_size], blank=True, null=True)
-    image = models.ImageField(upload_to=question_image_upload, validators=[image_file_size], blank=True, null=True)
-    file = models.FileField(upload_to=question_file_upload, validators=[general_file_size], blank=True, null=True)
+    audio = models.FileField(
+        upload_to=question_audio_upload, storage=blob_storage, validators=[audio_file_size], blank=True, null=True
+    )
+    image = models.ImageField(
+        upload_to=question_image_upload, storage=blob_storage, validators=[image_file_size], blank=True, null=True
+    )
+    file = models.FileField(
+        upload_to=question_file_upload, storage=blob_storage, validators=[general_file_size], blank=True, null=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=False)
     is_multiple_choice = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["assessment"], condition=Q(is_active=True), name="question_active_idx"),
+        ]
+
     def __str__(self):
         return self.description[:50] + "..." if len(self.description) > 50 else self.description
 
@@ -123,16 +213,47 @@ def choice_image_upload(instance, filename):
 
 
 class Choice(models.Model):
-    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="choices")
+    # Lookups by question use the (question, correct_answer) index.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="choices", db_index=False)
     description = models.TextField()
     correct_answer = models.BooleanField(default=False)
-    audio = models.FileField(upload_to=choice_audio_upload, validators=[audio_file_size], blank=True, null=True)
-    image = models.ImageField(upload_to=choice_image_upload, validators=[image_file_size], blank=True, null=True)
+    audio = models.FileField(
+        upload_to=choice_audio_upload, storage=blob_storage, validators=[audio_file_size], blank=True, null=True
+    )
+    image = models.ImageField(
+        upload_to=choice_image_upload, storage=blob_storage, validators=[image_file_size], blank=True, null=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["question", "correct_answer"], name="choice_question_correct_idx"),
+        ]
 
     def __str__(self):
         return self.description[:50] + "..." if len(self.description) > 50 else self.description
 
 
+class MediaBlob(models.Model):
+    """
+    A file stored by apps.assessments.media.blob_storage, with the number of file fields referencing it.
+
+    ref_count is kept up to date by the receivers of track_blob_references, and recounted by the
+    collect_media_blobs command before it deletes the blobs unreferenced since updated_at.
+    """
+
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["ref_count", "updated_at"], name="mediablob_unreferenced_idx")]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
 class AssessmentDifficultyRating(models.Model):
     assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name="difficulty_ratings")
     user = models.ForeignKey(
@@ -161,6 +282,69 @@ class FollowAssessment(models.Model):
     class Meta:
         unique_together = ("follower", "assessment")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="followassessment_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.follower} -> {self.assessment}"
+
+
+track_image_variants(Subcategory, "image", "image_variants")
+track_image_variants(Assessment, "image", "image_variants")
+track_blob_references(Subcategory, "image")
+track_blob_references(Question, "audio", "image", "file")
+track_blob_references(Choice, "audio", "image")
+
+
+@receiver(post_save, sender=Language)
+@receiver(post_delete, sender=Language)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+def catalog_changed(sender, instance, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Category)
+def category_renamed(sender, instance, created, **kwargs):
+    if not created:
+        refresh_taxonomy_names(Assessment.objects.filter(subcategory__category=instance))
+
+
+@receiver(post_save, sender=Subcategory)
+def subcategory_renamed(sender, instance, created, **kwargs):
+    if not created:
+        refresh_taxonomy_names(Assessment.objects.filter(subcategory=instance))
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_content_changed(sender, instance, **kwargs):
+    bump_content_version(pk=instance.assessment_id)
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_content_changed(sender, instance, **kwargs):
+    bump_content_version(questions=instance.question_id)
+
+
+@receiver(post_save, sender=FollowAssessment)
+def follow_assessment_created(sender, instance, created, **kwargs):
+    if created:
+        update_assessment_followers_count(instance, 1)
+
+
+@receiver(post_delete, sender=FollowAssessment)
+def follow_assessment_deleted(sender, instance, **kwargs):
+    update_assessment_followers_count(instance, -1)
+
+
+def update_assessment_followers_count(follow, delta):
+    """Follows only count while the follower is active."""
+    User = get_user_model()
+    Assessment.objects.filter(pk=follow.assessment_id).filter(
+        Exists(User.objects.filter(pk=follow.follower_id, is_active=True))
+    ).update(followers_count=F("followers_count") + delta)
@@ -0,0 +1,46 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Assessment
+
+
+def search_assessments(queryset, text):
+    """
+    Filter an assessment queryset by a free text query and order it by relevance.
+
+    On Postgres this uses the generated search_vector column (name, subcategory and category
+    names and description, weighted in that order) and trigram word similarity on the name
+    to tolerate typos, both served by GIN indexes. Other databases fall back to substring matches.
+    """
+    if connection.vendor == "postgresql":
+        return postgres_search(queryset, text)
+    return fallback_search(queryset, text)
+
+
+def postgres_search(queryset, text):
+    query = SearchQuery(text, config="simple", search_type="websearch")
+    vector = RawSQL(f'"{Assessment._meta.db_table}"."search_vector"', [], output_field=SearchVectorField())
+    return (
+        queryset.alias(search_vector=vector)
+        .filter(Q(search_vector=query) | Q(name__trigram_word_similar=text))
+        .annotate(rank=SearchRank(F("search_vector"), query) + TrigramWordSimilarity(text, "name"))
+        .order_by("-rank", "id")
+    )
+
+
+def fallback_search(queryset, text):
+    terms = text.split()
+    for term in terms:
+        queryset = queryset.filter(
+            Q(name__icontains=term) | Q(taxonomy_names__icontains=term) | Q(description__icontains=term)
+        )
+    return queryset.annotate(
+        rank=Case(
+            When(name__icontains=text, then=Value(3)),
+            When(taxonomy_names__icontains=text, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by("-rank", "id")
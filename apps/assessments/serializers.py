@@ -11,6 +11,7 @@ from .models import (
     FollowAssessment,
 )
 from apps.attempts.models import Attempt
+from somaserver.images import ImageVariantsField
 
 
 class LanguageSerializer(serializers.ModelSerializer):
@@ -20,9 +21,11 @@ class LanguageSerializer(serializers.ModelSerializer):
 
 
 class SubcategoryReadOnlySerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Subcategory
-        fields = ["id", "name", "image"]
+        fields = ["id", "name", "image", "image_variants"]
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -34,6 +37,8 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class SubcategorySerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Subcategory
         fields = "__all__"
@@ -43,10 +48,12 @@ class AssessmentSerializer(serializers.ModelSerializer):
     user_username = serializers.ReadOnlyField(source="user.username")
     subcategory_name = serializers.ReadOnlyField(source="subcategory.name")
     subcategory_image = serializers.ImageField(source="subcategory.image", required=False, allow_null=True, use_url=True)
+    subcategory_image_variants = ImageVariantsField(source="subcategory.image_variants")
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Assessment
-        exclude = ["is_private"]
+        exclude = ["is_private", "taxonomy_names"]
         read_only_fields = (
             "user",
             "average_score",
@@ -63,16 +70,13 @@ class AssessmentDetailSerializer(serializers.ModelSerializer):
     category_name = serializers.ReadOnlyField(source="subcategory.category.name")
     subcategory_name = serializers.ReadOnlyField(source="subcategory.name")
     user_username = serializers.ReadOnlyField(source="user.username")
-    followers_count = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
     available_attempts = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = Assessment
-        fields = "__all__"
-
-    def get_followers_count(self, obj):
-        return FollowAssessment.objects.filter(assessment=obj, follower__is_active=True).count()
+        exclude = ["taxonomy_names"]
 
     def get_available_attempts(self, obj):
         user = self.context["request"].user
@@ -121,6 +125,7 @@ class FollowAssessmentSerializer(serializers.ModelSerializer):
     assessment_min_score = serializers.ReadOnlyField(source="assessment.min_score")
     assessment_allowed_attempts = serializers.ReadOnlyField(source="assessment.allowed_attempts")
     picture = serializers.SerializerMethodField()
+    picture_variants = ImageVariantsField(source="assessment.image_variants")
     available_attempts = serializers.SerializerMethodField()
 
     class Meta:
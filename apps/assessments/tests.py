@@ -1,3 +1,618 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from . import authoring
+from .cache import answer_keys
+from .media import blob_storage, collect_blobs, reconcile_blob_references, serve_blob
+from .models import Category, Subcategory, Assessment, Question, Choice, MediaBlob
+from .serializers import SubcategoryReadOnlySerializer
+from apps.jobs.models import Job
+from apps.jobs.queue import run_pending
+from apps.users.models import CustomUser
+from somaserver.images import IMMUTABLE, serve_variant
+from somaserver.testing import QueryPlanAssertions
+
+
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+        assessments = Assessment.objects.bulk_create(
+            Assessment(name=f"Assessment {i}", description="Test", user=author, subcategory=subcategory)
+            for i in range(20)
+        )
+        questions = Question.objects.bulk_create(
+            Question(assessment=assessment, description=f"Question {i}", is_active=i % 4 != 0)
+            for assessment in assessments
+            for i in range(20)
+        )
+        Choice.objects.bulk_create(
+            Choice(question=question, description=f"Choice {i}", correct_answer=i == 0)
+            for question in questions
+            for i in range(4)
+        )
+        cls.assessment = assessments[0]
+        cls.question = questions[0]
+
+    def test_active_questions_of_an_assessment(self):
+        self.assertUsesIndex(
+            Question.objects.filter(assessment=self.assessment, is_active=True).values("id"), "question_active_idx"
+        )
+
+    def test_inactive_questions_of_an_assessment(self):
+        self.assertNoSequentialScan(Question.objects.filter(assessment=self.assessment, is_active=False))
+
+    def test_assessment_list_orderings(self):
+        for field, index_name in (
+            ("attempts_count", "assessment_attempts_count_idx"),
+            ("difficulty", "assessment_difficulty_idx"),
+            ("user_difficulty_rating", "assessment_user_rating_idx"),
+            ("average_score", "assessment_average_score_idx"),
+            ("created_at", "assessment_created_at_idx"),
+        ):
+            self.assertUsesIndex(Assessment.objects.order_by(field, "id")[:10], index_name)
+            self.assertUsesIndex(Assessment.objects.order_by(f"-{field}", "-id")[:10], index_name)
+
+    def test_correct_choices_of_a_question(self):
+        self.assertUsesIndex(
+            Choice.objects.filter(question=self.question, correct_answer=True), "choice_question_correct_idx"
+        )
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def add_categories(self, count):
+        for _ in range(count):
+            category = Category.objects.create(name=f"Category {Category.objects.count()}", description="Test")
+            Subcategory.objects.create(category=category, name=f"Subcategory {category.pk}", description="Test")
+
+    def get_categories(self, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("assessments:categories-list"), **headers)
+        return response, len(ctx.captured_queries)
+
+    def test_category_list_is_built_from_one_prefetched_query(self):
+        self.add_categories(2)
+        _, few_categories_queries = self.get_categories()
+        self.add_categories(8)
+        response, many_categories_queries = self.get_categories()
+
+        self.assertEqual(response.data["count"], 10)
+        self.assertEqual(len(response.data["results"][0]["subcategories"]), 1)
+        self.assertEqual(few_categories_queries, many_categories_queries)
+
+    def test_unchanged_catalog_is_not_modified(self):
+        self.add_categories(2)
+        response, _ = self.get_categories()
+        etag = response["ETag"]
+
+        response, queries = self.get_categories(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries, 0)
+
+        # Without the etag the data is served from the cache.
+        response, queries = self.get_categories()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 0)
+
+    def test_saves_invalidate_the_catalog(self):
+        self.add_categories(1)
+        response, _ = self.get_categories()
+
+        Subcategory.objects.update(name="Renamed")
+        Subcategory.objects.get().save()
+        response, _ = self.get_categories(HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["subcategories"][0]["name"], "Renamed")
+
+    def test_deleted_rows_are_not_hidden_by_dates(self):
+        self.add_categories(2)
+        response, _ = self.get_categories()
+        self.assertNotIn("Last-Modified", response)
+
+        Category.objects.first().delete()
+        response, _ = self.get_categories(HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 1)
+
+
+class AnswerKeyCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Test")
+        cls.assessment = Assessment.objects.create(
+            name="Test", description="Test", user=author, subcategory=subcategory
+        )
+
+    def setUp(self):
+        cache.clear()
+        answer_keys.clear()
+
+    def version(self):
+        return Assessment.objects.values_list("content_version", flat=True).get(pk=self.assessment.pk)
+
+    def test_content_changes_bump_the_version(self):
+        versions = [self.version()]
+        question = Question.objects.create(assessment=self.assessment, description="Question")
+        versions.append(self.version())
+        choice = Choice.objects.create(question=question, description="Right", correct_answer=True)
+        versions.append(self.version())
+        choice.description = "Still right"
+        choice.save()
+        versions.append(self.version())
+        choice.delete()
+        versions.append(self.version())
+        question.save()
+        versions.append(self.version())
+        question.delete()
+        versions.append(self.version())
+        self.assertEqual(versions, list(range(versions[0], versions[0] + 7)))
+
+    def test_stale_answer_keys_are_not_served(self):
+        question = Question.objects.create(assessment=self.assessment, description="Question")
+        right = Choice.objects.create(question=question, description="Right", correct_answer=True)
+        wrong = Choice.objects.create(question=question, description="Wrong")
+        self.assessment.refresh_from_db(fields=["content_version"])
+        self.assertEqual(answer_keys.get(self.assessment)[question.pk], ({right.pk}, {right.pk, wrong.pk}))
+
+        wrong.correct_answer = True
+        wrong.save()
+        self.assessment.refresh_from_db(fields=["content_version"])
+        self.assertEqual(answer_keys.get(self.assessment)[question.pk], ({right.pk, wrong.pk}, {right.pk, wrong.pk}))
+
+    def test_stats_count_each_level(self):
+        before = answer_keys.stats()
+        answer_keys.get(self.assessment)
+        answer_keys.get(self.assessment)
+        # Another worker finds the entry in the shared cache.
+        answer_keys.clear()
+        answer_keys.get(self.assessment)
+        after = answer_keys.stats()
+        self.assertEqual(
+            {level: after[level] - before[level] for level in ("hits", "shared_hits", "misses")},
+            {"hits": 1, "shared_hits": 1, "misses": 1},
+        )
+        self.assertEqual(after["size"], 1)
+
+
+class AssessmentListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        cls.subcategories = [
+            Subcategory.objects.create(category=category, name=f"Subcategory {i}", description="Test") for i in range(5)
+        ]
+
+    def add_assessments(self, count):
+        for i in range(count):
+            n = CustomUser.objects.count()
+            author = CustomUser.objects.create_user(username=f"user{n}", email=f"user{n}@test.com", password="test1234")
+            Assessment.objects.create(
+                name="Test",
+                description="Test",
+                user=author,
+                subcategory=self.subcategories[i % len(self.subcategories)],
+                difficulty=i % 3 + 1,
+                is_active=True,
+            )
+
+    def list_assessments(self, client, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse("assessments:assessments-list"), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.author)
+        for client in (APIClient(), authenticated):
+            cache.clear()
+            Assessment.objects.all().delete()
+            self.add_assessments(2)
+            _, few_assessments_queries = self.list_assessments(client)
+            self.add_assessments(8)
+            response, many_assessments_queries = self.list_assessments(client)
+
+            self.assertEqual(len(response.data["results"]), 10)
+            self.assertEqual(few_assessments_queries, many_assessments_queries)
+
+    def test_ordering_is_stable_across_pages(self):
+        self.add_assessments(15)
+        first_page, _ = self.list_assessments(APIClient(), ordering="difficulty")
+        second_page, _ = self.list_assessments(APIClient(), ordering="difficulty", page=2)
+
+        ids = [row["id"] for row in first_page.data["results"] + second_page.data["results"]]
+        expected = list(Assessment.objects.order_by("difficulty", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        cls.physics = Subcategory.objects.create(category=category, name="Physics", description="Test")
+        cls.biology = Subcategory.objects.create(category=category, name="Biology", description="Test")
+        cls.newton = cls.create_assessment("Newton's laws", "Forces and motion", cls.physics)
+        cls.cells = cls.create_assessment("Cells", "Membranes and organelles, as in mechanics", cls.biology)
+        cls.mechanics = cls.create_assessment("Mechanics", "Classical mechanics", cls.physics)
+
+    @classmethod
+    def create_assessment(cls, name, description, subcategory):
+        return Assessment.objects.create(
+            name=name, description=description, user=cls.author, subcategory=subcategory, is_active=True
+        )
+
+    def search(self, q):
+        response = APIClient().get(reverse("assessments:assessments-search"), {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.data["results"]]
+
+    def test_matches_taxonomy_and_description(self):
+        self.assertEqual(self.search("physics"), [self.newton.id, self.mechanics.id])
+        self.assertEqual(self.search("science"), [self.newton.id, self.cells.id, self.mechanics.id])
+        self.assertEqual(self.search("organelles"), [self.cells.id])
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search("mechanics"), [self.mechanics.id, self.cells.id])
+
+    def test_renaming_a_subcategory_updates_the_search_data(self):
+        self.biology.name = "Cytology"
+        self.biology.save()
+        self.assertEqual(self.search("cytology"), [self.cells.id])
+        self.assertEqual(self.search("biology"), [])
+
+    def test_moving_an_assessment_updates_the_search_data(self):
+        self.cells.subcategory = self.physics
+        self.cells.save(update_fields=["subcategory"])
+        self.assertEqual(self.search("physics"), [self.newton.id, self.cells.id, self.mechanics.id])
+        self.assertEqual(self.search("biology"), [])
+
+    def test_short_query_is_rejected(self):
+        response = APIClient().get(reverse("assessments:assessments-search"), {"q": " a "})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkAuthoringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        cls.subcategory = Subcategory.objects.create(category=category, name="Physics", description="Test")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def question(self, i, correct=1):
+        return {
+            "description": f"Question {i}",
+            "choices": [{"description": f"Choice {j}", "correct_answer": j < correct} for j in range(3)],
+        }
+
+    def post(self, body, content_type="application/json", **params):
+        url = reverse("assessments:assessments-bulk")
+        if params:
+            url += "?" + "&".join(f"{key}={value}" for key, value in params.items())
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, body, content_type=content_type)
+        return response, len(ctx.captured_queries)
+
+    def test_assessment_is_created_with_its_questions(self):
+        assessment = {"name": "Bulk", "description": "Bulk", "subcategory": self.subcategory.pk}
+        questions = [self.question(i) for i in range(4)] + [self.question(4, correct=2)]
+        response, _ = self.post(json.dumps({"assessment": assessment, "questions": questions}), activate="true")
+
+        self.assertEqual(response.status_code, 201)
+        created = Assessment.objects.get(pk=response.data["assessment"])
+        self.assertEqual(created.user, self.author)
+        self.assertEqual(created.questions.count(), 5)
+        self.assertEqual(Choice.objects.filter(question__assessment=created).count(), 15)
+        self.assertEqual([row["is_active"] for row in response.data["questions"]], [True] * 4 + [False])
+        self.assertEqual(response.data["questions"][4]["error"], "The question should have only 1 correct choice.")
+
+    def test_query_count_does_not_depend_on_number_of_questions(self):
+        assessment = Assessment.objects.create(
+            name="Bulk", description="Bulk", user=self.author, subcategory=self.subcategory
+        )
+        ndjson = "\n".join(json.dumps(self.question(i)) for i in range(2))
+        response, few_questions_queries = self.post(ndjson, "application/x-ndjson", assessment=assessment.pk)
+        self.assertEqual(response.status_code, 201)
+        ndjson = "\n".join(json.dumps(self.question(i)) for i in range(40))
+        response, many_questions_queries = self.post(ndjson, "application/x-ndjson", assessment=assessment.pk)
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(few_questions_queries, many_questions_queries)
+        self.assertEqual(assessment.questions.filter(is_active=False).count(), 42)
+
+    def test_every_invalid_question_is_reported_and_nothing_is_written(self):
+        assessment = {"name": "Bulk", "description": "Bulk", "subcategory": self.subcategory.pk}
+        questions = [self.question(0), {"choices": []}, self.question(2), {"description": "Missing choices"}]
+        response, _ = self.post(json.dumps({"assessment": assessment, "questions": questions}))
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["questions"]
+        self.assertEqual([index for index, error in enumerate(errors) if error], [1, 3])
+        self.assertFalse(Assessment.objects.exists())
+
+    def test_ndjson_banks_are_authored_in_chunks(self):
+        assessment = {"name": "Bulk", "description": "Bulk", "subcategory": self.subcategory.pk}
+        questions = [self.question(i) for i in range(5)]
+        lines = [json.dumps({"assessment": assessment})] + [json.dumps(question) for question in questions]
+        with mock.patch.object(authoring, "MAX_QUESTIONS", 2), mock.patch.object(authoring, "MAX_NDJSON_QUESTIONS", 5):
+            response, _ = self.post("\n".join(lines[:4] + ['{"choices": []}'] + lines[5:]), "application/x-ndjson")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual([index for index, error in enumerate(response.data["questions"]) if error], [3])
+            self.assertFalse(Assessment.objects.exists())
+
+            response, _ = self.post("\n".join(lines + [lines[1]]), "application/x-ndjson")
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(Assessment.objects.exists())
+
+            response, _ = self.post("\n".join(lines), "application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Question.objects.filter(assessment=response.data["assessment"]).count(), 5)
+        self.assertEqual(Choice.objects.count(), 15)
+
+    def test_other_users_assessments_are_not_found(self):
+        other = CustomUser.objects.create_user(username="other", email="other@test.com", password="test1234")
+        assessment = Assessment.objects.create(
+            name="Other", description="Other", user=other, subcategory=self.subcategory
+        )
+        response, _ = self.post(json.dumps({"questions": [self.question(0)]}), assessment=assessment.pk)
+        self.assertEqual(response.status_code, 404)
+
+
+class ValidationEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        cls.subcategory = Subcategory.objects.create(category=category, name="Physics", description="Test")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.assessment = Assessment.objects.create(
+            name="Test", description="Test", user=self.author, subcategory=self.subcategory, number_of_questions=5
+        )
+
+    def add_questions(self, count, correct=1):
+        questions = []
+        for i in range(count):
+            question = Question.objects.create(assessment=self.assessment, description=f"Question {i}")
+            Choice.objects.bulk_create(
+                Choice(question=question, description=f"Choice {j}", correct_answer=j < correct) for j in range(3)
+            )
+            questions.append(question)
+        return questions
+
+    def validate_assessment(self):
+        url = reverse("assessments:assessments-validate-and-activate", args=[self.assessment.pk])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url)
+        return response, len(ctx.captured_queries)
+
+    def test_every_error_is_reported_and_valid_questions_are_activated(self):
+        self.add_questions(3)
+        invalid = self.add_questions(2, correct=0)
+        response, _ = self.validate_assessment()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["question_id"] for error in response.data["errors"]], [q.pk for q in invalid])
+        self.assertEqual(self.assessment.questions.filter(is_active=True).count(), 3)
+
+        Choice.objects.filter(question__in=invalid, description="Choice 0").update(correct_answer=True)
+        response, _ = self.validate_assessment()
+        self.assertEqual(response.status_code, 200)
+        self.assessment.refresh_from_db()
+        self.assertTrue(self.assessment.is_active)
+
+    def test_query_count_does_not_depend_on_number_of_questions(self):
+        Assessment.objects.filter(pk=self.assessment.pk).update(number_of_questions=50)
+        self.add_questions(2)
+        _, few_questions_queries = self.validate_assessment()
+        Question.objects.update(is_active=False)
+        self.add_questions(10)
+        _, many_questions_queries = self.validate_assessment()
+        self.assertEqual(few_questions_queries, many_questions_queries)
+
+    def test_bulk_activation_is_all_or_nothing(self):
+        valid = self.add_questions(2)
+        invalid = self.add_questions(1, correct=2)
+        url = reverse("assessments:questions-validate-and-activate-bulk")
+        ids = [q.pk for q in valid + invalid]
+
+        response = self.client.post(url, {"question_ids": ids}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["question_id"] for error in response.data["errors"]], [invalid[0].pk])
+        self.assertFalse(Question.objects.filter(is_active=True).exists())
+
+        response = self.client.post(url, {"question_ids": [q.pk for q in valid]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Question.objects.filter(is_active=True).count(), 2)
+
+        other = CustomUser.objects.create_user(username="other", email="other@test.com", password="test1234")
+        self.client.force_authenticate(other)
+        response = self.client.post(url, {"question_ids": [valid[0].pk]}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+
+class ImageVariantsTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        category = Category.objects.create(name="Science", description="Science")
+        self.subcategory = Subcategory.objects.create(category=category, name="Physics", description="Test")
+
+    def upload(self, name="physics.png", size=(1200, 600)):
+        output = io.BytesIO()
+        Image.new("RGB", size, (200, 30, 30)).save(output, "PNG")
+        self.subcategory.image = SimpleUploadedFile(name, output.getvalue(), content_type="image/png")
+        self.subcategory.save()
+
+    def test_variants_are_built_by_a_job(self):
+        self.upload()
+        self.subcategory.refresh_from_db()
+        self.assertEqual(self.subcategory.image_variants, {})
+        self.assertEqual(run_pending(), 1)
+
+        self.subcategory.refresh_from_db()
+        variants = self.subcategory.image_variants
+        self.assertEqual(variants["source"], self.subcategory.image.name)
+        self.assertEqual((variants["sizes"]["medium"]["width"], variants["sizes"]["medium"]["height"]), (640, 320))
+        self.assertEqual((variants["sizes"]["thumbnail"]["width"], variants["sizes"]["thumbnail"]["height"]), (160, 80))
+        with Image.open(os.path.join(self.media_root, variants["sizes"]["thumbnail"]["webp"])) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (160, 80)))
+
+        data = SubcategoryReadOnlySerializer(self.subcategory).data
+        self.assertEqual(data["image_variants"]["medium"]["jpeg"], "/media/" + variants["sizes"]["medium"]["jpeg"])
+
+        # Saves that keep the image queue nothing, and the same image gets the same names.
+        self.subcategory.save()
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 0)
+        self.upload(name="copy.png")
+        run_pending()
+        self.subcategory.refresh_from_db()
+        self.assertEqual(self.subcategory.image_variants["sizes"], variants["sizes"])
+
+    def test_images_pillow_refuses_get_no_variants(self):
+        self.upload()
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            self.assertEqual(run_pending(), 1)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.subcategory.refresh_from_db()
+        self.assertEqual(self.subcategory.image_variants, {"source": self.subcategory.image.name, "sizes": {}})
+
+    def test_removing_the_image_clears_the_variants(self):
+        self.upload()
+        run_pending()
+        self.subcategory.image = None
+        self.subcategory.save()
+        self.subcategory.refresh_from_db()
+        self.assertEqual(self.subcategory.image_variants, {})
+        self.assertIsNone(SubcategoryReadOnlySerializer(self.subcategory).data["image_variants"])
+
+    def test_variants_are_served_as_immutable(self):
+        self.upload()
+        run_pending()
+        self.subcategory.refresh_from_db()
+        name = self.subcategory.image_variants["sizes"]["thumbnail"]["jpeg"]
+        response = serve_variant(RequestFactory().get("/"), name.split("/", 1)[1])
+        self.assertEqual(response["Cache-Control"], IMMUTABLE)
+
+
+class MediaBlobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Test")
+        self.assessment = Assessment.objects.create(
+            name="Mechanics", description="Test", user=author, subcategory=subcategory
+        )
+
+    def add_question(self, content=b"%PDF-1.4 forces", name="Forces.PDF"):
+        return Question.objects.create(
+            assessment=self.assessment, description="Q", file=SimpleUploadedFile(name, content)
+        )
+
+    def refs(self, name):
+        return MediaBlob.objects.get(name=name).ref_count
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.add_question()
+        second = self.add_question(name="copy.pdf")
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertRegex(first.file.name, r"^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$")
+        self.assertEqual(os.listdir(os.path.dirname(first.file.path)), [os.path.basename(first.file.name)])
+        self.assertEqual(self.refs(first.file.name), 2)
+
+        response = serve_blob(RequestFactory().get("/"), first.file.name.split("/", 1)[1])
+        self.assertEqual(response["Cache-Control"], IMMUTABLE)
+
+    def test_concurrent_uploads_of_the_same_content_keep_one_file(self):
+        name = self.add_question().file.name
+        # The other upload stored the file after this one checked for it.
+        with mock.patch.object(blob_storage, "exists", return_value=False):
+            self.assertEqual(blob_storage.save("copy.pdf", ContentFile(b"%PDF-1.4 forces")), name)
+        self.assertEqual(os.listdir(os.path.dirname(blob_storage.path(name))), [os.path.basename(name)])
+
+    def test_references_follow_saves_and_deletes(self):
+        first = self.add_question()
+        shared = first.file.name
+        second = Question.objects.get(pk=self.add_question().pk)
+        second.file = SimpleUploadedFile("other.pdf", b"%PDF-1.4 energy")
+        second.save()
+        self.assertEqual(self.refs(shared), 1)
+        self.assertEqual(self.refs(second.file.name), 1)
+
+        # Saves that keep the file and deletes cascading from the assessment.
+        Question.objects.get(pk=first.pk).save()
+        self.assertEqual(self.refs(shared), 1)
+        self.assessment.delete()
+        self.assertEqual(list(MediaBlob.objects.values_list("ref_count", flat=True)), [0, 0])
+
+    def test_collect_deletes_only_unreferenced_blobs(self):
+        kept = self.add_question().file
+        dropped = self.add_question(content=b"%PDF-1.4 energy").file
+        Question.objects.filter(file=dropped.name).delete()
+        orphan = blob_storage.save("orphan.txt", ContentFile(b"rolled back"))
+        # Counts the receivers could not see are fixed before collecting.
+        MediaBlob.objects.filter(name=kept.name).update(ref_count=0)
+
+        self.assertEqual(collect_blobs(), 0)
+        reconcile_blob_references()
+        self.assertEqual(self.refs(kept.name), 1)
+        self.assertEqual(collect_blobs(collect_after=timedelta(0)), 2)
+        self.assertTrue(blob_storage.exists(kept.name))
+        self.assertFalse(blob_storage.exists(dropped.name))
+        self.assertFalse(blob_storage.exists(orphan))
+        self.assertEqual(list(MediaBlob.objects.values_list("name", flat=True)), [kept.name])
+
+    def test_uploads_reusing_a_blob_keep_it_from_collection(self):
+        name = self.add_question().file.name
+        Question.objects.all().delete()
+        MediaBlob.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        # An upload of the same content, not saved in its row yet.
+        self.assertEqual(blob_storage.save("copy.pdf", ContentFile(b"%PDF-1.4 forces")), name)
+        self.assertEqual(collect_blobs(), 0)
+        self.assertTrue(blob_storage.exists(name))
+
+        with mock.patch.object(blob_storage, "size") as size:
+            self.add_question()
+        size.assert_not_called()
+        self.assertEqual(self.refs(name), 1)
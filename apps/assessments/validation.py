@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Question
+
+QuestionCheck = namedtuple("QuestionCheck", ["id", "is_active", "error"])
+
+
+def choices_error(is_multiple_choice, total_choices, correct_choices):
+    """Return why a question with the given choice counts cannot be active, or None if it can."""
+    if is_multiple_choice:
+        if total_choices < 3:
+            return "The question should have at least 3 choices."
+        if correct_choices < 2:
+            return "The question should have at least 2 correct choices."
+    else:
+        if total_choices < 2:
+            return "The question should have at least 2 choices."
+        if correct_choices != 1:
+            return "The question should have only 1 correct choice."
+    return None
+
+
+def check_questions(questions):
+    """
+    Validate the choices of every question of a queryset with a single grouped query.
+
+    Returns a QuestionCheck per question, whose error is None when the question can be active.
+    """
+    counts = (
+        questions.order_by()
+        .annotate(
+            total_choices=Count("choices"),
+            correct_choices=Count("choices", filter=Q(choices__correct_answer=True)),
+        )
+        .values_list("id", "is_active", "is_multiple_choice", "total_choices", "correct_choices")
+    )
+    return [
+        QuestionCheck(pk, is_active, choices_error(is_multiple_choice, total, correct))
+        for pk, is_active, is_multiple_choice, total, correct in counts
+    ]
+
+
+def activate_questions(checks):
+    """Activate the inactive questions that passed their checks with a single UPDATE, and return their ids."""
+    ids = [check.id for check in checks if check.error is None and not check.is_active]
+    if ids:
+        Question.objects.filter(pk__in=ids).update(is_active=True, updated_at=timezone.now())
+    return ids
+
+
+def errors_of(checks):
+    return [{"question_id": check.id, "error": check.error} for check in checks if check.error]
@@ -1,7 +1,9 @@
-from django.db.models import Q, Count, Avg, Case, When, IntegerField
+from django.db.models import Q, Avg, Prefetch
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 
 from .models import (
@@ -13,6 +15,7 @@ from .models import (
     Choice,
     AssessmentDifficultyRating,
     FollowAssessment,
+    bump_content_version,
 )
 from .serializers import (
     LanguageSerializer,
@@ -25,27 +28,21 @@ from .serializers import (
     AssessmentDifficultyRatingSerializer,
     FollowAssessmentSerializer,
 )
+from .authoring import author_in_bulk, split_payload
+from .bundles import rebuild_bundle
+from .catalog import CatalogCacheMixin
+from .search import search_assessments
+from .validation import check_questions, activate_questions, errors_of
 from .permissions import AssessmentPermissions, QuestionChoicePermissions, FollowAssessmentPermissions
+from apps.attempts.item_analysis import item_analysis
 from apps.attempts.models import Attempt
+from apps.users.feed import publish
+from apps.users.models import FeedEntry
+from somaserver.pagination import KeysetPagination
+from somaserver.parsers import NDJSONParser
 
 
-def validate_question(question):
-    total_choices = question.choices.count()
-    correct_choices = question.choices.filter(correct_answer=True).count()
-    if question.is_multiple_choice:
-        if total_choices < 3:
-            return "The question should have at least 3 choices."
-        if correct_choices < 2:
-            return "The question should have at least 2 correct choices."
-    else:
-        if total_choices < 2:
-            return "The question should have at least 2 choices."
-        if correct_choices != 1:
-            return "The question should have only 1 correct choice."
-    return None
-
-
-class LanguageViewSet(viewsets.ReadOnlyModelViewSet):
+class LanguageViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Language.objects.all().order_by("id")
     serializer_class = LanguageSerializer
     filterset_fields = {
@@ -53,15 +50,17 @@ class LanguageViewSet(viewsets.ReadOnlyModelViewSet):
     }
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Category.objects.all().order_by("id")
+class CategoryViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Category.objects.prefetch_related(
+        Prefetch("subcategory_set", queryset=Subcategory.objects.order_by("id"))
+    ).order_by("id")
     serializer_class = CategorySerializer
     filterset_fields = {
         "name": ("exact", "icontains"),
     }
 
 
-class SubcategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class SubcategoryViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Subcategory.objects.all().order_by("id")
     serializer_class = SubcategorySerializer
     filterset_fields = {
@@ -73,6 +72,7 @@ class SubcategoryViewSet(viewsets.ReadOnlyModelViewSet):
 class AssessmentViewSet(viewsets.ModelViewSet):
     permission_classes = [AssessmentPermissions]
     serializer_class = AssessmentSerializer
+    query_budgets = {"retrieve": 8, "item_analysis": 5}
     filterset_fields = {
         "name": ("exact", "icontains"),
         "user": ("exact", "in"),
@@ -98,12 +98,82 @@ class AssessmentViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Assessment.objects.filter(Q(is_private=False) | Q(user=self.request.user)).order_by("id")
-        return Assessment.objects.filter(is_private=False, is_active=True).order_by("id")
+            queryset = Assessment.objects.filter(Q(is_private=False) | Q(user=self.request.user))
+        else:
+            queryset = Assessment.objects.filter(is_private=False, is_active=True)
+        if self.action == "retrieve":
+            return queryset.select_related("user", "language", "subcategory__category")
+        return queryset.select_related("user", "subcategory").order_by("id")
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        # Saves that change nothing, like a PUT of the current data, do not reach the followers' feeds.
+        changed = any(
+            getattr(serializer.instance, field) != value for field, value in serializer.validated_data.items()
+        )
+        assessment = serializer.save()
+        if changed and assessment.is_active and not assessment.is_private:
+            publish(FeedEntry.ASSESSMENT_UPDATED, assessment.user_id, assessment.pk)
+
+    @action(detail=False, methods=["GET"])
+    def search(self, request):
+        """
+        Search the visible assessments by name, description, subcategory and category, best matches first.
+        """
+        text = request.query_params.get("q", "").strip()
+        if len(text) < 2:
+            return Response(
+                {"error": "The search query must have at least 2 characters."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = search_assessments(self.get_queryset(), text)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["POST"], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create an assessment with its questions and choices in one request.
+
+        Questions are added to one of the user's assessments instead with ?assessment=<id>, and the
+        ones with valid choices are activated with ?activate=true. A JSON body takes up to 1000 questions.
+        Larger banks, up to 20000 questions, can be sent as application/x-ndjson, one question per line;
+        they are read, validated and inserted 1000 at a time, and still written all or nothing.
+        """
+        assessment = None
+        if "assessment" in request.query_params:
+            assessment = get_object_or_404(
+                Assessment.objects.filter(user=request.user), pk=request.query_params["assessment"]
+            )
+        assessment_data, rows = split_payload(request.data)
+        activate = request.query_params.get("activate") in ("true", "1")
+        assessment, results = author_in_bulk(request, assessment, assessment_data, rows, activate)
+        return Response(
+            {
+                "assessment": assessment.pk,
+                "questions": [
+                    {"id": question.pk, "is_active": question.is_active, "error": error} for question, error in results
+                ],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=True, methods=["GET"], url_path="item-analysis")
+    def item_analysis(self, request, pk=None):
+        """
+        Per question answer counts, difficulty (share of correct answers), discrimination index and
+        choice selection counts, read from the item statistics maintained by the job queue.
+        """
+        assessment = self.get_object()
+        if assessment.user != request.user:
+            return Response(
+                {"error": "Only the author can see the item analysis of an assessment."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return Response({"assessment": assessment.pk, "questions": item_analysis(assessment)})
+
     def update(self, request, *args, **kwargs):
         assessment = self.get_object()
         prev_num = assessment.number_of_questions
@@ -130,25 +200,27 @@ class AssessmentViewSet(viewsets.ModelViewSet):
     def validate_and_activate(self, request, pk=None):
         assessment = self.get_object()
 
-        inactive_questions = Question.objects.filter(assessment=assessment, is_active=False)
-
-        for question in inactive_questions:
-            error_message = validate_question(question)
-            if not error_message:
-                question.is_active = True
-                question.save()
-
-        active_question_count = Question.objects.filter(assessment=assessment, is_active=True).count()
+        checks = check_questions(Question.objects.filter(assessment=assessment))
+        activated = activate_questions(checks)
+        active_question_count = sum(1 for check in checks if check.is_active) + len(activated)
         if active_question_count < assessment.number_of_questions:
+            if activated:
+                bump_content_version(pk=assessment.pk)
             return Response(
                 {
-                    "error": f"The assessment should have equal or more than {assessment.number_of_questions} active questions."
+                    "error": f"The assessment should have equal or more than {assessment.number_of_questions} active questions.",
+                    "errors": errors_of(check for check in checks if not check.is_active),
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        was_active = assessment.is_active
         assessment.is_active = True
         assessment.save()
+        bump_content_version(pk=assessment.pk)
+        rebuild_bundle(assessment)
+        if not was_active and not assessment.is_private:
+            publish(FeedEntry.ASSESSMENT_ACTIVATED, assessment.user_id, assessment.pk)
 
         return Response({"detail": "Assessment validated and activated successfully."}, status=status.HTTP_200_OK)
 
@@ -193,37 +265,29 @@ class QuestionViewSet(viewsets.ModelViewSet):
                 {"error": "You do not have permission to activate this question."}, status=status.HTTP_403_FORBIDDEN
             )
 
-        error_message = validate_question(question)
-        if error_message:
-            return Response({"error": error_message}, status=status.HTTP_400_BAD_REQUEST)
+        checks = check_questions(Question.objects.filter(pk=question.pk))
+        if checks[0].error:
+            return Response({"error": checks[0].error}, status=status.HTTP_400_BAD_REQUEST)
 
-        question.is_active = True
-        question.save()
+        if activate_questions(checks):
+            bump_content_version(pk=question.assessment_id)
         return Response({"detail": "Question validated and activated successfully."}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["POST"], url_path="validate-and-activate-bulk")
     def validate_and_activate_bulk(self, request):
         question_ids = request.data.get("question_ids", [])
-        user_owned_questions_count = Question.objects.filter(id__in=question_ids, assessment__user=request.user).count()
-        if user_owned_questions_count != len(question_ids):
+        # Questions of other users are left out of the checks, so a short list means some are not ours.
+        checks = check_questions(Question.objects.filter(id__in=question_ids, assessment__user=request.user))
+        if len(checks) != len(question_ids):
             return Response({"error": "Some questions do not belong to you."}, status=status.HTTP_403_FORBIDDEN)
 
-        questions = Question.objects.filter(id__in=question_ids).annotate(
-            total_choices=Count("choices"),
-            correct_choices=Count(Case(When(choices__correct_answer=True, then=1), output_field=IntegerField())),
-        )
-        errors = []
-        to_activate = []
-        for question in questions:
-            error_message = validate_question(question)
-            if error_message:
-                errors.append({"question_id": question.id, "error": error_message})
-            else:
-                to_activate.append(question)
+        errors = errors_of(checks)
         if errors:
             return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        Question.objects.filter(id__in=[q.id for q in to_activate]).update(is_active=True)
+        activated = activate_questions(checks)
+        if activated:
+            bump_content_version(questions__in=activated)
         return Response({"detail": "Questions validated and activated successfully."}, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
@@ -350,6 +414,7 @@ class FollowAssessmentViewSet(viewsets.ModelViewSet):
     serializer_class = FollowAssessmentSerializer
     permission_classes = [FollowAssessmentPermissions]
     http_method_names = ["get", "post", "delete", "head", "options"]
+    pagination_class = KeysetPagination
     filterset_fields = {
         "assessment": ("exact", "in"),
         "follower": ("exact", "in"),
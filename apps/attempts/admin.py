@@ -1,7 +1,9 @@
 from django.contrib import admin
 
-from .models import Attempt, QuestionAttempt
+from .models import Attempt, QuestionAttempt, QuestionStats, ChoiceStats
 
 
 admin.site.register(Attempt)
 admin.site.register(QuestionAttempt)
+admin.site.register(QuestionStats)
+admin.site.register(ChoiceStats)
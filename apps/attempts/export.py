@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Attempt, QuestionAttempt
+
+# Rows fetched from the server-side cursor at a time, and attempts whose answers are fetched together.
+CHUNK_SIZE = 2000
+BATCH_SIZE = 500
+
+ATTEMPT_FIELDS = [
+    "id",
+    "assessment_id",
+    "user_id",
+    "user__username",
+    "start_time",
+    "end_time",
+    "score",
+    "approved",
+    "points_obtained",
+]
+ATTEMPT_COLUMNS = [
+    "attempt_id",
+    "assessment_id",
+    "user_id",
+    "username",
+    "start_time",
+    "end_time",
+    "score",
+    "approved",
+    "points_obtained",
+]
+ANSWER_COLUMNS = ["question_id", "is_correct", "selected_choices"]
+
+
+def finished_attempts(assessments):
+    return Attempt.objects.filter(assessment__in=assessments, is_finished=True)
+
+
+def attempt_batches(attempts):
+    """
+    Yield lists of (attempt dict, answers) pairs for the given attempts, BATCH_SIZE attempts at a time.
+
+    Attempts are read from a server-side cursor, and the answers and selected choices of each batch
+    with one query each, so memory use does not depend on the size of the export.
+    """
+    rows = attempts.order_by("id").values_list(*ATTEMPT_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    while batch := list(islice(rows, BATCH_SIZE)):
+        attempts_by_id = {row[0]: dict(zip(ATTEMPT_COLUMNS, row)) for row in batch}
+        attempt_ids = list(attempts_by_id)
+        answers = {attempt_id: [] for attempt_id in attempt_ids}
+        selections = {}
+        for question_attempt_id, choice_id in (
+            QuestionAttempt.selected_choices.through.objects.filter(questionattempt__attempt__in=attempt_ids)
+            .order_by("choice_id")
+            .values_list("questionattempt_id", "choice_id")
+        ):
+            selections.setdefault(question_attempt_id, []).append(choice_id)
+        for question_attempt_id, attempt_id, question_id, is_correct in (
+            QuestionAttempt.objects.filter(attempt__in=attempt_ids)
+            .order_by("id")
+            .values_list("id", "attempt_id", "question_id", "is_correct")
+        ):
+            answers[attempt_id].append(
+                {
+                    "question_id": question_id,
+                    "is_correct": is_correct,
+                    "selected_choices": selections.get(question_attempt_id, []),
+                }
+            )
+        yield [(attempt, answers[attempt_id]) for attempt_id, attempt in attempts_by_id.items()]
+
+
+def export_csv(attempts):
+    """Yield CSV text with a row per answer, and a row without answer columns for attempts without answers."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(ATTEMPT_COLUMNS + ANSWER_COLUMNS)
+    yield flush()
+    for batch in attempt_batches(attempts):
+        for attempt, answers in batch:
+            values = [attempt[column] for column in ATTEMPT_COLUMNS]
+            if not answers:
+                writer.writerow(values + ["", "", ""])
+            for answer in answers:
+                choices = " ".join(str(choice_id) for choice_id in answer["selected_choices"])
+                writer.writerow(values + [answer["question_id"], answer["is_correct"], choices])
+        yield flush()
+
+
+def export_ndjson(attempts):
+    """Yield NDJSON text with an object per attempt, holding its answers."""
+    for batch in attempt_batches(attempts):
+        yield "".join(
+            json.dumps({**attempt, "answers": answers}, cls=DjangoJSONEncoder) + "\n" for attempt, answers in batch
+        )
+
+
+EXPORT_FORMATS = {
+    "csv": (export_csv, "text/csv"),
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+}
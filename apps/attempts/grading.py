@@ -0,0 +1,61 @@
+from .models import QuestionAttempt
+
+
+class GradingError(Exception):
+    pass
+
+
+def parse_answers(answers):
+    """Normalize the submitted answers into a list of (question_id, selected choice ids)."""
+    parsed = []
+    for answer in answers:
+        if not isinstance(answer, dict):
+            raise GradingError("Each answer should be an object with question_id and choices.")
+        question_id = answer.get("question_id")
+        try:
+            parsed.append((int(question_id), {int(choice_id) for choice_id in answer.get("choices", [])}))
+        except (TypeError, ValueError):
+            raise GradingError(f"Invalid answer for question {question_id}.")
+    return parsed
+
+
+def grade_attempt(attempt, answers, answer_key):
+    """
+    Grade the submitted answers of an attempt against the answer key of its assessment
+    and store the results in bulk.
+
+    Creates every QuestionAttempt with one INSERT and every selected choice with another,
+    so the number of queries does not depend on the number of answers.
+    Each question can be answered once, and there cannot be more answers than questions in the paper.
+    Returns the number of correct answers.
+    """
+    parsed_answers = parse_answers(answers)
+    if len(parsed_answers) > attempt.assessment.number_of_questions:
+        raise GradingError("There are more answers than questions in this assessment.")
+    question_attempts = []
+    answered = set()
+    for question_id, selected_choices in parsed_answers:
+        if question_id not in answer_key:
+            raise GradingError(f"Question with id {question_id} does not exist in this assessment.")
+        if question_id in answered:
+            raise GradingError(f"Question with id {question_id} is answered more than once.")
+        answered.add(question_id)
+        correct_choices_ids, _ = answer_key[question_id]
+        question_attempts.append(
+            QuestionAttempt(
+                attempt=attempt, question_id=question_id, is_correct=correct_choices_ids == selected_choices
+            )
+        )
+    QuestionAttempt.objects.bulk_create(question_attempts)
+
+    # Choices that do not belong to the question are graded as wrong but never stored.
+    SelectedChoice = QuestionAttempt.selected_choices.through
+    SelectedChoice.objects.bulk_create(
+        [
+            SelectedChoice(questionattempt_id=qa.id, choice_id=choice_id)
+            for qa, (question_id, selected_choices) in zip(question_attempts, parsed_answers)
+            for choice_id in selected_choices
+            if choice_id in answer_key[question_id][1]
+        ]
+    )
+    return sum(1 for qa in question_attempts if qa.is_correct)
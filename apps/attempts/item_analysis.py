@@ -0,0 +1,197 @@
+import numpy as np
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Attempt, QuestionAttempt, QuestionStats, ChoiceStats
+
+# The discrimination index is computed over at most this many of the latest attempts of an assessment.
+ANALYSIS_ATTEMPTS = 5000
+# Questions with fewer answers in those attempts get no discrimination index.
+MIN_ANSWERS = 10
+
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+
+
+def record_item_responses(attempt):
+    """
+    Add the answers of a finalized attempt to the item statistics of its questions and choices.
+
+    Every counter is incremented with one UPDATE per counter, whatever the number of questions.
+    """
+    answers = list(QuestionAttempt.objects.filter(attempt=attempt).values_list("question_id", "is_correct"))
+    if not answers:
+        return
+    selected = list(
+        QuestionAttempt.selected_choices.through.objects.filter(questionattempt__attempt=attempt).values_list(
+            "choice_id", flat=True
+        )
+    )
+    question_ids = [question_id for question_id, _ in answers]
+    QuestionStats.objects.bulk_create(
+        [QuestionStats(question_id=question_id, assessment_id=attempt.assessment_id) for question_id in question_ids],
+        ignore_conflicts=True,
+    )
+    QuestionStats.objects.filter(question__in=question_ids).update(
+        times_answered=F("times_answered") + 1, updated_at=timezone.now()
+    )
+    correct = [question_id for question_id, is_correct in answers if is_correct]
+    if correct:
+        QuestionStats.objects.filter(question__in=correct).update(times_correct=F("times_correct") + 1)
+    if selected:
+        ChoiceStats.objects.bulk_create(
+            [ChoiceStats(choice_id=choice_id, assessment_id=attempt.assessment_id) for choice_id in selected],
+            ignore_conflicts=True,
+        )
+        ChoiceStats.objects.filter(choice__in=selected).update(times_selected=F("times_selected") + 1)
+
+
+def rebuild_item_statistics(chunk_size=1000):
+    """Recount the item statistics from the answers of the attempts whose results are applied."""
+    QuestionStats.objects.all().delete()
+    ChoiceStats.objects.all().delete()
+    answers = (
+        QuestionAttempt.objects.filter(attempt__results_applied=True)
+        .values("question", "question__assessment")
+        .annotate(answered=Count("id"), correct=Count("id", filter=Q(is_correct=True)))
+        .order_by()
+    )
+    QuestionStats.objects.bulk_create(
+        (
+            QuestionStats(
+                question_id=row["question"],
+                assessment_id=row["question__assessment"],
+                times_answered=row["answered"],
+                times_correct=row["correct"],
+            )
+            for row in answers.iterator(chunk_size=chunk_size)
+        ),
+        batch_size=chunk_size,
+    )
+    selections = (
+        QuestionAttempt.selected_choices.through.objects.filter(questionattempt__attempt__results_applied=True)
+        .values("choice", "choice__question__assessment")
+        .annotate(selected=Count("id"))
+        .order_by()
+    )
+    ChoiceStats.objects.bulk_create(
+        (
+            ChoiceStats(
+                choice_id=row["choice"],
+                assessment_id=row["choice__question__assessment"],
+                times_selected=row["selected"],
+            )
+            for row in selections.iterator(chunk_size=chunk_size)
+        ),
+        batch_size=chunk_size,
+    )
+
+
+def discrimination_indices(correct, answered, scores, item_weight):
+    """
+    Corrected item-total correlation of every question of a response matrix, computed at once.
+
+    correct and answered are attempts x questions boolean matrices and scores the attempt scores.
+    Each question is correlated with the rest score of the attempts that answered it (their score
+    without the item_weight the question itself added), so no question is correlated with itself.
+    Questions with fewer than MIN_ANSWERS answers or without variance get NaN.
+    """
+    x = correct.astype(float)
+    m = answered.astype(float)
+    n = m.sum(axis=0)
+    x_sum = x.sum(axis=0)
+    xs_sum = x.T @ scores
+    rest_sum = m.T @ scores - item_weight * x_sum
+    rest_squares = m.T @ (scores**2) - 2 * item_weight * xs_sum + item_weight**2 * x_sum
+    x_rest_sum = xs_sum - item_weight * x_sum
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = x_sum / n
+        rest_mean = rest_sum / n
+        covariance = x_rest_sum / n - p * rest_mean
+        variance = p * (1 - p) * (rest_squares / n - rest_mean**2)
+        indices = covariance / np.sqrt(variance)
+    indices[(n < MIN_ANSWERS) | ~(variance > 1e-12)] = np.nan
+    return indices
+
+
+def analyze_assessment(assessment):
+    """Recompute the discrimination index of every question of an assessment from its latest attempts."""
+    started = timezone.now()
+    attempts = list(
+        Attempt.objects.filter(assessment=assessment, results_applied=True)
+        .order_by("-id")
+        .values_list("id", "score")[:ANALYSIS_ATTEMPTS]
+    )
+    stats = list(QuestionStats.objects.filter(assessment=assessment))
+    indices = {}
+    if attempts:
+        attempt_ids = np.array([attempt_id for attempt_id, _ in attempts][::-1])
+        scores = np.array([score for _, score in attempts][::-1], dtype=float)
+        responses = np.array(
+            QuestionAttempt.objects.filter(
+                attempt__assessment=assessment,
+                attempt__results_applied=True,
+                attempt_id__gte=attempt_ids[0],
+                attempt_id__lte=attempt_ids[-1],
+            ).values_list("attempt_id", "question_id", "is_correct"),
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        # Attempts applied between the two queries can fall inside the id range, their answers are left out.
+        rows = np.searchsorted(attempt_ids, responses[:, 0])
+        kept = attempt_ids[rows] == responses[:, 0]
+        responses, rows = responses[kept], rows[kept]
+        question_ids, columns = np.unique(responses[:, 1], return_inverse=True)
+        answered = np.zeros((len(attempt_ids), len(question_ids)), dtype=bool)
+        correct = np.zeros_like(answered)
+        answered[rows, columns] = True
+        correct[rows, columns] = responses[:, 2].astype(bool)
+        values = discrimination_indices(correct, answered, scores, 100 / max(assessment.number_of_questions, 1))
+        indices = {int(question_id): value for question_id, value in zip(question_ids, values) if not np.isnan(value)}
+
+    for row in stats:
+        row.discrimination = float(indices[row.question_id]) if row.question_id in indices else None
+        row.analyzed_at = started
+    QuestionStats.objects.bulk_update(stats, ["discrimination", "analyzed_at"], batch_size=500)
+
+
+def assessments_to_analyze():
+    """Ids of the assessments with question statistics that changed after their last analysis."""
+    return (
+        QuestionStats.objects.filter(Q(analyzed_at__isnull=True) | Q(analyzed_at__lt=F("updated_at")))
+        .values_list("assessment", flat=True)
+        .order_by("assessment")
+        .distinct()
+    )
+
+
+def item_analysis(assessment):
+    """Report the precomputed statistics of every question of an assessment and of its choices."""
+    choices = {}
+    for choice_id, question_id, times_selected in ChoiceStats.objects.filter(assessment=assessment).values_list(
+        "choice_id", "choice__question_id", "times_selected"
+    ):
+        choices.setdefault(question_id, []).append({"choice_id": choice_id, "times_selected": times_selected})
+
+    questions = []
+    for stats in QuestionStats.objects.filter(assessment=assessment).order_by("question_id"):
+        difficulty = stats.times_correct / stats.times_answered if stats.times_answered else None
+        flags = []
+        if difficulty is not None and difficulty >= TOO_EASY:
+            flags.append("too_easy")
+        if difficulty is not None and difficulty <= TOO_HARD:
+            flags.append("too_hard")
+        if stats.discrimination is not None and stats.discrimination < 0:
+            flags.append("misleading")
+        questions.append(
+            {
+                "question_id": stats.question_id,
+                "times_answered": stats.times_answered,
+                "times_correct": stats.times_correct,
+                "difficulty": difficulty,
+                "discrimination": stats.discrimination,
+                "analyzed_at": stats.analyzed_at,
+                "flags": flags,
+                "choices": sorted(choices.get(stats.question_id, []), key=lambda choice: choice["choice_id"]),
+            }
+        )
+    return questions
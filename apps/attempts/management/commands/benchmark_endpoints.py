@@ -0,0 +1,171 @@
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from apps.assessments.models import Assessment
+from apps.attempts.models import Attempt
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, endpoint, duration, response):
+        match = (
+            SERVER_TIMING_QUERIES.search(response.headers.get("Server-Timing", "")) if response is not None else None
+        )
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(
+                (duration, response is not None and response.ok, int(match.group(1)) if match else None)
+            )
+
+    def report(self, elapsed):
+        report = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            durations = sorted(duration * 1000 for duration, _, _ in samples)
+            queries = [count for _, _, count in samples if count is not None]
+            report[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(not ok for _, ok, _ in samples),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(durations, 0.50), 2),
+                "p95_ms": round(percentile(durations, 0.95), 2),
+                "p99_ms": round(percentile(durations, 0.99), 2),
+                "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+            }
+        return report
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the hot endpoints of a running server concurrently and report latency percentiles, "
+        "throughput and queries per request as JSON. Run it against a database seeded with seed_dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--requests", type=int, default=200, help="Iterations of every scenario.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--users", type=int, default=50, help="Users whose tokens are used for the requests.")
+        parser.add_argument("--output", help="File to write the JSON report to, instead of the standard output.")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.base_url = options["base_url"].rstrip("/")
+        self.rng = random.Random(options["seed"])
+        self.recorder = Recorder()
+        self.local = threading.local()
+
+        tokens = list(Token.objects.filter(user__is_active=True).values_list("user_id", "key")[: options["users"]])
+        self.assessment_ids = list(
+            Assessment.objects.filter(is_active=True, is_private=False).values_list("id", flat=True)
+        )
+        if not tokens or not self.assessment_ids:
+            raise CommandError("There are no users or active assessments to benchmark with; run seed_dataset first.")
+        self.tokens = dict(tokens)
+        self.fresh_pairs = self.find_fresh_pairs(options["requests"])
+
+        scenarios = [self.browse] * options["requests"] + [self.take_attempt] * len(self.fresh_pairs)
+        self.rng.shuffle(scenarios)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            for future in [executor.submit(scenario) for scenario in scenarios]:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "commit": self.current_commit(),
+            "base_url": self.base_url,
+            "concurrency": options["concurrency"],
+            "elapsed_seconds": round(elapsed, 2),
+            "endpoints": self.recorder.report(elapsed),
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def find_fresh_pairs(self, count):
+        """Pick (user, assessment) pairs without attempts, so every benchmarked attempt can be created."""
+        attempted = set(Attempt.objects.filter(user__in=self.tokens).values_list("user", "assessment"))
+        authors = dict(Assessment.objects.filter(pk__in=self.assessment_ids).values_list("id", "user"))
+        pairs = set()
+        for _ in range(count * 10):
+            if len(pairs) == count:
+                break
+            pair = (self.rng.choice(list(self.tokens)), self.rng.choice(self.assessment_ids))
+            if pair not in attempted and authors[pair[1]] != pair[0]:
+                pairs.add(pair)
+        return list(pairs)
+
+    def current_commit(self):
+        try:
+            result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True)
+            return result.stdout.strip() or None
+        except OSError:
+            return None
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def call(self, endpoint, method, path, user_id, **kwargs):
+        headers = {"Authorization": f"Token {self.tokens[user_id]}"}
+        start = time.perf_counter()
+        try:
+            response = self.session().request(method, f"{self.base_url}{path}", headers=headers, timeout=30, **kwargs)
+        except requests.RequestException:
+            response = None
+        self.recorder.add(endpoint, time.perf_counter() - start, response)
+        return response
+
+    def browse(self):
+        user_id = self.rng.choice(list(self.tokens))
+        self.call("assessments-list", "GET", "/assessments/assessments/", user_id)
+        self.call(
+            "assessments-detail", "GET", f"/assessments/assessments/{self.rng.choice(self.assessment_ids)}/", user_id
+        )
+        self.call("users-top-scores", "GET", "/users/users/top-scores/", user_id)
+        self.call("userpoints-list", "GET", "/users/userpoints/", user_id, params={"user": user_id})
+
+    def take_attempt(self):
+        user_id, assessment_id = self.fresh_pairs.pop()
+        response = self.call(
+            "attempts-create", "POST", "/attempts/attempts/", user_id, json={"assessment": assessment_id}
+        )
+        if response is None or not response.ok:
+            return
+        attempt_id = response.json()["id"]
+        response = self.call("attempts-retrieve", "GET", f"/attempts/attempts/{attempt_id}/", user_id)
+        if response is None or not response.ok:
+            return
+        answers = [
+            {"question_id": question["question_id"], "choices": [self.rng.choice(question["choices"])["choice_id"]]}
+            for question in response.json().get("questions", [])
+        ]
+        self.call(
+            "attempts-finalize", "POST", f"/attempts/attempts/{attempt_id}/finalize_attempt/", user_id, json=answers
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.attempts.item_analysis import rebuild_item_statistics
+
+
+class Command(BaseCommand):
+    help = "Recount the per-question and per-choice item statistics from the answers of the attempts."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_item_statistics()
+        self.stdout.write(self.style.SUCCESS("Item statistics rebuilt."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.attempts.stats import reconcile_score_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuild the score sums, counts and averages of assessments, users and user points from the attempts."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            reconcile_score_totals()
+        self.stdout.write(self.style.SUCCESS("Score totals reconciled."))
@@ -0,0 +1,307 @@
+import random
+import secrets
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Avg, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from apps.assessments.models import (
+    Category,
+    Subcategory,
+    Assessment,
+    Question,
+    Choice,
+    AssessmentDifficultyRating,
+    FollowAssessment,
+    refresh_taxonomy_names,
+)
+from apps.attempts.models import Attempt, QuestionAttempt
+from apps.users.models import CustomUser, UserPoints, PointsLedger, Follow
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset for load testing. Rows are inserted in bulk and every derived counter, "
+        "total and leaderboard is rebuilt at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--categories", type=int, default=5)
+        parser.add_argument("--subcategories", type=int, default=4, help="Subcategories per category.")
+        parser.add_argument("--assessments", type=int, default=200)
+        parser.add_argument("--questions", type=int, default=20, help="Questions per assessment.")
+        parser.add_argument("--choices", type=int, default=4, help="Choices per question.")
+        parser.add_argument("--paper-size", type=int, default=10, help="Questions drawn for each attempt.")
+        parser.add_argument("--attempts", type=int, default=10000)
+        parser.add_argument("--follows", type=int, default=10, help="Users followed by each user.")
+        parser.add_argument("--assessment-follows", type=int, default=3, help="Assessments followed by each user.")
+        parser.add_argument("--ratings", type=int, default=2000)
+        parser.add_argument("--password", default="seed1234", help="Password of every seeded user.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=None, help="Random seed, for reproducible datasets.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        # Names and emails are unique, so every run gets its own tag.
+        self.tag = secrets.token_hex(3)
+
+        users = self.create_users(options["users"], options["password"])
+        subcategories = self.create_taxonomy(options["categories"], options["subcategories"])
+        assessments = self.create_assessments(users, subcategories, options["assessments"], options["paper_size"])
+        papers = self.create_questions(assessments, options["questions"], options["choices"])
+        pairs = self.create_attempts(users, assessments, papers, options["attempts"])
+        self.create_follows(users, assessments, options["follows"], options["assessment_follows"])
+        self.create_ratings(pairs, options["ratings"])
+        self.rebuild_derived_data()
+
+    def bulk_create(self, model, objects):
+        created = []
+        for batch in batched(objects, self.batch_size):
+            created.extend(model.objects.bulk_create(batch))
+        self.stdout.write(f"Created {len(created)} {model._meta.verbose_name_plural}.")
+        return created
+
+    def create_users(self, count, password):
+        # Hashing is deliberately slow, so all users share one hash.
+        password = make_password(password)
+        users = self.bulk_create(
+            CustomUser,
+            (
+                CustomUser(
+                    username=f"seed-{self.tag}-{i}",
+                    email=f"seed-{self.tag}-{i}@example.com",
+                    password=password,
+                    country=self.rng.choice(["AR", "BR", "CL", "ES", "MX", "US"]),
+                )
+                for i in range(count)
+            ),
+        )
+        self.bulk_create(Token, (Token(key=Token.generate_key(), user=user) for user in users))
+        return [user.pk for user in users]
+
+    def create_taxonomy(self, categories, subcategories):
+        categories = self.bulk_create(
+            Category,
+            (Category(name=f"Category {self.tag} {i}", description="Seeded category") for i in range(categories)),
+        )
+        return self.bulk_create(
+            Subcategory,
+            (
+                Subcategory(category=category, name=f"Subcategory {self.tag} {category.pk}-{i}", description="Seeded")
+                for category in categories
+                for i in range(subcategories)
+            ),
+        )
+
+    def create_assessments(self, users, subcategories, count, paper_size):
+        return self.bulk_create(
+            Assessment,
+            (
+                Assessment(
+                    name=f"Assessment {self.tag} {i}",
+                    description="Seeded assessment",
+                    user_id=self.rng.choice(users),
+                    subcategory=self.rng.choice(subcategories),
+                    number_of_questions=paper_size,
+                    allowed_attempts=2,
+                    time_limit=60,
+                    difficulty=self.rng.randint(1, 10),
+                    is_active=True,
+                )
+                for i in range(count)
+            ),
+        )
+
+    def create_questions(self, assessments, questions_per_assessment, choices_per_question):
+        """Create the question banks and return the (question id, correct id, wrong id) triples of each assessment."""
+        questions = self.bulk_create(
+            Question,
+            (
+                Question(assessment=assessment, description=f"Question {i}", is_active=True)
+                for assessment in assessments
+                for i in range(questions_per_assessment)
+            ),
+        )
+        choices = self.bulk_create(
+            Choice,
+            (
+                Choice(question=question, description=f"Choice {i}", correct_answer=i == 0)
+                for question in questions
+                for i in range(choices_per_question)
+            ),
+        )
+        papers = {assessment.pk: [] for assessment in assessments}
+        for question, question_choices in zip(questions, batched(choices, choices_per_question)):
+            papers[question.assessment_id].append((question.pk, question_choices[0].pk, question_choices[-1].pk))
+        return papers
+
+    def create_attempts(self, users, assessments, papers, count):
+        """
+        Create finished attempts, with their answers, for distinct (user, assessment) pairs.
+
+        Returns the (user id, assessment id) pairs that were attempted.
+        """
+        pairs = [
+            (users[i // len(assessments)], assessments[i % len(assessments)])
+            for i in self.rng.sample(range(len(users) * len(assessments)), min(count, len(users) * len(assessments)))
+        ]
+        pairs = [(user_id, assessment) for user_id, assessment in pairs if assessment.user_id != user_id]
+        now = timezone.now()
+        created = 0
+        for batch in batched(pairs, self.batch_size // 10 or 1):
+            with transaction.atomic():
+                answers = []
+                attempts = []
+                start_times = []
+                for user_id, assessment in batch:
+                    paper = self.rng.sample(
+                        papers[assessment.pk], min(assessment.number_of_questions, len(papers[assessment.pk]))
+                    )
+                    skill = self.rng.random()
+                    graded = [(question, self.rng.random() < skill) for question in paper]
+                    score = sum(correct for _, correct in graded) / assessment.number_of_questions * 100
+                    start_time = now - timedelta(days=self.rng.randint(0, 365), minutes=self.rng.randint(0, 1440))
+                    start_times.append(start_time)
+                    attempts.append(
+                        Attempt(
+                            assessment=assessment,
+                            user_id=user_id,
+                            score=score,
+                            approved=score >= assessment.min_score,
+                            questions_provided=True,
+                            is_finished=True,
+                            results_applied=True,
+                            end_time=start_time + timedelta(minutes=self.rng.randint(1, assessment.time_limit)),
+                            # The points formula of finalize_attempt, before any difficulty ratings.
+                            points_obtained=round(score * assessment.difficulty / 10.0),
+                        )
+                    )
+                    answers.append(graded)
+                attempts = Attempt.objects.bulk_create(attempts)
+                # start_time is auto_now_add, so it can only be backdated after the insert.
+                for attempt, start_time in zip(attempts, start_times):
+                    attempt.start_time = start_time
+                Attempt.objects.bulk_update(attempts, ["start_time"])
+                self.create_answers(attempts, answers)
+                PointsLedger.objects.bulk_create(
+                    PointsLedger(
+                        user_id=attempt.user_id,
+                        category_id=attempt.assessment.subcategory.category_id,
+                        attempt=attempt,
+                        points=attempt.points_obtained,
+                        compacted=True,
+                    )
+                    for attempt in attempts
+                    if attempt.points_obtained > 0
+                )
+            created += len(attempts)
+        self.stdout.write(f"Created {created} attempts.")
+        return [(user_id, assessment.pk) for user_id, assessment in pairs]
+
+    def create_answers(self, attempts, answers):
+        question_attempts = QuestionAttempt.objects.bulk_create(
+            QuestionAttempt(attempt=attempt, question_id=question_id, is_correct=correct)
+            for attempt, graded in zip(attempts, answers)
+            for (question_id, _, _), correct in graded
+        )
+        selected = (
+            (correct_id if correct else wrong_id) for graded in answers for (_, correct_id, wrong_id), correct in graded
+        )
+        QuestionAttempt.selected_choices.through.objects.bulk_create(
+            QuestionAttempt.selected_choices.through(questionattempt_id=question_attempt.pk, choice_id=choice_id)
+            for question_attempt, choice_id in zip(question_attempts, selected)
+        )
+
+    def create_follows(self, users, assessments, follows, assessment_follows):
+        self.bulk_create(
+            Follow,
+            (
+                Follow(follower_id=follower, followed_id=followed)
+                for follower in users
+                for followed in self.rng.sample(users, min(follows + 1, len(users)))
+                if followed != follower
+            ),
+        )
+        self.bulk_create(
+            FollowAssessment,
+            (
+                FollowAssessment(follower_id=follower, assessment=assessment)
+                for follower in users
+                for assessment in self.rng.sample(assessments, min(assessment_follows, len(assessments)))
+            ),
+        )
+
+    def create_ratings(self, pairs, count):
+        self.bulk_create(
+            AssessmentDifficultyRating,
+            (
+                AssessmentDifficultyRating(
+                    user_id=user_id, assessment_id=assessment_id, difficulty=self.rng.randint(1, 10)
+                )
+                for user_id, assessment_id in self.rng.sample(pairs, min(count, len(pairs)))
+            ),
+        )
+
+    def rebuild_derived_data(self):
+        """Bulk inserts skip signals and jobs, so every counter and total is recomputed from the rows."""
+        seeded_users = CustomUser.objects.filter(username__startswith=f"seed-{self.tag}-")
+        seeded_assessments = Assessment.objects.filter(name__startswith=f"Assessment {self.tag} ")
+        refresh_taxonomy_names(seeded_assessments)
+        seeded_assessments.update(
+            user_difficulty_rating=Subquery(
+                AssessmentDifficultyRating.objects.filter(assessment=OuterRef("pk"))
+                .order_by()
+                .values("assessment")
+                .annotate(average=Avg("difficulty"))
+                .values("average")
+            )
+        )
+        UserPoints.objects.bulk_create(
+            (
+                UserPoints(user_id=user_id, category_id=category_id)
+                for user_id, category_id in Attempt.objects.filter(user__in=seeded_users)
+                .values_list("user", "assessment__subcategory__category")
+                .order_by()
+                .distinct()
+            ),
+            ignore_conflicts=True,
+        )
+
+        def ledger_total(**filters):
+            return Coalesce(
+                Subquery(
+                    PointsLedger.objects.filter(**filters)
+                    .order_by()
+                    .values(*filters)
+                    .annotate(total=Sum("points"))
+                    .values("total")
+                ),
+                Value(0),
+            )
+
+        # The ledger entries were created compacted, so the snapshots are set from them here.
+        seeded_users.update(points=ledger_total(user=OuterRef("pk")))
+        UserPoints.objects.filter(user__in=seeded_users).update(
+            total_points=ledger_total(user=OuterRef("user"), category=OuterRef("category"))
+        )
+
+        call_command("reconcile_score_totals", stdout=self.stdout)
+        call_command("rebuild_item_statistics", stdout=self.stdout)
+        call_command("reconcile_social_counters", stdout=self.stdout)
+        call_command("rebuild_leaderboards", stdout=self.stdout)
+        call_command("rebuild_content_bundles", stdout=self.stdout)
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:14
+
+from django.db import migrations
+from django.db.models import Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+
+
+def backfill_score_totals(apps, schema_editor):
+    Attempt = apps.get_model("attempts", "Attempt")
+
+    def totals(aggregate, default, **filters):
+        return Coalesce(
+            Subquery(
+                Attempt.objects.filter(**filters).order_by().values(*filters).annotate(total=aggregate).values("total")
+            ),
+            Value(default),
+        )
+
+    for model, count_field, filters in (
+        (apps.get_model("assessments", "Assessment"), "attempts_count", {"assessment": OuterRef("pk")}),
+        (apps.get_model("users", "CustomUser"), "score_count", {"user": OuterRef("pk")}),
+        (
+            apps.get_model("users", "UserPoints"),
+            "score_count",
+            {"user": OuterRef("user"), "assessment__subcategory__category": OuterRef("category")},
+        ),
+    ):
+        model.objects.update(
+            score_sum=totals(Sum("score"), 0.0, **filters),
+            **{count_field: totals(Count("id"), 0, **filters)},
+        )
+        model.objects.update(
+            average_score=Coalesce(
+                ExpressionWrapper(F("score_sum") / NullIf(F(count_field), 0), output_field=FloatField()), Value(0.0)
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attempts", "0005_attempt_points_obtained"),
+        ("assessments", "0007_score_totals"),
+        ("users", "0008_score_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_score_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:16
+
+from django.db import migrations, models
+
+
+def mark_finished_attempts_applied(apps, schema_editor):
+    # Finished attempts were already counted synchronously before the job queue existed.
+    Attempt = apps.get_model("attempts", "Attempt")
+    Attempt.objects.filter(is_finished=True).update(results_applied=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attempts", "0006_backfill_score_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attempt",
+            name="results_applied",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_finished_attempts_applied, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attempts", "0007_attempt_results_applied"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(fields=["user", "assessment"], name="attempt_user_assessment_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(fields=["assessment", "score"], name="attempt_assessment_score_idx"),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attempts", "0008_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="attempt",
+            index=models.Index(fields=["start_time", "id"], name="attempt_start_time_idx"),
+        ),
+    ]
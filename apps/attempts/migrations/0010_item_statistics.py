@@ -0,0 +1,117 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:54
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_item_statistics(apps, schema_editor, chunk_size=1000):
+    QuestionStats = apps.get_model("attempts", "QuestionStats")
+    ChoiceStats = apps.get_model("attempts", "ChoiceStats")
+    QuestionAttempt = apps.get_model("attempts", "QuestionAttempt")
+    answers = (
+        QuestionAttempt.objects.filter(attempt__results_applied=True)
+        .values("question", "question__assessment")
+        .annotate(answered=Count("id"), correct=Count("id", filter=Q(is_correct=True)))
+        .order_by()
+    )
+    QuestionStats.objects.bulk_create(
+        (
+            QuestionStats(
+                question_id=row["question"],
+                assessment_id=row["question__assessment"],
+                times_answered=row["answered"],
+                times_correct=row["correct"],
+            )
+            for row in answers.iterator(chunk_size=chunk_size)
+        ),
+        batch_size=chunk_size,
+    )
+    selections = (
+        QuestionAttempt.selected_choices.through.objects.filter(questionattempt__attempt__results_applied=True)
+        .values("choice", "choice__question__assessment")
+        .annotate(selected=Count("id"))
+        .order_by()
+    )
+    ChoiceStats.objects.bulk_create(
+        (
+            ChoiceStats(
+                choice_id=row["choice"],
+                assessment_id=row["choice__question__assessment"],
+                times_selected=row["selected"],
+            )
+            for row in selections.iterator(chunk_size=chunk_size)
+        ),
+        batch_size=chunk_size,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0013_assessment_search"),
+        ("attempts", "0009_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionStats",
+            fields=[
+                (
+                    "question",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="assessments.question",
+                    ),
+                ),
+                ("times_answered", models.PositiveIntegerField(default=0)),
+                ("times_correct", models.PositiveIntegerField(default=0)),
+                ("discrimination", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("analyzed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "assessment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="question_stats",
+                        to="assessments.assessment",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Question stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="ChoiceStats",
+            fields=[
+                (
+                    "choice",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="assessments.choice",
+                    ),
+                ),
+                ("times_selected", models.PositiveIntegerField(default=0)),
+                (
+                    "assessment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="choice_stats",
+                        to="assessments.assessment",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Choice stats",
+            },
+        ),
+        migrations.RunPython(backfill_item_statistics, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 from apps.assessments.models import Assessment, Question, Choice
 
@@ -15,6 +16,14 @@ class Attempt(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
     points_obtained = models.IntegerField(default=0)
+    results_applied = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "assessment"], name="attempt_user_assessment_idx"),
+            models.Index(fields=["assessment", "score"], name="attempt_assessment_score_idx"),
+            models.Index(fields=["start_time", "id"], name="attempt_start_time_idx"),
+        ]
 
     def __str__(self):
         return f"Attempt by {self.user.username} on {self.assessment.name} - Score: {self.score}"
@@ -28,3 +37,39 @@ class QuestionAttempt(models.Model):
 
     def __str__(self):
         return f"Question Attempt for {self.attempt.user.username} - {self.question.description}"
+
+
+class QuestionStats(models.Model):
+    """
+    Item analysis counters of a question, added to by the attempts.apply_result job.
+
+    The discrimination index is recomputed from the responses by the periodic attempts.item_analysis
+    job, for the questions whose counters changed (updated_at) after their last analysis.
+    """
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name="question_stats")
+    # Papers are not stored, so a question counts as shown when it is answered.
+    times_answered = models.PositiveIntegerField(default=0)
+    times_correct = models.PositiveIntegerField(default=0)
+    discrimination = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+    analyzed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Question stats"
+
+    def __str__(self):
+        return f"{self.question_id} - {self.times_correct}/{self.times_answered}"
+
+
+class ChoiceStats(models.Model):
+    choice = models.OneToOneField(Choice, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name="choice_stats")
+    times_selected = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Choice stats"
+
+    def __str__(self):
+        return f"{self.choice_id} - {self.times_selected}"
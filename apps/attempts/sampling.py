@@ -0,0 +1,25 @@
+import random
+
+from apps.assessments.bundles import content_bundles
+
+
+def assemble_paper(assessment, number_of_questions):
+    """
+    Draw a random set of active questions of the assessment, with their choices shuffled.
+
+    The paper is cut from the cached content bundle of the assessment, so assembling it
+    does not query questions or choices no matter how large the question bank is.
+    """
+    bundle = content_bundles.get(assessment)
+    questions = random.sample(bundle, min(number_of_questions, len(bundle)))
+    return [
+        {
+            "question_id": question_id,
+            "description": description,
+            "choices": [
+                {"choice_id": choice_id, "description": choice_description}
+                for choice_id, choice_description in random.sample(choices, len(choices))
+            ],
+        }
+        for question_id, description, choices in questions
+    ]
@@ -0,0 +1,70 @@
+from django.db.models import Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from .models import Attempt
+from apps.assessments.models import Assessment
+from apps.users.models import CustomUser, UserPoints
+
+
+def average_score(score_sum, score_count):
+    return Coalesce(ExpressionWrapper(score_sum / NullIf(score_count, 0), output_field=FloatField()), Value(0.0))
+
+
+def add_scores(queryset, count_field, score=0, count=0):
+    """
+    Add to the running score sum and count of the matching rows and refresh their average_score,
+    all in one atomic UPDATE.
+    """
+    score_sum = F("score_sum") + score
+    score_count = F(count_field) + count
+    return queryset.update(
+        score_sum=score_sum, average_score=average_score(score_sum, score_count), **{count_field: score_count}
+    )
+
+
+def update_score_totals(attempt, category_id, score=0, count=0):
+    add_scores(Assessment.objects.filter(pk=attempt.assessment_id), "attempts_count", score, count)
+    add_scores(CustomUser.objects.filter(pk=attempt.user_id), "score_count", score, count)
+    add_scores(UserPoints.objects.filter(user=attempt.user_id, category=category_id), "score_count", score, count)
+
+
+def record_attempt_started(attempt, category_id):
+    """
+    Count a new attempt in the averages of its assessment, user and category.
+
+    Unfinished attempts count with a score of 0 until they are finalized.
+    """
+    UserPoints.objects.get_or_create(user_id=attempt.user_id, category_id=category_id)
+    update_score_totals(attempt, category_id, count=1)
+
+
+def record_attempt_scored(attempt, category_id):
+    """Add the score of a finalized attempt to the averages of its assessment, user and category."""
+    update_score_totals(attempt, category_id, score=attempt.score)
+
+
+def reconcile_score_totals():
+    """Rebuild every score sum, count and average from the attempts table."""
+
+    def totals(aggregate, default, **filters):
+        return Coalesce(
+            Subquery(
+                Attempt.objects.filter(**filters).order_by().values(*filters).annotate(total=aggregate).values("total")
+            ),
+            Value(default),
+        )
+
+    for model, count_field, filters in (
+        (Assessment, "attempts_count", {"assessment": OuterRef("pk")}),
+        (CustomUser, "score_count", {"user": OuterRef("pk")}),
+        (
+            UserPoints,
+            "score_count",
+            {"user": OuterRef("user"), "assessment__subcategory__category": OuterRef("category")},
+        ),
+    ):
+        model.objects.update(
+            score_sum=totals(Sum("score"), 0.0, **filters),
+            **{count_field: totals(Count("id"), 0, **filters)},
+        )
+        model.objects.update(average_score=average_score(F("score_sum"), F(count_field)))
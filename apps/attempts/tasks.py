@@ -0,0 +1,54 @@
+from .item_analysis import analyze_assessment, assessments_to_analyze, record_item_responses
+from .models import Attempt
+from .stats import record_attempt_scored
+from apps.assessments.models import Assessment
+from apps.jobs.queue import enqueue, job
+from apps.users.feed import publish
+from apps.users.models import FeedEntry, PointsLedger
+
+
+@job("attempts.apply_result")
+def apply_attempt_result(attempt_id):
+    """
+    Record the points of a finalized attempt in the ledger and add its score to the running averages.
+
+    The attempts of the same user on the same assessment are locked first, so their results
+    are applied one at a time, and results_applied makes a redelivered job a no-op.
+    """
+    attempt = Attempt.objects.select_related("assessment__subcategory").get(pk=attempt_id)
+    sibling_attempts = list(
+        Attempt.objects.select_for_update()
+        .filter(assessment=attempt.assessment_id, user=attempt.user_id)
+        .values_list("id", "points_obtained", "results_applied")
+    )
+    if any(pk == attempt.pk and results_applied for pk, _, results_applied in sibling_attempts):
+        return
+
+    # Only the improvement over the best attempt already applied is awarded.
+    best_points = max(
+        (points for pk, points, results_applied in sibling_attempts if results_applied and pk != attempt.pk),
+        default=0,
+    )
+    category_id = attempt.assessment.subcategory.category_id
+    difference = attempt.points_obtained - best_points
+    if difference > 0:
+        PointsLedger.objects.bulk_create(
+            [PointsLedger(user_id=attempt.user_id, category_id=category_id, attempt=attempt, points=difference)],
+            ignore_conflicts=True,
+        )
+
+    record_attempt_scored(attempt, category_id)
+    record_item_responses(attempt)
+    Attempt.objects.filter(pk=attempt.pk).update(results_applied=True)
+    if not attempt.assessment.is_private:
+        publish(FeedEntry.ATTEMPT_FINISHED, attempt.user_id, attempt.assessment_id, attempt_id=attempt.pk)
+
+
+@job("attempts.item_analysis", every=60 * 60)
+def analyze_items(batch_size=20):
+    """Recompute the discrimination indices of the assessments whose item statistics changed."""
+    assessment_ids = list(assessments_to_analyze()[:batch_size])
+    for assessment in Assessment.objects.filter(pk__in=assessment_ids):
+        analyze_assessment(assessment)
+    if len(assessment_ids) == batch_size:
+        enqueue("attempts.item_analysis")
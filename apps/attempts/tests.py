@@ -1,3 +1,598 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .item_analysis import (
+    analyze_assessment,
+    assessments_to_analyze,
+    discrimination_indices,
+    rebuild_item_statistics,
+)
+from .models import Attempt, QuestionAttempt, QuestionStats, ChoiceStats
+from .stats import record_attempt_scored, record_attempt_started
+from .tasks import analyze_items, apply_attempt_result
+from .views import AttemptViewSet
+from apps.assessments.bundles import content_bundles
+from apps.assessments.models import Category, Subcategory, Assessment, Question, Choice
+from apps.assessments.cache import answer_keys
+from apps.jobs.models import Job
+from apps.jobs.queue import run_pending
+from apps.users.models import CustomUser, UserPoints
+from apps.users.tasks import compact_points_ledger
+from somaserver import metrics
+from somaserver.middleware import QueryBudgetExceeded
+from somaserver.testing import QueryPlanAssertions
+
+
+class FinalizeAttemptTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        cls.student = CustomUser.objects.create_user(username="student", email="student@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        cls.subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+        UserPoints.objects.create(user=cls.student, category=category)
+
+    def setUp(self):
+        cache.clear()
+        answer_keys.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def create_assessment(self, number_of_questions):
+        assessment = Assessment.objects.create(
+            name=f"Assessment {number_of_questions}",
+            description="Test",
+            user=self.author,
+            subcategory=self.subcategory,
+            number_of_questions=number_of_questions,
+            is_active=True,
+        )
+        for i in range(number_of_questions):
+            question = Question.objects.create(assessment=assessment, description=f"Question {i}", is_active=True)
+            Choice.objects.create(question=question, description="Right", correct_answer=True)
+            Choice.objects.create(question=question, description="Wrong")
+            Choice.objects.create(question=question, description="Also wrong")
+        return assessment
+
+    def build_answers(self, assessment, wrong=0):
+        answers = []
+        for i, question in enumerate(assessment.questions.order_by("id")):
+            choices = question.choices.filter(correct_answer=i >= wrong).values_list("id", flat=True)[:1]
+            answers.append({"question_id": question.id, "choices": list(choices)})
+        return answers
+
+    def finalize(self, assessment, answers):
+        response = self.client.post(reverse("attempts:attempts-list"), {"assessment": assessment.pk}, format="json")
+        attempt = Attempt.objects.get(pk=response.data["id"])
+        url = reverse("attempts:attempts-finalize-attempt", args=[attempt.pk])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, answers, format="json")
+        return attempt, response, len(ctx.captured_queries)
+
+    def test_grades_answers_and_stores_selected_choices(self):
+        assessment = self.create_assessment(5)
+        attempt, response, _ = self.finalize(assessment, self.build_answers(assessment, wrong=1))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["score"], 80)
+        self.assertEqual(QuestionAttempt.objects.filter(attempt=attempt, is_correct=True).count(), 4)
+        self.assertEqual(
+            QuestionAttempt.selected_choices.through.objects.filter(questionattempt__attempt=attempt).count(), 5
+        )
+
+    def test_duplicate_and_extra_answers_are_rejected(self):
+        assessment = self.create_assessment(5)
+        answers = self.build_answers(assessment)
+        attempt, response, _ = self.finalize(assessment, answers[:1] * 5)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attempt.objects.get(pk=attempt.pk).is_finished)
+
+        extra = Question.objects.create(assessment=assessment, description="Extra", is_active=True)
+        answers.append({"question_id": extra.id, "choices": []})
+        _, response, _ = self.finalize(assessment, answers)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuestionAttempt.objects.exists())
+
+    def test_finalization_is_all_or_nothing(self):
+        assessment = self.create_assessment(5)
+        answers = self.build_answers(assessment)
+        with mock.patch("apps.attempts.views.enqueue", side_effect=RuntimeError("queue unavailable")):
+            with self.assertRaises(RuntimeError):
+                self.finalize(assessment, answers)
+        attempt = Attempt.objects.get()
+        self.assertFalse(attempt.is_finished)
+        self.assertFalse(QuestionAttempt.objects.exists())
+
+        url = reverse("attempts:attempts-finalize-attempt", args=[attempt.pk])
+        self.assertEqual(self.client.post(url, answers, format="json").status_code, 200)
+        self.assertEqual(self.client.post(url, answers, format="json").status_code, 400)
+        self.assertEqual(QuestionAttempt.objects.count(), 5)
+        self.assertEqual(Job.objects.filter(name="attempts.apply_result").count(), 1)
+
+    def test_results_are_applied_once(self):
+        assessment = self.create_assessment(5)
+        attempt, response, _ = self.finalize(assessment, self.build_answers(assessment))
+        run_pending()
+        # A redelivered job must not award the points again.
+        apply_attempt_result(attempt.pk)
+        compact_points_ledger()
+
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.points, 50)
+        self.assertEqual(self.student.average_score, 100)
+        self.assertEqual(UserPoints.objects.get(user=self.student).total_points, 50)
+
+    def test_server_timing_reports_queries(self):
+        assessment = self.create_assessment(5)
+        _, response, query_count = self.finalize(assessment, self.build_answers(assessment))
+
+        self.assertIn(f'desc="{query_count} queries"', response["Server-Timing"])
+
+    def test_query_budget_is_enforced(self):
+        assessment = self.create_assessment(5)
+        with mock.patch.dict(AttemptViewSet.query_budgets, {"finalize_attempt": 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.finalize(assessment, self.build_answers(assessment))
+
+    def test_unknown_question_is_rejected(self):
+        assessment = self.create_assessment(5)
+        attempt, response, _ = self.finalize(assessment, [{"question_id": 0, "choices": []}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuestionAttempt.objects.filter(attempt=attempt).exists())
+
+    def test_query_count_does_not_depend_on_number_of_questions(self):
+        query_counts = {}
+        for number_of_questions in (5, 10, 50):
+            assessment = self.create_assessment(number_of_questions)
+            _, response, query_counts[number_of_questions] = self.finalize(assessment, self.build_answers(assessment))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["score"], 100)
+
+        self.assertEqual(query_counts[5], query_counts[10])
+        self.assertEqual(query_counts[5], query_counts[50])
+
+
+class ScoreTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        cls.students = [
+            CustomUser.objects.create_user(username=f"student{i}", email=f"student{i}@test.com", password="test1234")
+            for i in range(2)
+        ]
+        cls.category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=cls.category, name="Physics", description="Physics")
+        cls.assessment = Assessment.objects.create(
+            name="Test", description="Test", user=author, subcategory=subcategory, is_active=True
+        )
+
+    def attempt(self, student, score=None):
+        """Start an attempt of the student, and finalize it with the score unless it is None."""
+        attempt = Attempt.objects.create(assessment=self.assessment, user=student)
+        record_attempt_started(attempt, self.category.pk)
+        if score is not None:
+            Attempt.objects.filter(pk=attempt.pk).update(score=score, is_finished=True)
+            attempt.score = score
+            record_attempt_scored(attempt, self.category.pk)
+
+    def totals(self):
+        assessment = Assessment.objects.values_list("attempts_count", "score_sum", "average_score").get()
+        users = list(
+            CustomUser.objects.filter(pk__in=[student.pk for student in self.students])
+            .order_by("pk")
+            .values_list("score_count", "score_sum", "average_score")
+        )
+        user_points = list(UserPoints.objects.order_by("user").values_list("score_count", "score_sum", "average_score"))
+        return assessment, users, user_points
+
+    def test_running_sums_match_a_reconcile(self):
+        self.attempt(self.students[0], 80)
+        self.attempt(self.students[0], 40)
+        self.attempt(self.students[1], 100)
+        # Unfinished attempts count with a score of 0.
+        self.attempt(self.students[1])
+        running = self.totals()
+        self.assertEqual(running[0], (4, 220, 55))
+        self.assertEqual(running[1], [(2, 120, 60), (2, 100, 50)])
+        self.assertEqual(running[2], running[1])
+
+        Assessment.objects.update(attempts_count=0, score_sum=7, average_score=1)
+        CustomUser.objects.update(score_count=9, score_sum=0, average_score=0)
+        UserPoints.objects.update(score_count=0, score_sum=0, average_score=None)
+        call_command("reconcile_score_totals", stdout=io.StringIO())
+        self.assertEqual(self.totals(), running)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        cls.student = CustomUser.objects.create_user(username="student", email="student@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+        cls.assessment = Assessment.objects.create(
+            name="Assessment",
+            description="Test",
+            user=author,
+            subcategory=subcategory,
+            number_of_questions=1,
+            is_active=True,
+        )
+        question = Question.objects.create(assessment=cls.assessment, description="Question", is_active=True)
+        cls.choice = Choice.objects.create(question=question, description="Right", correct_answer=True)
+
+    def setUp(self):
+        cache.clear()
+        answer_keys.clear()
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        self.enterContext(override_settings(METRICS_DIR=metrics_dir.name, METRICS_TOKEN="secret"))
+        store = metrics.MetricsStore()
+        self.addCleanup(store.discard_pending)
+        self.enterContext(mock.patch.object(metrics, "store", store))
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def finalize(self):
+        response = self.client.post(
+            reverse("attempts:attempts-list"), {"assessment": self.assessment.pk}, format="json"
+        )
+        url = reverse("attempts:attempts-finalize-attempt", args=[response.data["id"]])
+        answers = [{"question_id": self.choice.question_id, "choices": [self.choice.pk]}]
+        self.assertEqual(self.client.post(url, answers, format="json").status_code, 200)
+
+    def scrape(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_metrics_are_added_up_across_processes(self):
+        self.finalize()
+        finalized = (
+            'soma_http_requests_total{action="finalize_attempt",method="POST",status="200",view="AttemptViewSet"}'
+        )
+
+        lines = self.scrape()
+        self.assertIn(f"{finalized} 1", lines)
+        self.assertIn('soma_jobs{status="pending"} 1', lines)
+        self.assertTrue(any(line.startswith('soma_cache_requests_total{cache="answer-key"') for line in lines))
+        self.assertTrue(any(line.startswith("soma_http_request_duration_seconds_bucket{") for line in lines))
+
+        # Another worker process that handled two more finalizations.
+        other_worker = metrics.MetricsStore()
+        with mock.patch("os.getpid", return_value=os.getpid() + 1):
+            for _ in range(2):
+                other_worker.record_request("AttemptViewSet", "finalize_attempt", "POST", 200, 0.01, 0.001, 6)
+            other_worker.write()
+        self.assertIn(f"{finalized} 3", self.scrape())
+
+    def test_idle_workers_write_their_last_samples(self):
+        worker = metrics.MetricsStore(flush_interval=0.05)
+        self.addCleanup(worker.discard_pending)
+        for _ in range(2):
+            worker.record_request("AttemptViewSet", "finalize_attempt", "POST", 200, 0.01, 0.001, 6)
+        key = metrics.series_key(
+            "soma_http_requests_total", view="AttemptViewSet", action="finalize_attempt", method="POST", status="200"
+        )
+        self.assertEqual(metrics.read_state(worker.path())["counters"][key], 1)
+        deadline = time.monotonic() + 5
+        while metrics.read_state(worker.path())["counters"][key] < 2:
+            self.assertLess(time.monotonic(), deadline, "The pending samples were never written.")
+            time.sleep(0.01)
+
+    def test_metrics_require_a_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+
+class PaperTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        cls.student = CustomUser.objects.create_user(username="student", email="student@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        cls.subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+
+    def setUp(self):
+        cache.clear()
+        content_bundles.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def create_assessment(self, bank_size, number_of_questions=5):
+        assessment = Assessment.objects.create(
+            name=f"Assessment {bank_size}",
+            description="Test",
+            user=self.author,
+            subcategory=self.subcategory,
+            number_of_questions=number_of_questions,
+            is_active=True,
+        )
+        questions = Question.objects.bulk_create(
+            Question(assessment=assessment, description=f"Question {i}", is_active=True) for i in range(bank_size)
+        )
+        Choice.objects.bulk_create(
+            Choice(question=question, description=f"Choice {i}", correct_answer=i == 0)
+            for question in questions
+            for i in range(3)
+        )
+        return assessment
+
+    def retrieve_paper(self, assessment):
+        response = self.client.post(reverse("attempts:attempts-list"), {"assessment": assessment.pk}, format="json")
+        url = reverse("attempts:attempts-detail", args=[response.data["id"]])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data["questions"], ctx.captured_queries
+
+    def test_large_banks_cost_no_more_queries_than_small_ones(self):
+        questions, small_bank_queries = self.retrieve_paper(self.create_assessment(5))
+        self.assertEqual(len(questions), 5)
+        questions, large_bank_queries = self.retrieve_paper(self.create_assessment(500))
+        self.assertEqual(len(questions), 5)
+        self.assertEqual(len({question["question_id"] for question in questions}), 5)
+        self.assertTrue(all(len(question["choices"]) == 3 for question in questions))
+        self.assertEqual(len(small_bank_queries), len(large_bank_queries))
+
+    def test_first_retrieve_reads_no_content_after_activation(self):
+        assessment = self.create_assessment(20)
+        author = APIClient()
+        author.force_authenticate(self.author)
+        response = author.post(reverse("assessments:assessments-validate-and-activate", args=[assessment.pk]))
+        self.assertEqual(response.status_code, 200)
+        content_bundles.clear()
+
+        questions, queries = self.retrieve_paper(assessment)
+        self.assertEqual(len(questions), 5)
+        # The attempt with its assessment, and the questions_provided update.
+        self.assertEqual(len(queries), 2)
+        content_tables = ("assessments_question", "assessments_choice")
+        self.assertFalse([query["sql"] for query in queries if any(table in query["sql"] for table in content_tables)])
+
+    def test_bundle_follows_content_changes(self):
+        assessment = self.create_assessment(2, number_of_questions=2)
+        question = assessment.questions.order_by("id").first()
+        choice = question.choices.order_by("id").first()
+
+        def bundle():
+            assessment.refresh_from_db(fields=["content_version"])
+            return {
+                question_id: (description, choices)
+                for question_id, description, choices in content_bundles.get(assessment)
+            }
+
+        self.assertEqual(bundle()[question.id][0], "Question 0")
+        question.description = "Edited question"
+        question.save()
+        self.assertEqual(bundle()[question.id][0], "Edited question")
+        choice.description = "Edited choice"
+        choice.save()
+        self.assertIn([choice.id, "Edited choice"], bundle()[question.id][1])
+        question.is_active = False
+        question.save()
+        self.assertNotIn(question.id, bundle())
+
+
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+        assessments = Assessment.objects.bulk_create(
+            Assessment(name=f"Assessment {i}", description="Test", user=author, subcategory=subcategory)
+            for i in range(10)
+        )
+        users = [
+            CustomUser.objects.create_user(username=f"user{i}", email=f"user{i}@test.com", password="test1234")
+            for i in range(10)
+        ]
+        Attempt.objects.bulk_create(
+            Attempt(assessment=assessment, user=user, score=(assessment.pk * user.pk) % 101)
+            for assessment in assessments
+            for user in users
+        )
+        cls.assessment = assessments[0]
+        cls.user = users[0]
+
+    def test_attempts_of_a_user_on_an_assessment(self):
+        self.assertUsesIndex(
+            Attempt.objects.filter(assessment=self.assessment, user=self.user), "attempt_user_assessment_idx"
+        )
+
+    def test_perfect_attempts_of_a_user_on_an_assessment(self):
+        self.assertUsesIndex(
+            Attempt.objects.filter(assessment=self.assessment, user=self.user, score=100),
+            "attempt_user_assessment_idx",
+            "attempt_assessment_score_idx",
+        )
+
+    def test_attempts_of_an_assessment_by_score(self):
+        self.assertUsesIndex(
+            Attempt.objects.filter(assessment=self.assessment, score__gte=70), "attempt_assessment_score_idx"
+        )
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+        cls.assessments = [
+            Assessment.objects.create(name=f"Test {i}", description="Test", user=cls.author, subcategory=subcategory)
+            for i in range(2)
+        ]
+        cls.questions = []
+        for assessment in cls.assessments:
+            question = Question.objects.create(assessment=assessment, description="Question", is_active=True)
+            cls.questions.append(question)
+            Choice.objects.create(question=question, description="Right", correct_answer=True)
+            Choice.objects.create(question=question, description="Wrong")
+        students = [
+            CustomUser.objects.create_user(username=f"student{i}", email=f"student{i}@test.com", password="test1234")
+            for i in range(3)
+        ]
+        for assessment, question in zip(cls.assessments, cls.questions):
+            for student in students:
+                attempt = Attempt.objects.create(assessment=assessment, user=student, is_finished=True, score=100)
+                question_attempt = QuestionAttempt.objects.create(attempt=attempt, question=question, is_correct=True)
+                question_attempt.selected_choices.set(question.choices.filter(correct_answer=True))
+            Attempt.objects.create(assessment=assessment, user=students[0])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def export(self, **params):
+        response = self.client.get(reverse("attempts:attempts-export"), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_has_a_row_per_answer_of_finished_attempts(self):
+        with mock.patch("apps.attempts.export.BATCH_SIZE", 2):
+            rows = list(csv.DictReader(io.StringIO(self.export())))
+        self.assertEqual(len(rows), 6)
+        expected = list(Attempt.objects.filter(is_finished=True).order_by("id").values_list("id", flat=True))
+        self.assertEqual([int(row["attempt_id"]) for row in rows], expected)
+        right = {str(question.choices.get(correct_answer=True).pk) for question in self.questions}
+        self.assertTrue(all(row["selected_choices"] in right and row["is_correct"] == "True" for row in rows))
+
+    def test_ndjson_of_one_assessment(self):
+        assessment = self.assessments[1]
+        lines = self.export(assessment=assessment.pk, output="ndjson").splitlines()
+        attempts = [json.loads(line) for line in lines]
+        self.assertEqual(len(attempts), 3)
+        self.assertTrue(all(attempt["assessment_id"] == assessment.pk for attempt in attempts))
+        self.assertEqual(attempts[0]["answers"][0]["question_id"], self.questions[1].pk)
+
+    def test_only_owners_can_export(self):
+        other = CustomUser.objects.create_user(username="other", email="other@test.com", password="test1234")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.export(output="ndjson"), "")
+        response = self.client.get(reverse("attempts:attempts-export"), {"assessment": self.assessments[0].pk})
+        self.assertEqual(response.status_code, 404)
+
+
+class ItemAnalysisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+        cls.assessment = Assessment.objects.create(
+            name="Test", description="Test", user=cls.author, subcategory=subcategory, number_of_questions=4
+        )
+        cls.questions = []
+        for i in range(4):
+            question = Question.objects.create(assessment=cls.assessment, description=f"Question {i}")
+            Choice.objects.create(question=question, description="Right", correct_answer=True)
+            Choice.objects.create(question=question, description="Wrong")
+            cls.questions.append(question)
+
+    def answer(self, student, correct):
+        """Finalize an attempt of the student, answering each question right when its entry in correct is true."""
+        attempt = Attempt.objects.create(
+            assessment=self.assessment, user=student, is_finished=True, score=25 * sum(correct)
+        )
+        for question, is_correct in zip(self.questions, correct):
+            question_attempt = QuestionAttempt.objects.create(attempt=attempt, question=question, is_correct=is_correct)
+            question_attempt.selected_choices.set(question.choices.filter(correct_answer=is_correct))
+        apply_attempt_result(attempt.pk)
+        return attempt
+
+    def test_statistics_are_counted_once_per_attempt(self):
+        student = CustomUser.objects.create_user(username="student", email="student@test.com", password="test1234")
+        attempt = self.answer(student, [True, False])
+        self.answer(student, [True, True])
+        apply_attempt_result(attempt.pk)
+
+        stats = {row.question_id: row for row in QuestionStats.objects.all()}
+        self.assertEqual([stats[q.pk].times_answered for q in self.questions[:2]], [2, 2])
+        self.assertEqual([stats[q.pk].times_correct for q in self.questions[:2]], [2, 1])
+        wrong = self.questions[1].choices.get(correct_answer=False)
+        self.assertEqual(ChoiceStats.objects.get(choice=wrong).times_selected, 1)
+
+        counted = list(QuestionStats.objects.order_by("pk").values_list("pk", "times_answered", "times_correct"))
+        selections = list(ChoiceStats.objects.order_by("pk").values_list("pk", "times_selected"))
+        rebuild_item_statistics()
+        self.assertEqual(
+            list(QuestionStats.objects.order_by("pk").values_list("pk", "times_answered", "times_correct")), counted
+        )
+        self.assertEqual(list(ChoiceStats.objects.order_by("pk").values_list("pk", "times_selected")), selections)
+
+    def test_discrimination_matches_the_correlation_with_the_rest_score(self):
+        rng = np.random.default_rng(1)
+        answered = rng.random((200, 6)) < 0.7
+        correct = answered & (rng.random((200, 6)) < 0.6)
+        scores = correct.sum(axis=1) * 10.0
+        indices = discrimination_indices(correct, answered, scores, 10.0)
+        for j in range(6):
+            rows = answered[:, j]
+            rest = scores[rows] - 10.0 * correct[rows, j]
+            self.assertAlmostEqual(indices[j], np.corrcoef(correct[rows, j], rest)[0, 1])
+
+    def test_attempts_applied_during_the_analysis_are_left_out(self):
+        for i in range(12):
+            student = CustomUser.objects.create_user(username=f"s{i}", email=f"s{i}@test.com", password="test1234")
+            self.answer(student, [i >= 6, i >= 5, i >= 7, i < 4])
+        analyze_assessment(self.assessment)
+        expected = list(QuestionStats.objects.order_by("pk").values_list("discrimination", flat=True))
+
+        real_filter = QuestionStats.objects.filter
+
+        def filter_after_a_late_attempt(*args, **kwargs):
+            attempt = Attempt.objects.create(
+                assessment=self.assessment, user=self.author, is_finished=True, results_applied=True, score=100
+            )
+            QuestionAttempt.objects.bulk_create(
+                QuestionAttempt(attempt=attempt, question=question, is_correct=True) for question in self.questions
+            )
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(QuestionStats.objects, "filter", side_effect=filter_after_a_late_attempt):
+            analyze_assessment(self.assessment)
+        self.assertEqual(list(QuestionStats.objects.order_by("pk").values_list("discrimination", flat=True)), expected)
+
+    def test_authors_read_the_precomputed_analysis(self):
+        for i in range(12):
+            student = CustomUser.objects.create_user(username=f"s{i}", email=f"s{i}@test.com", password="test1234")
+            # The first three questions are answered right by the stronger students, the last one by the weaker ones.
+            self.answer(student, [i >= 6, i >= 5, i >= 7, i < 4])
+        analyze_items()
+        self.assertFalse(assessments_to_analyze().exists())
+
+        client = APIClient()
+        client.force_authenticate(self.author)
+        url = reverse("assessments:assessments-item-analysis", args=[self.assessment.pk])
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+        first, *_, last = response.data["questions"]
+        self.assertEqual((first["times_answered"], first["times_correct"]), (12, 6))
+        self.assertGreater(first["discrimination"], 0)
+        self.assertLess(last["discrimination"], 0)
+        self.assertEqual(last["flags"], ["misleading"])
+
+        client.force_authenticate(CustomUser.objects.get(username="s0"))
+        self.assertEqual(client.get(url).status_code, 403)
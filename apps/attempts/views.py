@@ -1,10 +1,12 @@
-import random
-from datetime import datetime, timedelta
+from datetime import timedelta
 
-from django.db.models import Q, Avg, Prefetch, Max
+from django.db import transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.views import APIView
@@ -12,8 +14,14 @@ from rest_framework.views import APIView
 from .models import Attempt, QuestionAttempt
 from .serializers import AttemptSerializer, QuestionAttemptSerializer
 from .permissions import AttemptBasedPermissions
-from apps.assessments.models import Assessment, Question, Choice
-from apps.users.models import UserPoints
+from .export import EXPORT_FORMATS, finished_attempts
+from .grading import GradingError, grade_attempt
+from .sampling import assemble_paper
+from .stats import record_attempt_started
+from apps.assessments.models import Assessment, Question
+from apps.assessments.cache import answer_keys
+from apps.jobs.queue import enqueue
+from somaserver.pagination import KeysetPagination
 
 
 class AttemptViewSet(viewsets.ModelViewSet):
@@ -28,16 +36,20 @@ class AttemptViewSet(viewsets.ModelViewSet):
     }
     ordering_fields = ["start_time"]
     ordering = ["start_time"]
+    query_budgets = {"finalize_attempt": 10}
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Attempt.objects.filter(Q(user=self.request.user) | Q(assessment__user=self.request.user))
+            return Attempt.objects.filter(
+                Q(user=self.request.user) | Q(assessment__user=self.request.user)
+            ).select_related("assessment__subcategory", "user")
         return Attempt.objects.none()
 
     def perform_create(self, serializer):
         assessment_id = self.request.data.get("assessment")
         try:
-            assessment = Assessment.objects.get(pk=assessment_id, is_active=True)
+            assessment = Assessment.objects.select_related("subcategory").get(pk=assessment_id, is_active=True)
         except Assessment.DoesNotExist:
             raise ValidationError("The specified assessment does not exist or is not active.")
         if assessment.user == self.request.user:
@@ -47,10 +59,8 @@ class AttemptViewSet(viewsets.ModelViewSet):
         perfect_score_exists = Attempt.objects.filter(assessment=assessment, user=self.request.user, score=100).exists()
         if previous_attempts_count >= assessment.allowed_attempts or perfect_score_exists:
             raise ValidationError("You don't have any attempts left for this assessment.")
-        assessment.attempts_count = Attempt.objects.filter(assessment=assessment).count() + 1
-        self.update_assessment_average_score(assessment)
-        self.update_user_average_score(self.request.user)
-        serializer.save(user=self.request.user)
+        attempt = serializer.save(user=self.request.user)
+        record_attempt_started(attempt, assessment.subcategory.category_id)
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -59,21 +69,7 @@ class AttemptViewSet(viewsets.ModelViewSet):
         if request.user == instance.user and not instance.questions_provided:
             assessment = instance.assessment
             number_of_questions = assessment.number_of_questions
-            random_questions = Question.objects.filter(assessment=assessment).order_by("?")[:number_of_questions]
-            random_questions_with_choices = random_questions.prefetch_related(
-                Prefetch("choices", queryset=Choice.objects.all(), to_attr="fetched_choices")
-            )
-            questions_data = [
-                {
-                    "question_id": q.id,
-                    "description": q.description,
-                    "choices": [
-                        {"choice_id": c.id, "description": c.description}
-                        for c in random.sample(q.fetched_choices, len(q.fetched_choices))
-                    ],
-                }
-                for q in random_questions_with_choices
-            ]
+            questions_data = assemble_paper(assessment, number_of_questions)
             response_data = serializer.data
             response_data["questions"] = questions_data
             instance.questions_provided = True
@@ -81,24 +77,6 @@ class AttemptViewSet(viewsets.ModelViewSet):
             return Response(response_data)
         return Response(serializer.data)
 
-    def update_assessment_average_score(self, assessment):
-        avg_score = Attempt.objects.filter(assessment=assessment).aggregate(avg_score=Avg("score"))["avg_score"]
-        assessment.average_score = avg_score or 0
-        assessment.save()
-
-    def update_user_average_score(self, user, user_points=None):
-        """
-        Update the user's average score based on all attempts.
-        """
-        user.average_score = Attempt.objects.filter(user=user).aggregate(avg_score=Avg("score"))["avg_score"] or 0
-        user.save()
-        if user_points:
-            category_attempts = Attempt.objects.filter(
-                user=user, assessment__subcategory__category=user_points.category
-            )
-            user_points.average_score = category_attempts.aggregate(Avg("score"))["score__avg"] or 0
-            user_points.save()
-
     def calculate_points(self, assessment, score):
         """Helper function to calculate points based on the formula."""
         D_teacher = assessment.difficulty
@@ -108,68 +86,35 @@ class AttemptViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["POST"])
     def finalize_attempt(self, request, pk=None):
         attempt = self.get_object()
-        attempt.end_time = timezone.now()
-
-        expected_end_time = attempt.start_time + timedelta(minutes=attempt.assessment.time_limit, seconds=5)
-        if attempt.end_time > expected_end_time:
-            return Response(
-                {"error": "The attempt exceeded the allowed time limit."}, status=status.HTTP_400_BAD_REQUEST
-            )
-        if not isinstance(request.data, list):
-            return Response({"error": "Expected a list of answers."}, status=status.HTTP_400_BAD_REQUEST)
-        answers = request.data
-        question_attempts_to_create = []
-        for answer in answers:
-            question_id = answer.get("question_id")
-            selected_choices = set(answer.get("choices", []))
-
-            try:
-                question = Question.objects.get(pk=question_id)
-            except Question.DoesNotExist:
+        # Grading, the attempt and its apply_result job are committed together, and the lock makes
+        # concurrent finalizations of the attempt wait, then find it finished.
+        with transaction.atomic():
+            if Attempt.objects.select_for_update().values_list("is_finished", flat=True).get(pk=attempt.pk):
+                return Response({"error": "The attempt is already finalized."}, status=status.HTTP_400_BAD_REQUEST)
+            attempt.end_time = timezone.now()
+
+            expected_end_time = attempt.start_time + timedelta(minutes=attempt.assessment.time_limit, seconds=5)
+            if attempt.end_time > expected_end_time:
                 return Response(
-                    {"error": f"Question with id {question_id} does not exist."}, status=status.HTTP_400_BAD_REQUEST
+                    {"error": "The attempt exceeded the allowed time limit."}, status=status.HTTP_400_BAD_REQUEST
                 )
-            correct_choices_ids = set(question.choices.filter(correct_answer=True).values_list("id", flat=True))
-            is_correct = correct_choices_ids == selected_choices
-
-            question_attempts_to_create.append(
-                QuestionAttempt(attempt=attempt, question_id=question_id, is_correct=is_correct)
-            )
-        QuestionAttempt.objects.bulk_create(question_attempts_to_create)
-
-        for qa, answer in zip(question_attempts_to_create, answers):
-            qa.selected_choices.set(answer.get("choices", []))
-
-        # Calculating score:
-        total_questions = attempt.assessment.number_of_questions
-        correct_answers_count = attempt.question_attempts.filter(is_correct=True).count()
-        attempt.score = (correct_answers_count / total_questions) * 100
-        attempt.approved = attempt.score >= attempt.assessment.min_score
-        # Calculating points:
-        attempt.points_obtained = self.calculate_points(attempt.assessment, attempt.score)
-        best_attempt = (
-            Attempt.objects.filter(assessment=attempt.assessment, user=request.user)
-            .exclude(pk=attempt.pk)
-            .order_by("-points_obtained")
-            .first()
-        )
-        user_points, created = UserPoints.objects.get_or_create(
-            user=attempt.user, category=attempt.assessment.subcategory.category, defaults={"total_points": 0}
-        )
-        if not best_attempt or attempt.points_obtained > best_attempt.points_obtained:
-            if best_attempt:
-                difference = attempt.points_obtained - best_attempt.points_obtained
-                attempt.user.points += difference
-                user_points.total_points += difference
-            else:
-                attempt.user.points += attempt.points_obtained
-                user_points.total_points += attempt.points_obtained
-            attempt.user.save()
-            user_points.save()
-        attempt.is_finished = True
-        attempt.save()
-        self.update_user_average_score(attempt.user, user_points)
-        self.update_assessment_average_score(attempt.assessment)
+            if not isinstance(request.data, list):
+                return Response({"error": "Expected a list of answers."}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                correct_answers_count = grade_attempt(attempt, request.data, answer_keys.get(attempt.assessment))
+            except GradingError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Calculating score:
+            total_questions = attempt.assessment.number_of_questions
+            attempt.score = (correct_answers_count / total_questions) * 100
+            attempt.approved = attempt.score >= attempt.assessment.min_score
+            # Calculating points:
+            attempt.points_obtained = self.calculate_points(attempt.assessment, attempt.score)
+            attempt.is_finished = True
+            attempt.save()
+            # Points and averages are updated by the job queue, off the request path.
+            enqueue("attempts.apply_result", attempt_id=attempt.pk)
         return Response(
             {
                 "detail": "Attempt finalized successfully.",
@@ -180,11 +125,39 @@ class AttemptViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK,
         )
 
+    @action(detail=False, methods=["GET"])
+    def export(self, request):
+        """
+        Stream the finished attempts on the user's assessments, with their answers and selected choices.
+
+        ?assessment=<id> limits the export to one assessment and ?output=ndjson switches from CSV to NDJSON.
+        """
+        if not request.user.is_authenticated:
+            return Response({"error": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
+        output = request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Unknown output, expected one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        assessments = Assessment.objects.filter(user=request.user)
+        name = "all"
+        if "assessment" in request.query_params:
+            assessment = get_object_or_404(assessments, pk=request.query_params["assessment"])
+            assessments = [assessment.pk]
+            name = str(assessment.pk)
+
+        export, content_type = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(export(finished_attempts(assessments)), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="attempts-{name}.{output}"'
+        return response
+
 
 class QuestionAttemptViewSet(viewsets.ModelViewSet):
     permission_classes = [AttemptBasedPermissions]
     queryset = QuestionAttempt.objects.all()
     serializer_class = QuestionAttemptSerializer
+    pagination_class = KeysetPagination
     filterset_fields = {
         "attempt": ("exact", "in"),
         "question": ("exact", "in"),
@@ -198,10 +171,10 @@ class QuestionAttemptViewSet(viewsets.ModelViewSet):
         return QuestionAttempt.objects.none()
 
     def perform_create(self, serializer):
-        question = Question.objects.get(pk=self.request.data["question"])
+        question = Question.objects.select_related("assessment").get(pk=self.request.data["question"])
 
         # Checking if answer is correct:
-        correct_choices_ids = set(question.choices.filter(correct_answer=True).values_list("id", flat=True))
+        correct_choices_ids, _ = answer_keys.get(question.assessment)[question.id]
         selected_choices_ids = set([int(choice_id) for choice_id in self.request.data["selected_choices"]])
 
         is_correct = correct_choices_ids == selected_choices_ids
@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.jobs.queue import stats
+
+
+class Command(BaseCommand):
+    help = "Print the depth and latency of the background job queue as JSON."
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(stats(), indent=2))
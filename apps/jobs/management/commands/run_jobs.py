@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.jobs.queue import enqueue_periodic, run_pending, purge_finished
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10)
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit once there are no due jobs left.")
+
+    def handle(self, *args, **options):
+        purged_at = 0
+        last_enqueued = {}
+        while True:
+            enqueue_periodic(last_enqueued)
+            if run_pending(options["batch_size"]):
+                continue
+            if options["once"]:
+                break
+            if time.monotonic() - purged_at > 60 * 60:
+                purge_finished()
+                purged_at = time.monotonic()
+            time.sleep(options["sleep"])
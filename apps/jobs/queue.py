@@ -0,0 +1,133 @@
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+handlers = {}
+periodic = {}
+
+
+def job(name, every=None):
+    """
+    Register a function as the handler of the jobs with the given name.
+
+    Jobs are delivered at least once, so handlers must be idempotent. Jobs registered
+    with every (in seconds) are also enqueued periodically by the run_jobs worker.
+    """
+
+    def decorator(func):
+        handlers[name] = func
+        if every:
+            periodic[name] = every
+        return func
+
+    return decorator
+
+
+def enqueue(name, run_after=None, **payload):
+    """Queue a job to be run by the run_jobs worker."""
+    if name not in handlers:
+        raise ValueError(f"No handler registered for job {name}.")
+    return Job.objects.create(name=name, payload=payload, run_after=run_after or timezone.now())
+
+
+def lock_timeout():
+    return timedelta(seconds=getattr(settings, "JOBS_LOCK_TIMEOUT", 300))
+
+
+def claim_jobs(batch_size=10):
+    """
+    Lock a batch of due jobs for this worker.
+
+    Jobs left running by a worker that died are claimed again once their lock times out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.PENDING, run_after__lte=now) | Q(status=Job.RUNNING, locked_at__lt=now - lock_timeout())
+            )
+            .order_by("run_after", "id")[:batch_size]
+        )
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING, locked_at=now, attempts=F("attempts") + 1
+        )
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def run_job(job):
+    try:
+        with transaction.atomic():
+            handlers[job.name](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error("Job %s failed permanently:\n%s", job, job.last_error)
+        else:
+            # Exponential backoff between retries.
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=2**job.attempts)
+            logger.warning("Job %s failed, retrying at %s:\n%s", job, job.run_after, job.last_error)
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save(update_fields=["status", "run_after", "locked_at", "last_error", "finished_at"])
+
+
+def run_pending(batch_size=10):
+    """Run one batch of due jobs and return how many were run."""
+    jobs = claim_jobs(batch_size)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+def enqueue_periodic(last_enqueued):
+    """
+    Enqueue the periodic jobs that are due, unless one is already queued.
+
+    last_enqueued maps job names to the time.monotonic() of their last scheduling and is updated in place.
+    """
+    now = time.monotonic()
+    for name, every in periodic.items():
+        if now - last_enqueued.get(name, -every) < every:
+            continue
+        last_enqueued[name] = now
+        if not Job.objects.filter(name=name, status__in=[Job.PENDING, Job.RUNNING]).exists():
+            enqueue(name)
+
+
+def purge_finished(older_than=timedelta(days=7)):
+    return Job.objects.filter(status=Job.DONE, finished_at__lt=timezone.now() - older_than).delete()[0]
+
+
+def stats(window=timedelta(hours=1)):
+    """Queue depth per status, age of the oldest due job and average latency of recently finished jobs."""
+    now = timezone.now()
+    depth = {Job.PENDING: 0, Job.RUNNING: 0, Job.FAILED: 0}
+    for row in Job.objects.filter(status__in=depth).values("status").annotate(total=Count("id")).order_by():
+        depth[row["status"]] = row["total"]
+    oldest_due = Job.objects.filter(status=Job.PENDING, run_after__lte=now).aggregate(oldest=Min("run_after"))["oldest"]
+    latency = Job.objects.filter(status=Job.DONE, finished_at__gte=now - window).aggregate(
+        latency=Avg(ExpressionWrapper(F("finished_at") - F("created_at"), output_field=DurationField()))
+    )["latency"]
+    return {
+        "depth": depth,
+        "oldest_pending_seconds": (now - oldest_due).total_seconds() if oldest_due else 0,
+        "average_latency_seconds": latency.total_seconds() if latency else None,
+    }
@@ -0,0 +1,50 @@
+from django.test import TestCase
+
+from .models import Job
+from .queue import enqueue, job, run_pending, stats
+
+calls = []
+
+
+@job("tests.record")
+def record(value):
+    calls.append(value)
+
+
+@job("tests.fail")
+def fail():
+    raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_runs_due_jobs(self):
+        queued = enqueue("tests.record", value=1)
+
+        self.assertEqual(stats()["depth"][Job.PENDING], 1)
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.DONE)
+        self.assertEqual(run_pending(), 0)
+
+    def test_failed_jobs_are_retried_until_max_attempts(self):
+        queued = enqueue("tests.fail")
+        Job.objects.filter(pk=queued.pk).update(max_attempts=2)
+
+        run_pending()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.PENDING)
+        self.assertIn("boom", queued.last_error)
+
+        Job.objects.filter(pk=queued.pk).update(run_after=queued.created_at)
+        run_pending()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.FAILED)
+        self.assertEqual(queued.attempts, 2)
+
+    def test_unknown_jobs_are_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue("tests.unknown")
@@ -1,8 +1,19 @@
 from django.contrib import admin
 
-from .models import CustomUser, Follow, UserPoints
+from .models import CustomUser, Follow, UserPoints, PointsLedger, LeaderboardEntry
+
+
+@admin.register(CustomUser)
+class CustomUserAdmin(admin.ModelAdmin):
+    # Regular saves leave counter fields out (see somaserver.db.CounterFieldsMixin), so edits would be lost.
+    readonly_fields = CustomUser.counter_fields
+
+
+@admin.register(UserPoints)
+class UserPointsAdmin(admin.ModelAdmin):
+    readonly_fields = UserPoints.counter_fields
 
 
-admin.site.register(CustomUser)
 admin.site.register(Follow)
-admin.site.register(UserPoints)
+admin.site.register(PointsLedger)
+admin.site.register(LeaderboardEntry)
@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import FeedEntry, Follow
+from apps.assessments.models import FollowAssessment
+from apps.jobs.queue import enqueue
+
+FAN_OUT_BATCH_SIZE = 1000
+
+
+def publish(verb, actor_id, assessment_id, attempt_id=None):
+    """
+    Queue the copy of an activity to the feeds of the followers of its actor.
+
+    Updates of an assessment go to the followers of the assessment instead.
+    """
+    enqueue(
+        "feed.fan_out",
+        verb=verb,
+        actor_id=actor_id,
+        assessment_id=assessment_id,
+        attempt_id=attempt_id,
+        created_at=timezone.now().isoformat(),
+    )
+
+
+def followers_of(verb, actor_id, assessment_id):
+    if verb == FeedEntry.ASSESSMENT_UPDATED:
+        return FollowAssessment.objects.filter(assessment=assessment_id)
+    return Follow.objects.filter(followed=actor_id)
+
+
+def fan_out(verb, actor_id, assessment_id, created_at, attempt_id=None, after=0, batch_size=FAN_OUT_BATCH_SIZE):
+    """
+    Insert the feed entries of the next batch_size followers, in follow id order after `after`.
+
+    Returns the id of the last follow of the batch when there may be more followers, None otherwise.
+    """
+    follows = list(
+        followers_of(verb, actor_id, assessment_id)
+        .filter(pk__gt=after, follower__is_active=True)
+        .exclude(follower=actor_id)
+        .order_by("pk")
+        .values_list("pk", "follower_id")[:batch_size]
+    )
+    created_at = parse_datetime(created_at)
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                owner_id=follower_id,
+                verb=verb,
+                actor_id=actor_id,
+                assessment_id=assessment_id,
+                attempt_id=attempt_id,
+                created_at=created_at,
+            )
+            for _, follower_id in follows
+        ],
+        ignore_conflicts=True,
+    )
+    return follows[-1][0] if len(follows) == batch_size else None
+
+
+def retention():
+    return timedelta(days=getattr(settings, "FEED_RETENTION_DAYS", 90))
+
+
+def trim(batch_size=5000):
+    """Delete one batch of the entries older than the retention period and return how many were deleted."""
+    expired = FeedEntry.objects.filter(created_at__lt=timezone.now() - retention()).order_by("created_at")
+    return FeedEntry.objects.filter(pk__in=list(expired.values_list("pk", flat=True)[:batch_size])).delete()[0]
@@ -0,0 +1,171 @@
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import CustomUser, UserPoints, Leaderboard, LeaderboardEntry
+from apps.assessments.models import Category
+
+GLOBAL_BOARD = "global"
+
+
+def category_board(category_id):
+    return f"category:{category_id}"
+
+
+def country_board(country):
+    return f"country:{country}"
+
+
+def board_scores(board):
+    """Return the (user id, score) rows of a board, best first."""
+    kind, _, key = board.partition(":")
+    if kind == "category":
+        return (
+            UserPoints.objects.filter(category=key, total_points__gt=0, user__is_active=True)
+            .order_by("-total_points", "user_id")
+            .values_list("user_id", "total_points")
+        )
+    users = CustomUser.objects.filter(is_active=True, points__gt=0)
+    if kind == "country":
+        users = users.filter(country=key)
+    return users.order_by("-points", "id").values_list("id", "points")
+
+
+def all_boards():
+    countries = (
+        CustomUser.objects.exclude(country__isnull=True)
+        .exclude(country="")
+        .order_by()
+        .values_list("country", flat=True)
+        .distinct()
+    )
+    return (
+        [GLOBAL_BOARD]
+        + [category_board(category_id) for category_id in Category.objects.values_list("id", flat=True)]
+        + [country_board(country) for country in countries]
+    )
+
+
+def lock_boards(boards):
+    """
+    Lock the given boards until the end of the current transaction.
+
+    Boards are locked in name order, so transactions moving entries on several boards cannot deadlock.
+    """
+    boards = sorted(set(boards))
+    Leaderboard.objects.bulk_create([Leaderboard(name=board) for board in boards], ignore_conflicts=True)
+    list(Leaderboard.objects.select_for_update().filter(name__in=boards).order_by("name").values_list("name"))
+
+
+def rebuild_board(board, batch_size=1000):
+    """Recompute every position of a board from the points snapshots."""
+    rows = enumerate(board_scores(board).iterator(chunk_size=batch_size), 1)
+    with transaction.atomic():
+        lock_boards([board])
+        LeaderboardEntry.objects.filter(board=board).delete()
+        while batch := list(islice(rows, batch_size)):
+            LeaderboardEntry.objects.bulk_create(
+                [
+                    LeaderboardEntry(board=board, user_id=user_id, score=score, rank=rank)
+                    for rank, (user_id, score) in batch
+                ]
+            )
+
+
+def set_score(board, user_id, score):
+    """
+    Move a user to the position of its new score on a board.
+
+    The new position is found with one lookup on the (board, score, user) index and only
+    the entries between the old and the new position are shifted. Users without points leave
+    the board, as rebuild_board leaves them out.
+    """
+    with transaction.atomic():
+        lock_boards([board])
+        place_entry(board, user_id, score)
+
+
+def place_entry(board, user_id, score):
+    """Move an entry of a board that the transaction holds the lock of, or remove it without points."""
+    if score > 0:
+        move_entry(board, user_id, score)
+    else:
+        remove_entry(board, user_id)
+
+
+def move_entry(board, user_id, score):
+    entries = LeaderboardEntry.objects.filter(board=board)
+    entry = entries.filter(user=user_id).first()
+    above = (
+        entries.filter(Q(score__gt=score) | Q(score=score, user__lt=user_id))
+        .exclude(user=user_id)
+        .order_by("score", "-user")
+        .values_list("rank", flat=True)
+        .first()
+    )
+    new_rank = (above or 0) + 1
+
+    if entry is None:
+        entries.filter(rank__gte=new_rank).update(rank=F("rank") + 1)
+        LeaderboardEntry.objects.create(board=board, user_id=user_id, score=score, rank=new_rank)
+        return
+
+    if entry.rank < new_rank:
+        # The entry itself was counted above its new position.
+        new_rank -= 1
+        entries.filter(rank__gt=entry.rank, rank__lte=new_rank).update(rank=F("rank") - 1)
+    elif entry.rank > new_rank:
+        entries.filter(rank__gte=new_rank, rank__lt=entry.rank).update(rank=F("rank") + 1)
+    entries.filter(pk=entry.pk).update(score=score, rank=new_rank)
+
+
+def remove_entry(board, user_id):
+    """Remove the entry of a user from a board that the transaction holds the lock of, closing the gap."""
+    entries = LeaderboardEntry.objects.filter(board=board)
+    rank = entries.filter(user=user_id).values_list("rank", flat=True).first()
+    if rank is None:
+        return
+    entries.filter(user=user_id).delete()
+    entries.filter(rank__gt=rank).update(rank=F("rank") - 1)
+
+
+def update_scores(user_ids, category_pairs):
+    """
+    Move the given users, and (user id, category id) pairs, to their current points on every board.
+
+    Inactive users are removed from every board they are on, and active ones from the boards of
+    the countries they left.
+    """
+    moves = []
+    users = list(CustomUser.objects.filter(pk__in=user_ids).values_list("id", "points", "country", "is_active"))
+    inactive = [user_id for user_id, _, _, is_active in users if not is_active]
+    country_boards = {}
+    for user_id, points, country, is_active in users:
+        if is_active:
+            moves.append((GLOBAL_BOARD, user_id, points))
+            country_boards[user_id] = country_board(country) if country else None
+            if country:
+                moves.append((country_board(country), user_id, points))
+    category_filter = Q()
+    for user_id, category_id in category_pairs:
+        category_filter |= Q(user=user_id, category=category_id)
+    if category_pairs:
+        for user_id, category_id, total_points in UserPoints.objects.filter(
+            category_filter, user__is_active=True
+        ).values_list("user_id", "category_id", "total_points"):
+            moves.append((category_board(category_id), user_id, total_points))
+    removals = [
+        (board, user_id)
+        for board, user_id in LeaderboardEntry.objects.filter(
+            Q(user__in=inactive) | Q(user__in=country_boards, board__startswith=country_board(""))
+        ).values_list("board", "user_id")
+        if user_id not in country_boards or board != country_boards[user_id]
+    ]
+
+    with transaction.atomic():
+        lock_boards([board for board, *_ in moves + removals])
+        for board, user_id, score in moves:
+            place_entry(board, user_id, score)
+        for board, user_id in removals:
+            remove_entry(board, user_id)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.users.leaderboard import all_boards, rebuild_board
+
+
+class Command(BaseCommand):
+    help = "Recompute every leaderboard from the points of users and user points."
+
+    def add_arguments(self, parser):
+        parser.add_argument("boards", nargs="*", help="Boards to rebuild, all of them by default.")
+
+    def handle(self, *args, **options):
+        boards = options["boards"] or all_boards()
+        for board in boards:
+            rebuild_board(board)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(boards)} leaderboards."))
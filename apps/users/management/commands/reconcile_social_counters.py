@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.users.social import reconcile_social_counters
+
+
+class Command(BaseCommand):
+    help = "Recount the follower and following counters of users and assessments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        reconcile_social_counters(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS("Social counters reconciled."))
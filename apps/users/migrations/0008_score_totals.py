@@ -0,0 +1,33 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0007_userpoints_average_score"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="score_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="score_sum",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="userpoints",
+            name="score_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="userpoints",
+            name="score_sum",
+            field=models.FloatField(default=0, editable=False),
+        ),
+    ]
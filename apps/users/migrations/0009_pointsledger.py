@@ -0,0 +1,54 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0007_score_totals"),
+        ("attempts", "0007_attempt_results_applied"),
+        ("users", "0008_score_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PointsLedger",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("points", models.IntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("compacted", models.BooleanField(default=False)),
+                (
+                    "attempt",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="points_entries",
+                        to="attempts.attempt",
+                    ),
+                ),
+                ("category", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="assessments.category")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="points_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Points ledger",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("compacted", False)),
+                        fields=["user", "category"],
+                        name="pointsledger_pending_idx",
+                    )
+                ],
+                "unique_together": {("attempt", "category")},
+            },
+        ),
+    ]
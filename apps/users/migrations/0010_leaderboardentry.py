@@ -0,0 +1,40 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0009_pointsledger"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaderboardEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("board", models.CharField(max_length=50)),
+                ("score", models.IntegerField()),
+                ("rank", models.PositiveIntegerField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leaderboard_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Leaderboard entries",
+                "indexes": [
+                    models.Index(fields=["board", "rank"], name="leaderboard_rank_idx"),
+                    models.Index(fields=["board", "score", "user"], name="leaderboard_score_idx"),
+                ],
+                "unique_together": {("board", "user")},
+            },
+        ),
+    ]
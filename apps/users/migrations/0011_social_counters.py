@@ -0,0 +1,57 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:20
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_social_counters(apps, schema_editor):
+    CustomUser = apps.get_model("users", "CustomUser")
+    Follow = apps.get_model("users", "Follow")
+    Assessment = apps.get_model("assessments", "Assessment")
+    FollowAssessment = apps.get_model("assessments", "FollowAssessment")
+
+    def count_of(queryset, group_by):
+        return Coalesce(
+            Subquery(queryset.order_by().values(group_by).annotate(total=Count("id")).values("total")),
+            Value(0),
+        )
+
+    def update_in_chunks(queryset, **counters):
+        last_id = queryset.aggregate(last_id=Max("id"))["last_id"] or 0
+        for start in range(0, last_id + 1, 1000):
+            queryset.filter(pk__gte=start, pk__lt=start + 1000).update(**counters)
+
+    update_in_chunks(
+        CustomUser.objects.all(),
+        followers_count=count_of(Follow.objects.filter(followed=OuterRef("pk"), follower__is_active=True), "followed"),
+        following_count=count_of(Follow.objects.filter(follower=OuterRef("pk"), followed__is_active=True), "follower"),
+    )
+    update_in_chunks(
+        Assessment.objects.all(),
+        followers_count=count_of(
+            FollowAssessment.objects.filter(assessment=OuterRef("pk"), follower__is_active=True), "assessment"
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0010_leaderboardentry"),
+        ("assessments", "0008_assessment_followers_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="followers_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="following_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_social_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0011_social_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(fields=["points"], name="user_points_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(fields=["average_score"], name="user_average_score_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                condition=models.Q(("reset_code__isnull", False)), fields=["reset_code"], name="user_reset_code_idx"
+            ),
+        ),
+    ]
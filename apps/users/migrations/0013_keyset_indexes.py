@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-17 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0012_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(fields=["created_at", "id"], name="follow_created_at_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-17 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0014_feed_entry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="profile_picture_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.5 on 2026-10-17 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0015_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Leaderboard",
+            fields=[
+                ("name", models.CharField(max_length=50, primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
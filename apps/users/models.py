@@ -1,14 +1,20 @@
 import os
 
 from django.db import models
+from django.db.models import Exists, F, Q, Sum, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, UserManager
 from rest_framework.authtoken.models import Token
 from django_countries.fields import CountryField
 
-from apps.assessments.models import Category
+from apps.assessments.models import Category, Assessment
+from apps.jobs.queue import enqueue
+from somaserver.db import CounterFieldsMixin
+from somaserver.images import track_image_variants
 
 
 class MrvUserManager(UserManager):
@@ -28,16 +34,21 @@ def content_file_name(instance, filename):
     return os.path.join("profile_pics", filename)
 
 
-class CustomUser(AbstractUser):
+class CustomUser(CounterFieldsMixin, AbstractUser):
     GENDER_CHOICES = (("M", "Male"), ("F", "Female"), ("O", "Other"))
     email = models.EmailField(unique=True)
     birthday = models.DateField(auto_now=False, auto_now_add=False, null=True, blank=True)
     profile_picture = models.ImageField(upload_to=content_file_name, null=True, blank=True)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     biography = models.TextField(blank=True, null=True)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, blank=True)
     updated_time = models.DateField(auto_now=True)
     average_score = models.FloatField(default=0)
+    score_sum = models.FloatField(default=0, editable=False)
+    score_count = models.IntegerField(default=0, editable=False)
     points = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0, editable=False)
+    following_count = models.IntegerField(default=0, editable=False)
     reset_code = models.CharField(max_length=7, null=True, blank=True)
     country = CountryField(blank=True, null=True)
 
@@ -46,6 +57,26 @@ class CustomUser(AbstractUser):
     REQUIRED_FIELDS = []
     objects = MrvUserManager()
 
+    counter_fields = (
+        "average_score",
+        "score_sum",
+        "score_count",
+        "points",
+        "followers_count",
+        "following_count",
+        "profile_picture_variants",
+    )
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["points"], name="user_points_idx"),
+            models.Index(fields=["average_score"], name="user_average_score_idx"),
+            models.Index(fields=["reset_code"], condition=Q(reset_code__isnull=False), name="user_reset_code_idx"),
+        ]
+
+
+track_image_variants(CustomUser, "profile_picture", "profile_picture_variants")
+
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
@@ -53,11 +84,15 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
         Token.objects.create(user=instance)
 
 
-class UserPoints(models.Model):
+class UserPoints(CounterFieldsMixin, models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     total_points = models.PositiveIntegerField(default=0)
     average_score = models.FloatField(null=True, blank=True)
+    score_sum = models.FloatField(default=0, editable=False)
+    score_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ("average_score", "score_sum", "score_count", "total_points")
 
     class Meta:
         unique_together = ("user", "category")
@@ -67,6 +102,79 @@ class UserPoints(models.Model):
         return f"{self.user.email} - {self.category.name} - {self.total_points} points"
 
 
+class PointsLedger(models.Model):
+    """
+    Insert-only record of the points awarded by each attempt.
+
+    Entries are folded into CustomUser.points and UserPoints.total_points by the
+    points.compact job, so awarding points never writes to those rows directly.
+    """
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="points_entries")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    attempt = models.ForeignKey("attempts.Attempt", on_delete=models.CASCADE, related_name="points_entries")
+    points = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    compacted = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ("attempt", "category")
+        indexes = [
+            models.Index(fields=["user", "category"], condition=Q(compacted=False), name="pointsledger_pending_idx"),
+        ]
+        verbose_name_plural = "Points ledger"
+
+    def __str__(self):
+        return f"{self.user_id} - {self.category_id} - {self.points} points"
+
+
+def pending_points(**filters):
+    """Points awarded to the matching user (and category) that are not compacted yet."""
+    return Coalesce(
+        Subquery(
+            PointsLedger.objects.filter(compacted=False, **filters)
+            .order_by()
+            .values(*filters)
+            .annotate(total=Sum("points"))
+            .values("total")
+        ),
+        Value(0),
+    )
+
+
+class Leaderboard(models.Model):
+    """A row per board, locked by the transactions that move entries on it so their rank shifts never overlap."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+
+    def __str__(self):
+        return self.name
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Materialized position of a user on a leaderboard.
+
+    Boards are named "global", "category:<category id>" or "country:<country code>".
+    """
+
+    board = models.CharField(max_length=50)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="leaderboard_entries")
+    score = models.IntegerField()
+    rank = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("board", "user")
+        indexes = [
+            models.Index(fields=["board", "rank"], name="leaderboard_rank_idx"),
+            models.Index(fields=["board", "score", "user"], name="leaderboard_score_idx"),
+        ]
+        verbose_name_plural = "Leaderboard entries"
+
+    def __str__(self):
+        return f"{self.board} #{self.rank} - {self.user_id} ({self.score})"
+
+
 class Follow(models.Model):
     follower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="following")
     followed = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="followers")
@@ -75,6 +183,97 @@ class Follow(models.Model):
     class Meta:
         unique_together = ("follower", "followed")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="follow_created_at_idx"),
+        ]
 
     def __str__(self):
         return f"{self.follower} -> {self.followed}"
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        update_follow_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    update_follow_counters(instance, -1)
+
+
+def update_follow_counters(follow, delta):
+    """Follows only count while the user on the other side is active."""
+    CustomUser.objects.filter(pk=follow.followed_id).filter(
+        Exists(CustomUser.objects.filter(pk=follow.follower_id, is_active=True))
+    ).update(followers_count=F("followers_count") + delta)
+    CustomUser.objects.filter(pk=follow.follower_id).filter(
+        Exists(CustomUser.objects.filter(pk=follow.followed_id, is_active=True))
+    ).update(following_count=F("following_count") + delta)
+
+
+class FeedEntry(models.Model):
+    """
+    Precomputed activity shown in the feed of its owner.
+
+    Entries are copied to the feed of every follower when the activity happens (see
+    apps.users.feed), so reading a feed is a single range of the owner's entries.
+    """
+
+    ASSESSMENT_ACTIVATED = "assessment_activated"
+    ASSESSMENT_UPDATED = "assessment_updated"
+    ATTEMPT_FINISHED = "attempt_finished"
+    VERB_CHOICES = (
+        (ASSESSMENT_ACTIVATED, "Assessment activated"),
+        (ASSESSMENT_UPDATED, "Assessment updated"),
+        (ATTEMPT_FINISHED, "Attempt finished"),
+    )
+
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="feed_entries")
+    verb = models.CharField(max_length=30, choices=VERB_CHOICES)
+    # Each index is written once per follower, so only the owner and trimming columns are indexed.
+    actor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="+", db_index=False)
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name="+", db_index=False)
+    attempt = models.ForeignKey(
+        "attempts.Attempt", on_delete=models.CASCADE, related_name="+", null=True, blank=True, db_index=False
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Also makes a redelivered fan-out job insert nothing new.
+        unique_together = ("owner", "created_at", "verb", "actor", "assessment")
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["created_at"], name="feedentry_created_at_idx"),
+        ]
+        verbose_name_plural = "Feed entries"
+
+    def __str__(self):
+        return f"{self.owner_id} - {self.verb} - {self.assessment_id}"
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_listing(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or (update_fields is not None and not {"is_active", "country"} & set(update_fields)):
+        return
+    instance._was_listed = CustomUser.objects.filter(pk=instance.pk).values_list("is_active", "country").first()
+
+
+@receiver(post_save, sender=CustomUser)
+def listing_changed(sender, instance, created, **kwargs):
+    was = getattr(instance, "_was_listed", None)
+    instance._was_listed = None
+    if was is None:
+        return
+    was_active, country = was
+    if was_active != instance.is_active:
+        # The follows of a (de)activated user start or stop counting for everyone on the other side.
+        delta = 1 if instance.is_active else -1
+        CustomUser.objects.filter(followers__follower=instance).update(followers_count=F("followers_count") + delta)
+        CustomUser.objects.filter(following__followed=instance).update(following_count=F("following_count") + delta)
+        Assessment.objects.filter(assessments_followed__follower=instance).update(
+            followers_count=F("followers_count") + delta
+        )
+    # Users moving to another country move to its board too.
+    if was_active != instance.is_active or (country or "") != str(instance.country):
+        enqueue("leaderboards.update_user", user_id=instance.pk)
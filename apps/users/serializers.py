@@ -3,9 +3,10 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from django_countries.serializers import CountryFieldMixin
 
-from .models import Follow, UserPoints
+from .models import Follow, UserPoints, LeaderboardEntry, FeedEntry
 from apps.attempts.models import Attempt
 from apps.assessments.models import FollowAssessment
+from somaserver.images import ImageVariantsField
 
 
 class UserSerializer(CountryFieldMixin, serializers.ModelSerializer):
@@ -48,12 +49,66 @@ class UserSerializer(CountryFieldMixin, serializers.ModelSerializer):
         return user
 
 
+def add_detail_statistics(users, request_user):
+    """
+    Compute the statistics shown by UserDetailSerializer for many users at once.
+
+    Uses one grouped query per statistic, whatever the number of users, and stores the
+    results on each user as _detail_stats.
+    """
+    users = [user for user in users if not hasattr(user, "_detail_stats")]
+    if not users:
+        return
+    user_ids = [user.pk for user in users]
+
+    def counts(queryset, group_by):
+        return dict(queryset.order_by().values(group_by).annotate(total=Count("id")).values_list(group_by, "total"))
+
+    following_assessments_counts = counts(
+        FollowAssessment.objects.filter(follower__in=user_ids, assessment__is_active=True), "follower"
+    )
+    attempt_stats = {
+        row.pop("user"): row
+        for row in Attempt.objects.filter(user__in=user_ids)
+        .order_by()
+        .values("user")
+        .annotate(
+            total_approved=Count(Case(When(approved=True, then=1))),
+            total_attempts=Count("id"),
+            full_score_attempts=Count(Case(When(score=100, then=1))),
+            average_score=Avg("score"),
+        )
+    }
+    follow_ids = {}
+    if request_user and request_user.is_authenticated:
+        follow_ids = dict(
+            Follow.objects.filter(follower=request_user, followed__in=user_ids).values_list("followed", "id")
+        )
+
+    empty_attempt_stats = {"total_approved": 0, "total_attempts": 0, "full_score_attempts": 0, "average_score": None}
+    for user in users:
+        user._detail_stats = {
+            "following_assessments_count": following_assessments_counts.get(user.pk, 0),
+            "attempts": attempt_stats.get(user.pk, empty_attempt_stats),
+            "follow_id": follow_ids.get(user.pk),
+        }
+
+
+class UserDetailListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, "all") else data)
+        request = self.context.get("request")
+        add_detail_statistics(users, request.user if request else None)
+        return super().to_representation(users)
+
+
 class UserDetailSerializer(CountryFieldMixin, serializers.ModelSerializer):
     country_display = serializers.CharField(source="get_country_display", read_only=True)
     country_flag = serializers.ReadOnlyField(source="country.flag")
     gender_display = serializers.CharField(source="get_gender_display", read_only=True)
-    follower_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    profile_picture_variants = ImageVariantsField()
+    follower_count = serializers.ReadOnlyField(source="followers_count")
+    following_count = serializers.ReadOnlyField()
     following_assessments_count = serializers.SerializerMethodField()
     attempts_count = serializers.SerializerMethodField()
     average_score = serializers.SerializerMethodField()
@@ -65,6 +120,7 @@ class UserDetailSerializer(CountryFieldMixin, serializers.ModelSerializer):
 
     class Meta:
         model = get_user_model()
+        list_serializer_class = UserDetailListSerializer
         fields = [
             "id",
             "username",
@@ -77,6 +133,7 @@ class UserDetailSerializer(CountryFieldMixin, serializers.ModelSerializer):
             "date_joined",
             "birthday",
             "profile_picture",
+            "profile_picture_variants",
             "biography",
             "gender",
             "gender_display",
@@ -92,29 +149,22 @@ class UserDetailSerializer(CountryFieldMixin, serializers.ModelSerializer):
             "is_following",
         ]
 
-    def get_attempt_statistics(self, obj):
-        if not hasattr(obj, "_attempt_stats_cache"):
-            obj._attempt_stats_cache = Attempt.objects.filter(user=obj).aggregate(
-                total_approved=Count(Case(When(approved=True, then=1))),
-                total_attempts=Count("id"),
-                full_score_attempts=Count(Case(When(score=100, then=1))),
-            )
-        return obj._attempt_stats_cache
-
-    def get_follower_count(self, obj):
-        return Follow.objects.filter(followed=obj, follower__is_active=True).count()
+    def get_statistics(self, obj):
+        request = self.context.get("request")
+        add_detail_statistics([obj], request.user if request else None)
+        return obj._detail_stats
 
-    def get_following_count(self, obj):
-        return Follow.objects.filter(follower=obj, followed__is_active=True).count()
+    def get_attempt_statistics(self, obj):
+        return self.get_statistics(obj)["attempts"]
 
     def get_following_assessments_count(self, obj):
-        return FollowAssessment.objects.filter(follower=obj, assessment__is_active=True).count()
+        return self.get_statistics(obj)["following_assessments_count"]
 
     def get_attempts_count(self, obj):
         return self.get_attempt_statistics(obj)["total_attempts"]
 
     def get_average_score(self, obj):
-        return Attempt.objects.filter(user=obj).aggregate(average_score=Avg("score"))["average_score"] or 0
+        return self.get_attempt_statistics(obj)["average_score"] or 0
 
     def get_total_approved(self, obj):
         return self.get_attempt_statistics(obj)["total_approved"]
@@ -138,17 +188,18 @@ class UserDetailSerializer(CountryFieldMixin, serializers.ModelSerializer):
     def get_is_following(self, obj):
         user = self.context.get("request").user
         if user and user.is_authenticated:
-            follow_id = Follow.objects.filter(followed=obj, follower=user).values_list("id", flat=True).first()
+            follow_id = self.get_statistics(obj)["follow_id"]
             return follow_id if follow_id is not None else False
         return None
 
 
 class UserMeSerializer(serializers.ModelSerializer):
     picture = serializers.SerializerMethodField()
+    picture_variants = ImageVariantsField(source="profile_picture_variants")
 
     class Meta:
         model = get_user_model()
-        fields = ["id", "username", "first_name", "email", "date_joined", "picture"]
+        fields = ["id", "username", "first_name", "email", "date_joined", "picture", "picture_variants"]
 
     def get_picture(self, obj):
         if obj.profile_picture:
@@ -178,7 +229,9 @@ class PasswordResetSerializer(UserSerializer):
 
 class ReadOnlyUserSerializer(CountryFieldMixin, serializers.ModelSerializer):
     country_display = serializers.CharField(source="get_country_display", read_only=True)
+    points = serializers.SerializerMethodField()
     picture = serializers.SerializerMethodField()
+    picture_variants = ImageVariantsField(source="profile_picture_variants")
 
     class Meta:
         model = get_user_model()
@@ -192,8 +245,13 @@ class ReadOnlyUserSerializer(CountryFieldMixin, serializers.ModelSerializer):
             "points",
             "average_score",
             "picture",
+            "picture_variants",
         ]
 
+    def get_points(self, obj):
+        # Points awarded since the last ledger compaction are added to the snapshot.
+        return obj.points + getattr(obj, "pending_points", 0)
+
     def get_picture(self, obj):
         if obj.profile_picture:
             request = self.context.get("request")
@@ -204,15 +262,28 @@ class ReadOnlyUserSerializer(CountryFieldMixin, serializers.ModelSerializer):
 class UserPointsSerializer(serializers.ModelSerializer):
     username = serializers.ReadOnlyField(source="user.username")
     country_display = serializers.SerializerMethodField()
+    total_points = serializers.SerializerMethodField()
 
     class Meta:
         model = UserPoints
         fields = "__all__"
 
+    def get_total_points(self, obj):
+        return obj.total_points + getattr(obj, "pending_points", 0)
+
     def get_country_display(self, obj):
         return obj.user.country.name
 
 
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    username = serializers.ReadOnlyField(source="user.username")
+    country = serializers.ReadOnlyField(source="user.country.code")
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ["rank", "score", "user", "username", "country"]
+
+
 class FollowSerializer(serializers.ModelSerializer):
     follower_username = serializers.ReadOnlyField(source="follower.username")
     followed_username = serializers.ReadOnlyField(source="followed.username")
@@ -222,6 +293,8 @@ class FollowSerializer(serializers.ModelSerializer):
     followed_last_name = serializers.ReadOnlyField(source="followed.last_name")
     follower_profile_picture = serializers.SerializerMethodField()
     followed_profile_picture = serializers.SerializerMethodField()
+    follower_picture_variants = ImageVariantsField(source="follower.profile_picture_variants")
+    followed_picture_variants = ImageVariantsField(source="followed.profile_picture_variants")
 
     class Meta:
         model = Follow
@@ -248,3 +321,14 @@ class FollowSerializer(serializers.ModelSerializer):
             request = self.context.get("request")
             return request.build_absolute_uri(obj.followed.profile_picture.url)
         return None
+
+
+class FeedEntrySerializer(serializers.ModelSerializer):
+    actor_username = serializers.ReadOnlyField(source="actor.username")
+    assessment_name = serializers.ReadOnlyField(source="assessment.name")
+    score = serializers.ReadOnlyField(source="attempt.score", default=None)
+    approved = serializers.ReadOnlyField(source="attempt.approved", default=None)
+
+    class Meta:
+        model = FeedEntry
+        exclude = ["owner"]
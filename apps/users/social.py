@@ -0,0 +1,36 @@
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import CustomUser, Follow
+from apps.assessments.models import Assessment, FollowAssessment
+
+
+def count_of(queryset, group_by):
+    return Coalesce(
+        Subquery(queryset.order_by().values(group_by).annotate(total=Count("id")).values("total")),
+        Value(0),
+    )
+
+
+def reconcile_in_chunks(queryset, chunk_size, **counters):
+    """Recount the given counter columns chunk_size rows at a time, to keep each UPDATE short."""
+    last_id = queryset.aggregate(last_id=Max("id"))["last_id"] or 0
+    for start in range(0, last_id + 1, chunk_size):
+        queryset.filter(pk__gte=start, pk__lt=start + chunk_size).update(**counters)
+
+
+def reconcile_social_counters(chunk_size=1000):
+    """Recount the follower and following counters of users and assessments from the follow tables."""
+    reconcile_in_chunks(
+        CustomUser.objects.all(),
+        chunk_size,
+        followers_count=count_of(Follow.objects.filter(followed=OuterRef("pk"), follower__is_active=True), "followed"),
+        following_count=count_of(Follow.objects.filter(follower=OuterRef("pk"), followed__is_active=True), "follower"),
+    )
+    reconcile_in_chunks(
+        Assessment.objects.all(),
+        chunk_size,
+        followers_count=count_of(
+            FollowAssessment.objects.filter(assessment=OuterRef("pk"), follower__is_active=True), "assessment"
+        ),
+    )
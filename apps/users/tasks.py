@@ -0,0 +1,64 @@
+from collections import Counter
+
+from django.db.models import F
+
+from . import feed
+from .leaderboard import update_scores
+from .models import CustomUser, UserPoints, PointsLedger
+from apps.jobs.queue import enqueue, job
+
+
+@job("points.compact", every=60)
+def compact_points_ledger(batch_size=5000):
+    """
+    Fold pending ledger entries into the CustomUser.points and UserPoints.total_points snapshots.
+
+    Entries are marked as compacted in the same transaction as the snapshot updates, so a
+    batch is never counted twice.
+    """
+    entries = list(
+        PointsLedger.objects.select_for_update(skip_locked=True)
+        .filter(compacted=False)
+        .order_by("id")
+        .values_list("id", "user_id", "category_id", "points")[:batch_size]
+    )
+    user_points = Counter()
+    category_points = Counter()
+    for _, user_id, category_id, points in entries:
+        user_points[user_id] += points
+        category_points[user_id, category_id] += points
+
+    for user_id, points in user_points.items():
+        CustomUser.objects.filter(pk=user_id).update(points=F("points") + points)
+    for (user_id, category_id), points in category_points.items():
+        updated = UserPoints.objects.filter(user=user_id, category=category_id).update(
+            total_points=F("total_points") + points
+        )
+        if not updated:
+            UserPoints.objects.create(user_id=user_id, category_id=category_id, total_points=points)
+    PointsLedger.objects.filter(pk__in=[entry[0] for entry in entries]).update(compacted=True)
+    update_scores(user_points.keys(), category_points.keys())
+    if len(entries) == batch_size:
+        enqueue("points.compact")
+
+
+@job("feed.fan_out")
+def fan_out_feed_entries(**activity):
+    """Copy an activity to the feeds of one batch of followers and queue the next batch."""
+    last_follow = feed.fan_out(**activity)
+    if last_follow is not None:
+        enqueue("feed.fan_out", **{**activity, "after": last_follow})
+
+
+@job("feed.trim", every=60 * 60)
+def trim_feeds(batch_size=5000):
+    """Delete the feed entries older than FEED_RETENTION_DAYS, a batch at a time."""
+    if feed.trim(batch_size) == batch_size:
+        enqueue("feed.trim")
+
+
+@job("leaderboards.update_user")
+def update_user_boards(user_id):
+    """Put a user on the boards it belongs to, after it was (de)activated or changed country."""
+    categories = UserPoints.objects.filter(user=user_id).values_list("category_id", flat=True)
+    update_scores([user_id], [(user_id, category_id) for category_id in categories])
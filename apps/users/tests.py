@@ -1,3 +1,327 @@
+import base64
+import json
+import random
+from datetime import timedelta
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .feed import publish
+from .leaderboard import GLOBAL_BOARD, rebuild_board, set_score
+from .models import CustomUser, Follow, LeaderboardEntry, FeedEntry
+from .social import reconcile_social_counters
+from .tasks import fan_out_feed_entries, trim_feeds
+from somaserver.testing import QueryPlanAssertions
+from apps.assessments.models import Category, Subcategory, Assessment, FollowAssessment
+from apps.attempts.models import Attempt
+from apps.jobs.models import Job
+from apps.jobs.queue import enqueue, run_pending
+
+
+class LeaderboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            CustomUser.objects.create_user(username=f"user{i}", email=f"user{i}@test.com", password="test1234")
+            for i in range(20)
+        ]
+
+    def positions(self):
+        return list(LeaderboardEntry.objects.filter(board=GLOBAL_BOARD).order_by("rank").values_list("rank", "user"))
+
+    def test_incremental_moves_match_a_full_rebuild(self):
+        rng = random.Random(15)
+        for _ in range(60):
+            user = rng.choice(self.users)
+            points = rng.randint(1, 10)
+            CustomUser.objects.filter(pk=user.pk).update(points=points)
+            set_score(GLOBAL_BOARD, user.pk, points)
+        incremental = self.positions()
+
+        rebuild_board(GLOBAL_BOARD)
+        self.assertEqual(incremental, self.positions())
+
+    def test_users_without_points_or_inactive_leave_the_boards(self):
+        for points, user in enumerate(self.users[:5], 1):
+            CustomUser.objects.filter(pk=user.pk).update(points=points)
+        rebuild_board(GLOBAL_BOARD)
+
+        CustomUser.objects.filter(pk=self.users[2].pk).update(points=0)
+        set_score(GLOBAL_BOARD, self.users[2].pk, 0)
+        user = CustomUser.objects.get(pk=self.users[4].pk)
+        user.is_active = False
+        user.save()
+        run_pending()
+
+        incremental = self.positions()
+        self.assertEqual(incremental, [(1, self.users[3].pk), (2, self.users[1].pk), (3, self.users[0].pk)])
+        rebuild_board(GLOBAL_BOARD)
+        self.assertEqual(incremental, self.positions())
+
+    def test_users_changing_country_move_board(self):
+        user = self.users[0]
+        CustomUser.objects.filter(pk=user.pk).update(points=5, country="KE")
+        rebuild_board("country:KE")
+        user = CustomUser.objects.get(pk=user.pk)
+        user.country = "TZ"
+        user.save()
+        run_pending()
+        boards = LeaderboardEntry.objects.filter(user=user).values_list("board", "rank")
+        self.assertEqual(sorted(boards), [("country:TZ", 1), (GLOBAL_BOARD, 1)])
+
+    def test_rank_and_neighbours(self):
+        for points, user in enumerate(self.users, 1):
+            CustomUser.objects.filter(pk=user.pk).update(points=points)
+        rebuild_board(GLOBAL_BOARD)
+        client = APIClient()
+        client.force_authenticate(self.users[9])
+
+        response = client.get(reverse("users:leaderboards-rank"))
+        self.assertEqual(response.data["rank"], 11)
+        response = client.get(reverse("users:leaderboards-around"), {"size": 2})
+        self.assertEqual([row["rank"] for row in response.data], [9, 10, 11, 12, 13])
+        response = client.get(reverse("users:leaderboards-list"), {"limit": 3})
+        self.assertEqual([row["user"] for row in response.data], [user.pk for user in self.users[:-4:-1]])
+
+
+class TopScoresTests(TestCase):
+    def setUp(self):
+        self.viewer = CustomUser.objects.create_user(username="viewer", email="viewer@test.com", password="test1234")
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+        self.assessment = Assessment.objects.create(
+            name="Test", description="Test", user=self.viewer, subcategory=subcategory, is_active=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def add_users(self, count):
+        for _ in range(count):
+            i = CustomUser.objects.count()
+            user = CustomUser.objects.create_user(username=f"user{i}", email=f"user{i}@test.com", password="test1234")
+            Follow.objects.create(follower=self.viewer, followed=user)
+            Follow.objects.create(follower=user, followed=self.viewer)
+            FollowAssessment.objects.create(follower=user, assessment=self.assessment)
+            Attempt.objects.create(assessment=self.assessment, user=user, score=100, approved=True)
+            Attempt.objects.create(assessment=self.assessment, user=user, score=50)
+
+    def get_top_scores(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("users:users-top-scores"))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_statistics_are_computed_for_every_user(self):
+        self.add_users(2)
+        response, _ = self.get_top_scores()
+
+        user_data = next(row for row in response.data if row["username"] == "user1")
+        self.assertEqual(user_data["follower_count"], 1)
+        self.assertEqual(user_data["following_count"], 1)
+        self.assertEqual(user_data["following_assessments_count"], 1)
+        self.assertEqual(user_data["attempts_count"], 2)
+        self.assertEqual(user_data["average_score"], 75)
+        self.assertEqual(user_data["approved_percentage"], 50)
+        self.assertEqual(user_data["full_score_percentage"], 50)
+        self.assertTrue(user_data["is_following"])
+
+    def test_query_count_does_not_depend_on_number_of_users(self):
+        self.add_users(4)
+        _, few_users_queries = self.get_top_scores()
+        self.add_users(15)
+        _, many_users_queries = self.get_top_scores()
+
+        self.assertEqual(few_users_queries, many_users_queries)
+
+
+class SocialCountersTests(TestCase):
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@test.com", password="test1234")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@test.com", password="test1234")
+
+    def counters(self):
+        return {
+            user.username: (user.followers_count, user.following_count)
+            for user in CustomUser.objects.filter(pk__in=[self.alice.pk, self.bob.pk])
+        }
+
+    def test_counters_follow_follows_and_deactivation(self):
+        follow = Follow.objects.create(follower=self.alice, followed=self.bob)
+        self.assertEqual(self.counters(), {"alice": (0, 1), "bob": (1, 0)})
+
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertEqual(self.counters(), {"alice": (0, 1), "bob": (0, 0)})
+        self.alice.is_active = True
+        self.alice.save()
+        self.assertEqual(self.counters(), {"alice": (0, 1), "bob": (1, 0)})
+
+        follow.delete()
+        self.assertEqual(self.counters(), {"alice": (0, 0), "bob": (0, 0)})
+
+    def test_reconcile_repairs_drift(self):
+        Follow.objects.create(follower=self.alice, followed=self.bob)
+        CustomUser.objects.update(followers_count=7, following_count=7)
+
+        reconcile_social_counters(chunk_size=1)
+        self.assertEqual(self.counters(), {"alice": (0, 1), "bob": (1, 0)})
+
+
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f"user{i}",
+                email=f"user{i}@test.com",
+                points=i * 7 % 50,
+                average_score=i * 13 % 100,
+                reset_code="abc1234" if i == 0 else None,
+            )
+            for i in range(200)
+        )
+
+    def test_user_by_reset_code(self):
+        self.assertUsesIndex(CustomUser.objects.filter(reset_code="abc1234"), "user_reset_code_idx")
+
+    def test_users_by_points(self):
+        self.assertUsesIndex(CustomUser.objects.filter(points__gte=40), "user_points_idx")
+        self.assertUsesIndex(CustomUser.objects.order_by("-points")[:20], "user_points_idx")
+
+    def test_users_by_average_score(self):
+        self.assertUsesIndex(CustomUser.objects.filter(average_score__gte=90), "user_average_score_idx")
+        self.assertUsesIndex(CustomUser.objects.order_by("-average_score")[:20], "user_average_score_idx")
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(25):
+            user = CustomUser.objects.create_user(username=f"user{i}", email=f"user{i}@test.com", password="test1234")
+            CustomUser.objects.filter(pk=user.pk).update(points=i % 4)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            ids.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+    def test_cursor_pages_follow_the_ordering_with_ties(self):
+        ids = self.walk(reverse("users:topusers-list") + "?ordering=-points&cursor=")
+        self.assertEqual(ids, list(CustomUser.objects.order_by("-points", "-id").values_list("id", flat=True)))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = APIClient().get(reverse("users:topusers-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_values_of_the_wrong_type_are_rejected(self):
+        for values in (["abc"], [{"a": 1}], ["abc", 1], [{"a": 1}, 1], [1, None]):
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            response = APIClient().get(reverse("users:topusers-list"), {"ordering": "-points", "cursor": cursor})
+            self.assertEqual(response.status_code, 404, values)
+
+    def test_page_numbers_still_work(self):
+        response = APIClient().get(reverse("users:topusers-list"), {"page": 2})
+        self.assertEqual(response.data["count"], 25)
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(username="author", email="author@test.com", password="test1234")
+        cls.followers = [
+            CustomUser.objects.create_user(username=f"follower{i}", email=f"follower{i}@test.com", password="test1234")
+            for i in range(3)
+        ]
+        cls.stranger = CustomUser.objects.create_user(username="stranger", email="stranger@test.com", password="test")
+        for follower in cls.followers:
+            Follow.objects.create(follower=follower, followed=cls.author)
+        category = Category.objects.create(name="Science", description="Science")
+        subcategory = Subcategory.objects.create(category=category, name="Physics", description="Physics")
+        cls.assessment = Assessment.objects.create(
+            name="Test", description="Test", user=cls.author, subcategory=subcategory, is_active=True
+        )
+
+    def run_jobs(self):
+        while run_pending():
+            pass
+
+    def test_activity_is_fanned_out_in_batches(self):
+        self.followers[2].is_active = False
+        self.followers[2].save()
+        activity = {
+            "verb": FeedEntry.ASSESSMENT_ACTIVATED,
+            "actor_id": self.author.pk,
+            "assessment_id": self.assessment.pk,
+            "created_at": timezone.now().isoformat(),
+            "batch_size": 1,
+        }
+        enqueue("feed.fan_out", **activity)
+        self.run_jobs()
+        self.assertEqual(Job.objects.filter(name="feed.fan_out", status=Job.DONE).count(), 3)
+        owners = set(FeedEntry.objects.values_list("owner", flat=True))
+        self.assertEqual(owners, {self.followers[0].pk, self.followers[1].pk})
+
+        # A redelivered job adds nothing.
+        fan_out_feed_entries(**activity)
+        self.assertEqual(FeedEntry.objects.count(), 2)
+
+    def test_assessment_updates_go_to_its_followers(self):
+        FollowAssessment.objects.create(follower=self.stranger, assessment=self.assessment)
+        publish(FeedEntry.ASSESSMENT_UPDATED, self.author.pk, self.assessment.pk)
+        self.run_jobs()
+        self.assertEqual(list(FeedEntry.objects.values_list("owner", flat=True)), [self.stranger.pk])
+
+    def test_only_changed_assessments_are_published(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        url = reverse("assessments:assessments-detail", args=[self.assessment.pk])
+        for name in ("Test", "Test", "Renamed"):
+            response = client.patch(url, {"name": name, "description": "Test"}, format="json")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(Job.objects.filter(name="feed.fan_out", payload__verb=FeedEntry.ASSESSMENT_UPDATED).count(), 1)
+
+    def test_feed_pages_are_newest_first(self):
+        start = timezone.now() - timedelta(hours=1)
+        for i in range(15):
+            FeedEntry.objects.create(
+                owner=self.followers[0],
+                verb=FeedEntry.VERB_CHOICES[i % 2][0],
+                actor=self.author,
+                assessment=self.assessment,
+                created_at=start + timedelta(minutes=i // 2),
+            )
+        client = APIClient()
+        client.force_authenticate(self.followers[0])
+        ids = []
+        url = reverse("users:feed-list")
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+        expected = FeedEntry.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        self.assertEqual(ids, list(expected))
+
+        Assessment.objects.filter(pk=self.assessment.pk).update(is_private=True)
+        self.assertEqual(client.get(reverse("users:feed-list")).data["results"], [])
 
-# Create your tests here.
+    def test_old_entries_are_trimmed(self):
+        for days in (1, 200):
+            FeedEntry.objects.create(
+                owner=self.followers[0],
+                verb=FeedEntry.ASSESSMENT_UPDATED,
+                actor=self.author,
+                assessment=self.assessment,
+                created_at=timezone.now() - timedelta(days=days),
+            )
+        trim_feeds()
+        self.assertEqual(FeedEntry.objects.count(), 1)
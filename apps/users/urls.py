@@ -1,7 +1,15 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from .views import UserViewSet, ReadOnlyUserViewSet, FollowViewSet, UserPointsViewSet, CountryListView
+from .views import (
+    UserViewSet,
+    ReadOnlyUserViewSet,
+    FollowViewSet,
+    UserPointsViewSet,
+    LeaderboardViewSet,
+    CountryListView,
+    FeedViewSet,
+)
 
 
 app_name = "users"
@@ -11,6 +19,8 @@ router.register(r"users", UserViewSet, basename="users")
 router.register(r"topusers", ReadOnlyUserViewSet, basename="topusers")
 router.register(r"follows", FollowViewSet, basename="follows")
 router.register(r"userpoints", UserPointsViewSet, basename="userpoints")
+router.register(r"leaderboards", LeaderboardViewSet, basename="leaderboards")
+router.register(r"feed", FeedViewSet, basename="feed")
 
 urlpatterns = [
     path("", include(router.urls)),
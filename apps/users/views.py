@@ -1,12 +1,19 @@
+import hashlib
+import json
 import random
 import string
+from functools import lru_cache
 
 from django.conf import settings
 from django.core.mail import send_mail
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files.base import ContentFile
-from rest_framework import viewsets, status
+from django.db.models import OuterRef
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
@@ -24,19 +31,43 @@ from .serializers import (
     FollowSerializer,
     UserPointsSerializer,
     PasswordResetSerializer,
+    LeaderboardEntrySerializer,
+    FeedEntrySerializer,
 )
-from .models import CustomUser, Follow, UserPoints
+from .leaderboard import GLOBAL_BOARD, category_board, country_board
+from .models import CustomUser, Follow, UserPoints, LeaderboardEntry, FeedEntry, pending_points
 from .permissions import CustomUserPermissions, FollowPermissions
+from apps.assessments.catalog import conditional_response
+from somaserver.pagination import KeysetPagination
+
+
+def country_list():
+    return [[code, str(name)] for code, name in countries]
+
+
+@lru_cache
+def country_list_etag():
+    # The list only changes with django-countries itself.
+    return '"{}"'.format(hashlib.md5(json.dumps(country_list()).encode()).hexdigest())
 
 
 class CountryListView(APIView):
     def get(self, request, *args, **kwargs):
-        return Response(countries)
+        return conditional_response(request, country_list_etag(), country_list)
 
 
 class ReadOnlyUserViewSet(viewsets.ModelViewSet):
+    """
+    Public profiles of the users.
+
+    pending_points holds the points awarded since the last compaction of the points ledger. Ordering
+    and filtering by points use the compacted value, so they can lag behind by those pending points;
+    the leaderboards rank users by their compacted points as well.
+    """
+
     serializer_class = ReadOnlyUserSerializer
-    queryset = CustomUser.objects.all()
+    queryset = CustomUser.objects.annotate(pending_points=pending_points(user=OuterRef("pk")))
+    pagination_class = KeysetPagination
     filterset_fields = {
         "username": ("exact", "in", "icontains"),
         "average_score": ("exact", "gte", "lte"),
@@ -48,6 +79,7 @@ class ReadOnlyUserViewSet(viewsets.ModelViewSet):
 class UserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     permission_classes = [CustomUserPermissions]
+    query_budgets = {"top_scores": 8}
     filterset_fields = {
         "username": ("exact", "in", "icontains"),
         "email": ("exact", "in", "icontains"),
@@ -168,6 +200,7 @@ class FollowViewSet(viewsets.ModelViewSet):
     serializer_class = FollowSerializer
     permission_classes = [FollowPermissions]
     http_method_names = ["get", "post", "delete", "head", "options"]
+    pagination_class = KeysetPagination
     filterset_fields = {
         "follower": ("exact", "in"),
         "followed": ("exact", "in"),
@@ -181,8 +214,41 @@ class FollowViewSet(viewsets.ModelViewSet):
         serializer.save(follower=self.request.user)
 
 
+class FeedPagination(KeysetPagination):
+    keyset_only = True
+
+
+class FeedViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Activity of the users and assessments followed by the current user, newest first.
+
+    Pages are requested with the cursor of the next link.
+    """
+
+    serializer_class = FeedEntrySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = FeedPagination
+    filter_backends = []
+    query_budgets = {"list": 3}
+
+    def get_queryset(self):
+        return (
+            FeedEntry.objects.filter(owner=self.request.user, assessment__is_private=False)
+            .select_related("actor", "assessment", "attempt")
+            .order_by("-created_at", "-id")
+        )
+
+
 class UserPointsViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = UserPoints.objects.all()
+    """
+    Points and average score of the users per category.
+
+    Ordering and filtering by total_points use the compacted value, without the pending_points shown.
+    """
+
+    queryset = UserPoints.objects.annotate(
+        pending_points=pending_points(user=OuterRef("user"), category=OuterRef("category"))
+    )
     serializer_class = UserPointsSerializer
     filterset_fields = {
         "user": ("exact", "in"),
@@ -191,3 +257,63 @@ class UserPointsViewSet(viewsets.ReadOnlyModelViewSet):
         "average_score": ("gte", "lte"),
     }
     ordering_fields = ["total_points", "average_score"]
+
+
+class LeaderboardViewSet(viewsets.ViewSet):
+    """
+    Global, per-category and per-country rankings by points.
+
+    The board is chosen with ?board=global, ?board=category&category=<id> or ?board=country&country=<code>.
+    """
+
+    def get_board(self, request):
+        board = request.query_params.get("board", "global")
+        if board == "global":
+            return GLOBAL_BOARD
+        if board == "category":
+            category = request.query_params.get("category", "")
+            if not category.isdigit():
+                raise ValidationError({"category": "A valid category id is required."})
+            return category_board(int(category))
+        if board == "country":
+            country = request.query_params.get("country", "")
+            if len(country) != 2:
+                raise ValidationError({"country": "A two letter country code is required."})
+            return country_board(country.upper())
+        raise ValidationError({"board": "The board should be global, category or country."})
+
+    def get_int_param(self, request, name, default, maximum):
+        try:
+            return max(1, min(int(request.query_params.get(name, default)), maximum))
+        except ValueError:
+            raise ValidationError({name: "A number is required."})
+
+    def get_entries(self, request):
+        return LeaderboardEntry.objects.filter(board=self.get_board(request)).select_related("user").order_by("rank")
+
+    def get_user_entry(self, request):
+        user_id = request.query_params.get("user")
+        if user_id is None:
+            if not request.user.is_authenticated:
+                raise ValidationError({"user": "A user is required."})
+            user_id = request.user.pk
+        return get_object_or_404(self.get_entries(request), user=user_id)
+
+    def list(self, request):
+        """Top users of the board."""
+        limit = self.get_int_param(request, "limit", 20, 100)
+        entries = self.get_entries(request).filter(rank__lte=limit)
+        return Response(LeaderboardEntrySerializer(entries, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def rank(self, request):
+        """Position of a user (the authenticated one by default) on the board."""
+        return Response(LeaderboardEntrySerializer(self.get_user_entry(request)).data)
+
+    @action(detail=False, methods=["get"])
+    def around(self, request):
+        """Users ranked right above and below a user (the authenticated one by default)."""
+        size = self.get_int_param(request, "size", 5, 50)
+        entry = self.get_user_entry(request)
+        entries = self.get_entries(request).filter(rank__gte=entry.rank - size, rank__lte=entry.rank + size)
+        return Response(LeaderboardEntrySerializer(entries, many=True).data)
@@ -0,0 +1,18 @@
+class CounterFieldsMixin:
+    """
+    Keep columns that are only changed with F() expressions, or by background jobs, out of regular saves.
+
+    Otherwise a full save() of an instance loaded before a concurrent increment would
+    write the stale value back.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
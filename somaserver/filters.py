@@ -0,0 +1,16 @@
+from rest_framework.filters import OrderingFilter
+
+
+class StableOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that breaks ties on the primary key.
+
+    Without a unique last column, rows with equal values can move between pages. The tiebreaker
+    follows the direction of the last column, so a (column, id) index serves the whole ordering.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering or any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            return ordering
+        return [*ordering, "-id" if ordering[-1].startswith("-") else "id"]
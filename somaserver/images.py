@@ -0,0 +1,151 @@
+import hashlib
+import io
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.views.static import serve
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+from apps.jobs.queue import enqueue, job
+
+VARIANTS_DIR = "variants"
+# Longest side in pixels of each derivative. Images are never scaled up.
+SIZES = {"medium": 640, "thumbnail": 160}
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpeg": ("JPEG", {"quality": 82, "optimize": True})}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# (model, image field, variants field) of every tracked image field.
+tracked_fields = []
+
+
+def track_image_variants(model, field, variants_field):
+    """
+    Build the derivatives of an image field of a model off the request path whenever the image changes.
+
+    The variants field holds the name of the image they were built from, so saves that do not change
+    the image queue nothing. It should be kept out of regular saves (see somaserver.db.CounterFieldsMixin).
+    """
+
+    tracked_fields.append((model, field, variants_field))
+
+    def image_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+        if raw or (update_fields is not None and field not in update_fields):
+            return
+        source = getattr(instance, field).name or ""
+        if not source:
+            # The variants in memory may predate the job that built them.
+            sender.objects.filter(pk=instance.pk).exclude(**{variants_field: {}}).update(**{variants_field: {}})
+            return
+        if getattr(instance, variants_field).get("source") == source:
+            return
+        enqueue(
+            "images.build_variants",
+            model=instance._meta.label,
+            pk=instance.pk,
+            field=field,
+            variants_field=variants_field,
+        )
+
+    post_save.connect(image_saved, sender=model, weak=False, dispatch_uid=f"{model._meta.label}.{variants_field}")
+
+
+def render_variants(data):
+    """Resize an image to every size in SIZES, encoded in every format in FORMATS."""
+    image = Image.open(io.BytesIO(data))
+    # JPEG sources can be decoded at a fraction of their size, which is much faster for large photos.
+    largest = max(SIZES.values())
+    image.draft("RGB", (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+    rendered = {}
+    for size_name, size in sorted(SIZES.items(), key=lambda item: -item[1]):
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        encoded = {}
+        for extension, (pillow_format, options) in FORMATS.items():
+            output = io.BytesIO()
+            # JPEG has no alpha channel.
+            (image.convert("RGB") if pillow_format == "JPEG" else image).save(output, pillow_format, **options)
+            encoded[extension] = output.getvalue()
+        rendered[size_name] = (image.size, encoded)
+    return rendered
+
+
+def build_variants(field_file):
+    """
+    Store the derivatives of an image under names derived from its content, and describe them.
+
+    The same image always gets the same names, so derivatives that exist already are not stored again
+    and can be cached by clients forever.
+    """
+    with field_file.open("rb") as file:
+        data = file.read()
+    variants = {"source": field_file.name, "sizes": {}}
+    try:
+        rendered = render_variants(data)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        # Not an image Pillow can read: remember it so it is not tried again.
+        return variants
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    for size_name, ((width, height), encoded) in rendered.items():
+        variant = {"width": width, "height": height}
+        for extension, content in encoded.items():
+            name = f"{VARIANTS_DIR}/{digest[:2]}/{digest}-{size_name}.{extension}"
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(content))
+            variant[extension] = name
+        variants["sizes"][size_name] = variant
+    return variants
+
+
+@job("images.build_variants")
+def build_image_variants(model, pk, field, variants_field):
+    Model = apps.get_model(model)
+    instance = Model.objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field):
+        return
+    field_file = getattr(instance, field)
+    # Saves of instances loaded before the variants were stored queue the job again.
+    if getattr(instance, variants_field).get("source") == field_file.name:
+        return
+    values = {variants_field: build_variants(field_file)}
+    # Bump auto_now timestamps, so caches keyed on them (like the catalog) pick up the variants.
+    for model_field in Model._meta.concrete_fields:
+        if getattr(model_field, "auto_now", False):
+            values[model_field.name] = timezone.now()
+    # The image may have been replaced while the variants were being built.
+    Model.objects.filter(pk=pk, **{field: field_file.name}).update(**values)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Absolute URLs, width and height of the derivatives of an image, by size and format.
+
+    None until the derivatives are built.
+    """
+
+    def to_representation(self, value):
+        if not value or not value.get("sizes"):
+            return None
+        request = self.context.get("request")
+        representation = {}
+        for size_name, variant in value["sizes"].items():
+            representation[size_name] = {"width": variant["width"], "height": variant["height"]}
+            for extension in FORMATS:
+                url = default_storage.url(variant[extension])
+                representation[size_name][extension] = request.build_absolute_uri(url) if request else url
+        return representation
+
+
+def serve_variant(request, path):
+    """Serve a derivative with far-future cache headers; their names change whenever their content does."""
+    response = serve(request, path, document_root=os.path.join(settings.MEDIA_ROOT, VARIANTS_DIR))
+    response["Cache-Control"] = IMMUTABLE
+    return response
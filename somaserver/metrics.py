@@ -0,0 +1,243 @@
+"""
+Request, cache and job queue metrics in the Prometheus text format.
+
+Every worker process accumulates its own counters and histograms in memory and
+periodically writes them to <METRICS_DIR>/<pid>.json. The /metrics endpoint adds up
+the files of all the workers, so any of them can answer a scrape.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "soma_http_requests_total": ("counter", "Requests handled, by view, action, method and status."),
+    "soma_http_request_duration_seconds": ("histogram", "Time spent handling requests, by view and action."),
+    "soma_db_queries_total": ("counter", "SQL queries run while handling requests, by view and action."),
+    "soma_db_duration_seconds_total": ("counter", "Time spent in SQL queries while handling requests."),
+    "soma_cache_requests_total": ("counter", "Versioned cache lookups, by cache and result."),
+    "soma_cache_hit_ratio": ("gauge", "Share of versioned cache lookups served without loading from the database."),
+    "soma_jobs": ("gauge", "Jobs in the queue, by status."),
+    "soma_jobs_oldest_pending_seconds": ("gauge", "Age of the oldest job that is due."),
+    "soma_jobs_average_latency_seconds": ("gauge", "Average time from enqueueing to finishing of recent jobs."),
+}
+
+
+def metrics_dir():
+    return settings.METRICS_DIR
+
+
+def series_key(name, **labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class MetricsStore:
+    """
+    The metrics of the current process, written to its own file at most every flush_interval seconds.
+
+    Samples recorded within flush_interval of the last write are written by a timer thread, so the
+    last requests of a worker that goes idle are not missing from the scrapes.
+    """
+
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+        self.dirty = False
+        self.timer = None
+        # A previous process with the same pid left counters behind; keep counting from them.
+        state = read_state(self.path())
+        if state:
+            self.counters = state["counters"]
+            self.histograms = state["histograms"]
+
+    def path(self):
+        return os.path.join(metrics_dir(), f"{os.getpid()}.json")
+
+    def ensure_process(self):
+        # Forked workers must not report the counters inherited from their parent.
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, name, value=1, **labels):
+        key = series_key(name, **labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = series_key(name, **labels)
+        histogram = self.histograms.setdefault(
+            key, {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+        )
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if value <= bound), len(LATENCY_BUCKETS))
+        histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    def record_request(self, view, action, method, status, duration, db_duration, queries):
+        with self.lock:
+            self.ensure_process()
+            self.inc("soma_http_requests_total", view=view, action=action, method=method, status=str(status))
+            self.observe("soma_http_request_duration_seconds", duration, view=view, action=action)
+            self.inc("soma_db_queries_total", queries, view=view, action=action)
+            self.inc("soma_db_duration_seconds_total", db_duration, view=view, action=action)
+            self.dirty = True
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.flush_interval, self.flush_pending)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        from apps.assessments.cache import versioned_caches
+
+        self.last_flush = time.monotonic()
+        self.dirty = False
+        state = {
+            "counters": self.counters,
+            "histograms": self.histograms,
+            "caches": {prefix: versioned_cache.stats() for prefix, versioned_cache in versioned_caches.items()},
+        }
+        os.makedirs(metrics_dir(), exist_ok=True)
+        path = self.path()
+        # Readers only ever see complete files.
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def write(self):
+        with self.lock:
+            self.ensure_process()
+            self.flush()
+
+    def flush_pending(self):
+        """Write the samples recorded since the last write, if the current process has any."""
+        with self.lock:
+            if self.pid == os.getpid():
+                self.timer = None
+                if self.dirty:
+                    self.flush()
+
+    def discard_pending(self):
+        """Drop the samples recorded since the last write and cancel their timer."""
+        with self.lock:
+            if self.pid == os.getpid():
+                if self.timer is not None:
+                    self.timer.cancel()
+                self.timer = None
+                self.dirty = False
+
+
+store = MetricsStore()
+atexit.register(lambda: store.flush_pending())
+
+
+def read_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def collect():
+    """Add up the metrics files of every worker."""
+    counters, histograms, caches = {}, {}, {}
+    for path in glob.glob(os.path.join(metrics_dir(), "*.json")):
+        state = read_state(path)
+        if state is None:
+            continue
+        for key, value in state["counters"].items():
+            counters[key] = counters.get(key, 0) + value
+        for key, histogram in state["histograms"].items():
+            total = histograms.setdefault(key, {"buckets": [0] * len(histogram["buckets"]), "sum": 0.0, "count": 0})
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], histogram["buckets"])]
+            total["sum"] += histogram["sum"]
+            total["count"] += histogram["count"]
+        for prefix, stats in state.get("caches", {}).items():
+            total = caches.setdefault(prefix, {"hits": 0, "shared_hits": 0, "misses": 0})
+            for field in total:
+                total[field] += stats[field]
+    return counters, histograms, caches
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+def render():
+    from apps.jobs.queue import stats as job_stats
+
+    counters, histograms, caches = collect()
+    samples = {name: [] for name in HELP}
+
+    for key, value in sorted(counters.items()):
+        name, labels = json.loads(key)
+        samples[name].append((name, labels, value))
+    for key, histogram in sorted(histograms.items()):
+        name, labels = json.loads(key)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"]):
+            cumulative += count
+            samples[name].append((f"{name}_bucket", labels + [("le", str(bound))], cumulative))
+        samples[name].append((f"{name}_sum", labels, histogram["sum"]))
+        samples[name].append((f"{name}_count", labels, histogram["count"]))
+    for prefix, stats in sorted(caches.items()):
+        for result in ("hits", "shared_hits", "misses"):
+            samples["soma_cache_requests_total"].append(
+                ("soma_cache_requests_total", [("cache", prefix), ("result", result)], stats[result])
+            )
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        if lookups:
+            ratio = (stats["hits"] + stats["shared_hits"]) / lookups
+            samples["soma_cache_hit_ratio"].append(("soma_cache_hit_ratio", [("cache", prefix)], ratio))
+
+    queue = job_stats()
+    for status, depth in queue["depth"].items():
+        samples["soma_jobs"].append(("soma_jobs", [("status", status)], depth))
+    samples["soma_jobs_oldest_pending_seconds"].append(
+        ("soma_jobs_oldest_pending_seconds", [], queue["oldest_pending_seconds"])
+    )
+    if queue["average_latency_seconds"] is not None:
+        samples["soma_jobs_average_latency_seconds"].append(
+            ("soma_jobs_average_latency_seconds", [], queue["average_latency_seconds"])
+        )
+
+    lines = []
+    for name, (kind, help_text) in HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_name, labels, value in samples[name]:
+            lines.append(f"{sample_name}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    token = getattr(settings, "METRICS_TOKEN", None)
+    # Without a token, the metrics are only readable by development servers.
+    if not token and not settings.DEBUG:
+        return HttpResponseForbidden()
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    store.write()
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
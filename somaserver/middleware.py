@@ -0,0 +1,104 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger("somaserver.requests")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts the queries of a request and the time spent running them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def resolve_view(view_func, method):
+    """
+    Return the name, action and query budget of the view handling a request.
+
+    Budgets are declared on DRF views as a query_budgets dict, keyed by viewset action
+    (or by lowercase HTTP method for plain API views).
+    """
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}", method.lower(), None
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return view_class.__name__, action, getattr(view_class, "query_budgets", {}).get(action)
+
+
+class QueryMetricsMiddleware:
+    """
+    Measure the SQL queries, database time and total view time of every request.
+
+    The numbers are sent back in a Server-Timing header, logged as one JSON line per request
+    and added to the metrics exported on /metrics.
+    Views over their query budget are logged as warnings, or raise QueryBudgetExceeded when
+    QUERY_BUDGET_STRICT is set (as it is when running the tests).
+
+    The body of a streaming response is produced after the view returns, so its queries are not
+    measured; streaming responses are logged as such and their budget is not checked.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        view_time = time.perf_counter() - start
+
+        view, action, budget = getattr(request, "resolved_view", ("unresolved", "", None))
+        response["Server-Timing"] = (
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries", view;dur={view_time * 1000:.2f}'
+        )
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "view": view,
+                    "action": action,
+                    "status": response.status_code,
+                    "queries": recorder.count,
+                    "db_ms": round(recorder.duration * 1000, 2),
+                    "view_ms": round(view_time * 1000, 2),
+                    "streaming": response.streaming,
+                }
+            )
+        )
+        metrics.store.record_request(
+            view, action, request.method, response.status_code, view_time, recorder.duration, recorder.count
+        )
+        if budget is not None and not response.streaming and recorder.count > budget:
+            message = f"{view}.{action} ran {recorder.count} queries, over its budget of {budget}."
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.resolved_view = resolve_view(view_func, request.method)
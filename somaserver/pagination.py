@@ -0,0 +1,151 @@
+import base64
+import binascii
+import datetime
+import json
+from functools import reduce
+from operator import attrgetter, or_
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder rounds datetimes to milliseconds, which would skip rows in keyset pages."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes the row count of unfiltered querysets over large tables from the
+    Postgres planner statistics instead of running COUNT(*).
+
+    The estimate is refreshed by (auto)vacuum and analyze, so the last page number can be off
+    by a few pages on tables that change quickly.
+    """
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is not None and not query.where and not query.distinct and not query.is_sliced:
+            estimate = self.estimated_count(self.object_list)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+    def estimated_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # reltuples is -1 for tables that were never analyzed.
+        return int(row[0]) if row and row[0] >= 0 else None
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page number pagination with an opt-in keyset mode for deep pages.
+
+    Passing ?cursor= (empty for the first page) switches to keyset pagination: the page starts
+    after the row encoded in the cursor, on the endpoint's ordering with the primary key as the
+    last column, so every page costs the same no matter how deep it is and no COUNT(*) is run.
+    Keyset pages only have a next link. The ordering columns must not be nullable.
+    Subclasses can set keyset_only to always use keyset pages.
+    """
+
+    django_paginator_class = EstimatedCountPaginator
+    cursor_query_param = "cursor"
+    keyset_only = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.keyset_only and self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.ordering = self.get_keyset_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor)))
+
+        rows = list(queryset[: page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page_rows = rows[:page_size]
+        return self.page_rows
+
+    def get_keyset_ordering(self, queryset):
+        ordering = [
+            field for field in queryset.query.order_by or queryset.model._meta.ordering if isinstance(field, str)
+        ]
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            ordering.append("-id" if ordering and ordering[-1].startswith("-") else "id")
+        return ordering
+
+    def after(self, values):
+        """Filter for the rows that come after the given ordering values."""
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {other.lstrip("-"): value for other, value in zip(self.ordering[:index], values)}
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": values[index]}))
+        return reduce(or_, conditions)
+
+    def encode_cursor(self, row):
+        values = [attrgetter(field.lstrip("-").replace("__", "."))(row) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(values, cls=CursorEncoder).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound("Invalid cursor.")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound("Invalid cursor.")
+        try:
+            values = [self.get_field(field).to_python(value) for field, value in zip(self.ordering, values)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound("Invalid cursor.")
+        if None in values:
+            raise NotFound("Invalid cursor.")
+        return values
+
+    def get_field(self, field):
+        """The model field behind an ordering column, following relations."""
+        model = self.model
+        for name in field.lstrip("-").split("__"):
+            model_field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+            model = model_field.related_model or model
+        return model_field
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page_rows[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({"next": self.get_next_link(), "previous": None, "results": data})
@@ -0,0 +1,29 @@
+import codecs
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parse newline delimited JSON into a lazy iterator of the values on each line.
+
+    The body is read a line at a time, so large uploads are never held as one string.
+    Blank lines are skipped.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+        return self.rows(codecs.getreader(encoding)(stream) if stream is not None else [])
+
+    def rows(self, lines):
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error on line {number}: {exc}")
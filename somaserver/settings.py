@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import json
 import os
+import tempfile
 from pathlib import Path
 
 from django.core.exceptions import ImproperlyConfigured
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "django_filters",
@@ -59,9 +61,11 @@ INSTALLED_APPS = [
     "apps.users",
     "apps.assessments",
     "apps.attempts",
+    "apps.jobs",
 ]
 
 MIDDLEWARE = [
+    "somaserver.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -72,6 +76,17 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Views declare query_budgets; going over budget logs a warning, or fails the request when strict.
+# The test runner makes budgets strict.
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = "somaserver.test_runner.TestRunner"
+
+# Every worker writes its metrics to a file in METRICS_DIR, which /metrics adds up.
+# The directory should be emptied when the server is restarted.
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "somaserver-metrics"))
+# When set, /metrics requires an "Authorization: Bearer <token>" header. Without it, /metrics is only served with DEBUG.
+METRICS_TOKEN = secret.get("METRICS_TOKEN")
+
 ROOT_URLCONF = "somaserver.urls"
 
 TEMPLATES = [
@@ -116,7 +131,7 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
-        "rest_framework.filters.OrderingFilter",
+        "somaserver.filters.StableOrderingFilter",
     ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
@@ -0,0 +1,25 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+from . import metrics
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner that fails the requests going over their query budget, however the tests are started,
+    and keeps the metrics of the test requests out of the METRICS_DIR of the server.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
+        self.metrics_dir = tempfile.mkdtemp(prefix="somaserver-test-metrics-")
+        settings.METRICS_DIR = self.metrics_dir
+
+    def teardown_test_environment(self, **kwargs):
+        metrics.store.discard_pending()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,42 @@
+import re
+
+from django.db import connection
+
+
+class QueryPlanAssertions:
+    """
+    Test case mixin to check that a queryset is answered from indexes, or from a given index.
+
+    On Postgres sequential scans are disabled while planning, so a Seq Scan in the plan
+    means that no usable index exists, whatever the size of the test tables.
+    """
+
+    def get_query_plan(self, queryset):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            try:
+                return queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = on")
+        return queryset.explain()
+
+    def assertNoSequentialScan(self, queryset):
+        plan = self.get_query_plan(queryset)
+        if connection.vendor == "postgresql":
+            sequential = "Seq Scan" in plan
+        else:
+            # SQLite reports "SCAN <table>" for full table scans and "SCAN <table> USING INDEX" for index scans.
+            sequential = any(
+                re.search(r"\bSCAN\b", line) and "USING" not in line and "TEMP B-TREE" not in line
+                for line in plan.splitlines()
+            )
+        if sequential:
+            self.fail(f"Sequential scan in the plan of:\n{queryset.query}\n\n{plan}")
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """Check that the plan of a queryset uses one of the given indexes."""
+        plan = self.get_query_plan(queryset)
+        if not any(re.search(rf"\b{re.escape(index_name)}\b", plan) for index_name in index_names):
+            self.fail(f"None of {', '.join(index_names)} is used by the plan of:\n{queryset.query}\n\n{plan}")
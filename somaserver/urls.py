@@ -20,6 +20,10 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from rest_framework.authtoken import views
 
+from apps.assessments.media import serve_blob
+from .images import serve_variant
+from .metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api-token-auth/", views.obtain_auth_token),
@@ -27,4 +31,13 @@ urlpatterns = [
     path('attempts/', include('apps.attempts.urls', namespace='attempts')),
     path('users/', include('apps.users.urls', namespace='users')),
     path('api-auth/', include('rest_framework.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path("metrics", metrics_view, name="metrics"),
+]
+
+if settings.DEBUG:
+    # Blobs and image derivatives have content-hashed names, so they are served with immutable cache headers.
+    urlpatterns.append(path("media/blobs/<path:path>", serve_blob, name="media-blob"))
+    urlpatterns.append(path("media/variants/<path:path>", serve_variant, name="image-variant"))
+
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+